@@ -5,7 +5,7 @@ Cấu hình tất cả các endpoint API cho DRF
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
-from . import views
+from . import views, events
 
 # Tạo router để tự động sinh URL cho ViewSets
 router = DefaultRouter()
@@ -23,9 +23,12 @@ router.register(r'cashiers', views.CashierViewSet, basename='cashier')
 router.register(r'waiters', views.WaiterViewSet, basename='waiter')
 router.register(r'materials', views.MaterialViewSet, basename='material')
 router.register(r'revenue', views.RevenueStatsView, basename='revenue')
+router.register(r'cache-stats', views.CacheStatsView, basename='cache-stats')
+router.register(r'db-pool-stats', views.DatabasePoolStatsView, basename='db-pool-stats')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('login/', views.CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('events/', events.event_stream, name='events'),
 ]
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend.core'
+
+    def ready(self):
+        from .embedded import finish_database, prepare_database
+
+        # EMBEDDED_DB (SQLite): `migrate` tự tạo bảng nghiệp vụ + trigger
+        pre_migrate.connect(prepare_database, sender=self, dispatch_uid='core_embedded_schema')
+        post_migrate.connect(finish_database, sender=self, dispatch_uid='core_embedded_triggers')
@@ -0,0 +1,234 @@
+"""
+Connection pool dùng chung cho backend MySQL có pool (ENGINE = 'backend.core.mysql_pool')
+
+- Mỗi alias database có một pool dùng chung cho mọi thread; connection của request trả về pool
+  khi Django đóng connection (cuối request, CONN_MAX_AGE = 0) thay vì ngắt TCP.
+- acquire(): lấy connection rảnh dùng gần nhất, kiểm tra còn sống (check) rồi mới giao;
+  hỏng / quá max_lifetime thì đóng và lấy cái khác. Đủ max_size thì chờ tối đa `timeout` giây (PoolTimeout).
+- release(): chạy reset (xóa trạng thái session) rồi đưa về hàng rảnh; reset lỗi thì đóng luôn.
+- Connection rảnh quá max_idle giây bị đóng, nhưng luôn giữ lại min_size connection.
+- stats(): số liệu theo từng alias cho monitoring (GET /api/db-pool-stats/).
+"""
+import threading
+import time
+from collections import Counter, deque
+
+from django.db import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """Hết connection trong pool và chờ quá `timeout` giây"""
+
+
+class _IdleConnection:
+    __slots__ = ('connection', 'created', 'released')
+
+    def __init__(self, connection, created, released):
+        self.connection = connection
+        self.created = created
+        self.released = released
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=0, max_size=10, max_lifetime=1800, max_idle=300, timeout=10,
+                 check=None, reset=None, key=None):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError('Connection pool cần 0 <= min_size <= max_size và max_size >= 1')
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.check = check
+        self.reset = reset
+        self.key = key
+        self._cond = threading.Condition()
+        self._idle = deque()      # bên phải = vừa trả (dùng lại trước), bên trái = rảnh lâu nhất
+        self._in_use = {}         # id(connection) -> thời điểm mở
+        self._size = 0            # tổng connection đang mở (kể cả đang mở dở)
+        self._closed = False
+        self._counters = Counter()
+
+    # ==================== LẤY / TRẢ ====================
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            idle = self._take(deadline)
+            if idle is None:
+                return self._open()
+            if self._usable(idle):
+                with self._cond:
+                    self._in_use[id(idle.connection)] = idle.created
+                    self._counters['reused'] += 1
+                return idle.connection
+
+    def release(self, connection, discard=False):
+        """Trả connection về pool; discard=True (dở transaction, có lỗi) thì đóng luôn"""
+        with self._cond:
+            created = self._in_use.pop(id(connection), None)
+        if created is None:
+            # Không phải connection pool đang cho mượn
+            _close_quietly(connection)
+            return
+        if discard or self._closed:
+            self._close(connection, 'discarded')
+            return
+        if self._too_old(created, time.monotonic()):
+            self._close(connection, 'expired')
+            return
+        if self.reset is not None:
+            try:
+                self.reset(connection)
+            except Exception:
+                self._close(connection, 'broken')
+                return
+        with self._cond:
+            self._idle.append(_IdleConnection(connection, created, time.monotonic()))
+            self._cond.notify()
+
+    def _take(self, deadline):
+        """Lấy 1 connection rảnh, hoặc giữ chỗ để mở mới (trả None); chờ nếu pool đã đầy"""
+        waited = False
+        while True:
+            with self._cond:
+                expired = self._evict(time.monotonic())
+                if not expired:
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'Không lấy được connection trong {self.timeout}s (pool đầy: {self.max_size})'
+                        )
+                    if not waited:
+                        waited = True
+                        self._counters['waits'] += 1
+                    self._cond.wait(remaining)
+                    continue
+            # Đóng ngoài lock rồi thử lại
+            for idle, reason in expired:
+                self._close(idle.connection, reason)
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._in_use[id(connection)] = time.monotonic()
+            self._counters['created'] += 1
+        return connection
+
+    def _usable(self, idle):
+        if self._too_old(idle.created, time.monotonic()):
+            self._close(idle.connection, 'expired')
+            return False
+        if self.check is not None:
+            try:
+                self.check(idle.connection)
+            except Exception:
+                self._close(idle.connection, 'broken')
+                return False
+        return True
+
+    def _too_old(self, created, now):
+        return self.max_lifetime is not None and now - created >= self.max_lifetime
+
+    def _evict(self, now):
+        """(Giữ lock) gỡ khỏi hàng rảnh các connection quá tuổi / rảnh quá lâu (vẫn giữ min_size)"""
+        expired = []
+        keep = deque()
+        size = self._size
+        # Duyệt từ connection rảnh lâu nhất
+        while self._idle:
+            idle = self._idle.popleft()
+            if self._too_old(idle.created, now):
+                expired.append((idle, 'expired'))
+                size -= 1
+            elif self.max_idle is not None and now - idle.released >= self.max_idle and size > self.min_size:
+                expired.append((idle, 'idle'))
+                size -= 1
+            else:
+                keep.append(idle)
+        self._idle = keep
+        return expired
+
+    def _close(self, connection, reason):
+        _close_quietly(connection)
+        with self._cond:
+            self._size -= 1
+            self._counters[f'closed_{reason}'] += 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Đóng các connection rảnh; connection đang cho mượn sẽ bị đóng khi trả về"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._close(entry.connection, 'discarded')
+
+    # ==================== THỐNG KÊ ====================
+    def stats(self):
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'created': self._counters['created'],
+                'reused': self._counters['reused'],
+                'waits': self._counters['waits'],
+                'timeouts': self._counters['timeouts'],
+                'closed_expired': self._counters['closed_expired'],
+                'closed_idle': self._counters['closed_idle'],
+                'closed_broken': self._counters['closed_broken'],
+                'closed_discarded': self._counters['closed_discarded'],
+            }
+
+
+# ==================== POOL THEO ALIAS ====================
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, key, connect, **options):
+    """Pool của alias; thông số kết nối đổi (vd. test database) thì thay pool mới"""
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.key != key:
+            if pool is not None:
+                pool.close_all()
+            pool = _pools[alias] = ConnectionPool(connect, key=key, **options)
+        return pool
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def stats():
+    """Số liệu pool của từng alias trong process hiện tại"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
@@ -0,0 +1,385 @@
+"""
+Chế độ database nhúng (EMBEDDED_DB=1): chạy toàn bộ app / test / benchmark trên SQLite, không cần MySQL
+
+- Bảng nghiệp vụ (managed = False) được tạo từ model ngay trước khi migrate chạy
+  (cùng cột, cùng khóa chính nhiều cột như table_and_data.sql).
+- Sau migrate, trigger trong trigger.sql, revenue_daily.sql, customer_stats.sql và item_availability.sql được cài lại bằng cú pháp SQLite (SQLITE_TRIGGERS):
+  chúng chạy trong database nên vẫn đúng với bulk_create / bulk_update / UPDATE thô, như trên MySQL.
+- Stored procedure mà view gọi có bản Python trong procedures.py (chọn bằng USE_STORED_PROCEDURES).
+"""
+from django.apps import apps
+from django.db import connections
+
+
+# Bảng có khóa chính nhiều cột: model chỉ khai báo 1 cột làm khóa chính giả,
+# nên phải tự dựng PRIMARY KEY thật (như table_and_data.sql) để cho phép nhiều dòng cùng giá trị cột đó
+COMPOSITE_PRIMARY_KEYS = {
+    'qdmaterial': ('qdmaterialid', 'qditemid'),
+    'ypromo': ('ypromoid', 'yinvoiceid'),
+    'supervision': ('minor_staffid', 'major_staffid'),
+    'customer_stats_daily': ('customerid', 'businessday'),
+}
+
+
+def create_table(editor, model):
+    keys = COMPOSITE_PRIMARY_KEYS.get(model._meta.db_table)
+    if not keys:
+        editor.create_model(model)
+    else:
+        sql, params = editor.table_sql(model)
+        columns = ', '.join(editor.quote_name(model._meta.get_field(name).column) for name in keys)
+        sql = sql.replace(' PRIMARY KEY', '', 1)
+        sql = f"{sql[:sql.rindex(')')]}, PRIMARY KEY ({columns}))"
+        editor.execute(sql, params or None)
+    create_indexes(editor, model)
+
+
+def create_indexes(editor, model):
+    """
+    schema_editor bỏ qua index của model unmanaged: tạo index cho khóa ngoại (InnoDB tự có)
+    và Meta.indexes (như script trong mysql_code) để trigger / truy vấn không phải quét cả bảng
+    """
+    for field in model._meta.local_fields:
+        editor.deferred_sql.extend(editor._field_indexes_sql(model, field))
+    for index in model._meta.indexes:
+        editor.deferred_sql.append(index.create_sql(model, editor))
+
+
+def create_unmanaged_tables(using='default', **kwargs):
+    """Tạo bảng cho các model unmanaged chưa có trong database `using`"""
+    connection = connections[using]
+    existing = {name.lower() for name in connection.introspection.table_names()}
+    models = [
+        model for model in apps.get_app_config('core').get_models()
+        if not model._meta.managed and model._meta.db_table.lower() not in existing
+    ]
+    with connection.schema_editor() as editor:
+        for model in models:
+            create_table(editor, model)
+
+
+# ==================== TRIGGER (SQLite) ====================
+# Cùng tên và cùng hành vi với bản MySQL; SIGNAL SQLSTATE '45000' -> RAISE(ABORT, ...) (IntegrityError)
+
+def _short_of(item, amount):
+    """Có nguyên liệu nào của món `item` không đủ `amount` đơn vị (mỗi phần dùng 1 đơn vị), theo fn_MaterialStock"""
+    return (
+        'EXISTS (SELECT 1 FROM QDMaterial q JOIN Material m ON m.MaterialID = q.QDMaterialID '
+        f'WHERE q.QDItemID = {item} AND m.Quantity + IFNULL((SELECT SUM(s.Delta) FROM stock_movement s '
+        f'WHERE s.MaterialID = m.MaterialID), 0) < {amount})'
+    )
+
+
+def _record_movement(row, delta, condition='1'):
+    """Ghi vào sổ kho (stock_ledger.sql) 1 dòng cho mỗi nguyên liệu của món trong dòng Detail `row` (NEW / OLD)"""
+    return f"""
+            INSERT INTO stock_movement (MaterialID, OrderID, DetailID, Delta, CreatedAt)
+            SELECT QDMaterialID, {row}.DOrderID, {row}.DetailID, {delta}, CURRENT_TIMESTAMP
+            FROM QDMaterial
+            WHERE QDItemID = {row}.DItemID AND {condition} AND IFNULL({delta}, 0) <> 0;
+    """
+
+
+def _order_subtotal(order):
+    """fn_OrderSubtotal"""
+    return (
+        'IFNULL((SELECT SUM(d.Quantity * i.Price) FROM Detail d JOIN Item i ON d.DItemID = i.ItemID '
+        f'WHERE d.DOrderID = {order}), 0)'
+    )
+
+
+def _visit_amount(row):
+    """fn_VisitAmount cho dòng YPromo `row` (NEW / OLD): tổng tiền order trừ giảm giá còn hạn"""
+    subtotal = _order_subtotal(f'{row}.YOrderID')
+    return (
+        f'({subtotal} - IFNULL((SELECT CASE WHEN p.ExpireDate >= DATE(i.DateCreated) AND {subtotal} >= p.MinValue '
+        f'THEN ROUND({subtotal} * p.DiscountPercent / 100, 2) ELSE 0 END '
+        f'FROM Promotion p, Invoice i WHERE p.PromoID = {row}.YPromoID AND i.InvoiceID = {row}.YInvoiceID), 0))'
+    )
+
+
+def _item_portions(item):
+    """Số phần món `item` còn làm được: MIN(Quantity) các nguyên liệu, âm -> 0 (GREATEST của MySQL)"""
+    return (
+        'SELECT MAX(MIN(m.Quantity), 0) FROM QDMaterial q JOIN Material m ON m.MaterialID = q.QDMaterialID '
+        f'WHERE q.QDItemID = {item}'
+    )
+
+
+def _refresh_item_availability(item):
+    """sp_RefreshItemAvailability"""
+    return f"""
+            DELETE FROM item_availability WHERE ItemID = {item};
+            INSERT INTO item_availability (ItemID, Portions)
+            SELECT {item}, ({_item_portions(item)})
+            WHERE EXISTS (SELECT 1 FROM QDMaterial WHERE QDItemID = {item});
+    """
+
+
+# Mã hóa đơn vừa cấp (fn_GenerateInvoiceID, sau khi đã tăng bộ đếm INV); printf không cắt số quá 4 chữ số (INV10000)
+_LAST_INVOICE_ID = "'INV' || printf('%04d', NextValue - 1)"
+
+SQLITE_TRIGGERS = {
+    'trg_detail_bi_check_stock': f"""
+        CREATE TRIGGER trg_detail_bi_check_stock
+        BEFORE INSERT ON Detail
+        FOR EACH ROW
+        WHEN {_short_of('NEW.DItemID', 'NEW.Quantity')}
+        BEGIN
+            SELECT RAISE(ABORT, 'Insufficient material stock for this item');
+        END
+    """,
+    'trg_detail_bu_check_stock': f"""
+        CREATE TRIGGER trg_detail_bu_check_stock
+        BEFORE UPDATE ON Detail
+        FOR EACH ROW
+        BEGIN
+            SELECT RAISE(ABORT, 'Insufficient stock for new item')
+            WHERE OLD.DItemID <> NEW.DItemID
+              AND {_short_of('NEW.DItemID', 'NEW.Quantity')};
+            SELECT RAISE(ABORT, 'Insufficient material for quantity increase')
+            WHERE OLD.DItemID = NEW.DItemID AND NEW.Quantity > OLD.Quantity
+              AND {_short_of('NEW.DItemID', 'NEW.Quantity - OLD.Quantity')};
+        END
+    """,
+    # Order đã lập hóa đơn: không thêm/sửa/xóa món (xem trigger.sql)
+    'trg_detail_bi_invoiced': """
+        CREATE TRIGGER trg_detail_bi_invoiced
+        BEFORE INSERT ON Detail
+        FOR EACH ROW
+        WHEN EXISTS (SELECT 1 FROM YPromo WHERE YOrderID = NEW.DOrderID)
+        BEGIN
+            SELECT RAISE(ABORT, 'Order already invoiced');
+        END
+    """,
+    'trg_detail_bu_invoiced': """
+        CREATE TRIGGER trg_detail_bu_invoiced
+        BEFORE UPDATE ON Detail
+        FOR EACH ROW
+        WHEN EXISTS (SELECT 1 FROM YPromo WHERE YOrderID IN (OLD.DOrderID, NEW.DOrderID))
+        BEGIN
+            SELECT RAISE(ABORT, 'Order already invoiced');
+        END
+    """,
+    'trg_detail_bd_invoiced': """
+        CREATE TRIGGER trg_detail_bd_invoiced
+        BEFORE DELETE ON Detail
+        FOR EACH ROW
+        WHEN EXISTS (SELECT 1 FROM YPromo WHERE YOrderID = OLD.DOrderID)
+        BEGIN
+            SELECT RAISE(ABORT, 'Order already invoiced');
+        END
+    """,
+    'trg_detail_ai': f"""
+        CREATE TRIGGER trg_detail_ai
+        AFTER INSERT ON Detail
+        FOR EACH ROW
+        BEGIN
+            UPDATE ROrder
+            SET Quantity = IFNULL(Quantity, 0) + IFNULL(NEW.Quantity, 0)
+            WHERE OrderID = NEW.DOrderID;
+
+            {_record_movement('NEW', '-NEW.Quantity')}
+        END
+    """,
+    'trg_detail_au': f"""
+        CREATE TRIGGER trg_detail_au
+        AFTER UPDATE ON Detail
+        FOR EACH ROW
+        BEGIN
+            -- Chuyển sang order khác
+            UPDATE ROrder
+            SET Quantity = IFNULL(Quantity, 0) - IFNULL(OLD.Quantity, 0)
+            WHERE OrderID = OLD.DOrderID AND OLD.DOrderID <> NEW.DOrderID;
+            UPDATE ROrder
+            SET Quantity = IFNULL(Quantity, 0) + IFNULL(NEW.Quantity, 0)
+            WHERE OrderID = NEW.DOrderID AND OLD.DOrderID <> NEW.DOrderID;
+            -- Cùng order, đổi số lượng
+            UPDATE ROrder
+            SET Quantity = IFNULL(Quantity, 0) + IFNULL(NEW.Quantity, 0) - IFNULL(OLD.Quantity, 0)
+            WHERE OrderID = NEW.DOrderID AND OLD.DOrderID = NEW.DOrderID
+              AND NEW.Quantity IS NOT OLD.Quantity;
+
+            -- Đổi món: trả nguyên liệu món cũ, trừ nguyên liệu món mới
+            {_record_movement('OLD', 'OLD.Quantity', 'OLD.DItemID <> NEW.DItemID')}
+            {_record_movement('NEW', '-NEW.Quantity', 'OLD.DItemID <> NEW.DItemID')}
+            -- Cùng món: trừ theo chênh lệch
+            {_record_movement('NEW', 'IFNULL(OLD.Quantity, 0) - IFNULL(NEW.Quantity, 0)', 'OLD.DItemID = NEW.DItemID')}
+        END
+    """,
+    'trg_detail_ad': f"""
+        CREATE TRIGGER trg_detail_ad
+        AFTER DELETE ON Detail
+        FOR EACH ROW
+        BEGIN
+            UPDATE ROrder
+            SET Quantity = IFNULL(Quantity, 0) - IFNULL(OLD.Quantity, 0)
+            WHERE OrderID = OLD.DOrderID;
+
+            {_record_movement('OLD', 'OLD.Quantity')}
+        END
+    """,
+    'trg_order_create_invoice': f"""
+        CREATE TRIGGER trg_order_create_invoice
+        AFTER UPDATE ON ROrder
+        FOR EACH ROW
+        WHEN OLD.Status <> 'Paid' AND NEW.Status = 'Paid'
+         AND NOT EXISTS (SELECT 1 FROM YPromo WHERE YOrderID = NEW.OrderID)
+        BEGIN
+            -- fn_NextSequenceValue('INV'): bộ đếm phải có sẵn (migration 0006 seed)
+            SELECT RAISE(ABORT, 'ID sequence not found: INV')
+            WHERE NOT EXISTS (SELECT 1 FROM id_sequence WHERE Name = 'INV');
+            UPDATE id_sequence SET NextValue = NextValue + 1 WHERE Name = 'INV';
+
+            -- Thuế 10%, khách từ PTOrder (mặc định C001), thu ngân đầu tiên (hoặc staff đầu tiên)
+            INSERT INTO Invoice (InvoiceID, DateCreated, Tax, IStaffID, CustomerID)
+            SELECT {_LAST_INVOICE_ID},
+                   strftime('%Y-%m-%d %H:%M:%f', 'now'),
+                   ROUND({_order_subtotal('NEW.OrderID')} * 0.10, 2),
+                   COALESCE((SELECT StaffID FROM Cashier LIMIT 1), (SELECT StaffID FROM Staff LIMIT 1)),
+                   COALESCE((SELECT PTCustomerID FROM PTOrder WHERE PTOrderID = NEW.OrderID LIMIT 1), 'C001')
+            FROM id_sequence WHERE Name = 'INV';
+
+            INSERT INTO YPromo (YPromoID, YInvoiceID, YOrderID)
+            SELECT 'P001', {_LAST_INVOICE_ID}, NEW.OrderID
+            FROM id_sequence WHERE Name = 'INV';
+        END
+    """,
+    'trg_order_paid_revenue_daily': f"""
+        CREATE TRIGGER trg_order_paid_revenue_daily
+        AFTER UPDATE ON ROrder
+        FOR EACH ROW
+        BEGIN
+            -- Order vừa được thanh toán: cộng vào ngày của order
+            INSERT OR IGNORE INTO revenue_daily (BusinessDay, Revenue, OrderCount, ItemCount)
+            SELECT DATE(NEW.CreatedAt), 0, 0, 0
+            WHERE OLD.Status <> 'Paid' AND NEW.Status = 'Paid';
+            UPDATE revenue_daily
+            SET Revenue    = Revenue + {_order_subtotal('NEW.OrderID')},
+                OrderCount = OrderCount + 1,
+                ItemCount  = ItemCount + IFNULL(NEW.Quantity, 0)
+            WHERE BusinessDay = DATE(NEW.CreatedAt)
+              AND OLD.Status <> 'Paid' AND NEW.Status = 'Paid';
+
+            -- Order bị chuyển khỏi trạng thái 'Paid': trừ lại
+            UPDATE revenue_daily
+            SET Revenue    = Revenue - {_order_subtotal('OLD.OrderID')},
+                OrderCount = OrderCount - 1,
+                ItemCount  = ItemCount - IFNULL(OLD.Quantity, 0)
+            WHERE BusinessDay = DATE(OLD.CreatedAt)
+              AND OLD.Status = 'Paid' AND NEW.Status <> 'Paid';
+        END
+    """,
+    'trg_ypromo_customer_stats_ai': f"""
+        CREATE TRIGGER trg_ypromo_customer_stats_ai
+        AFTER INSERT ON YPromo
+        FOR EACH ROW
+        BEGIN
+            INSERT OR IGNORE INTO customer_stats (CustomerID, TotalSpent, VisitCount, LastVisit)
+            SELECT CustomerID, 0, 0, NULL FROM Invoice WHERE InvoiceID = NEW.YInvoiceID;
+            UPDATE customer_stats
+            SET TotalSpent = customer_stats.TotalSpent + {_visit_amount('NEW')},
+                VisitCount = customer_stats.VisitCount + 1,
+                LastVisit  = CASE
+                    WHEN customer_stats.LastVisit IS NULL OR i.DateCreated > customer_stats.LastVisit
+                    THEN IFNULL(i.DateCreated, customer_stats.LastVisit)
+                    ELSE customer_stats.LastVisit
+                END
+            FROM Invoice i
+            WHERE i.InvoiceID = NEW.YInvoiceID AND customer_stats.CustomerID = i.CustomerID;
+
+            INSERT OR IGNORE INTO customer_stats_daily (CustomerID, BusinessDay, TotalSpent, VisitCount)
+            SELECT CustomerID, DATE(DateCreated), 0, 0 FROM Invoice
+            WHERE InvoiceID = NEW.YInvoiceID AND DateCreated IS NOT NULL;
+            UPDATE customer_stats_daily
+            SET TotalSpent = customer_stats_daily.TotalSpent + {_visit_amount('NEW')},
+                VisitCount = customer_stats_daily.VisitCount + 1
+            FROM Invoice i
+            WHERE i.InvoiceID = NEW.YInvoiceID AND customer_stats_daily.CustomerID = i.CustomerID
+              AND customer_stats_daily.BusinessDay = DATE(i.DateCreated);
+        END
+    """,
+    'trg_ypromo_customer_stats_ad': f"""
+        CREATE TRIGGER trg_ypromo_customer_stats_ad
+        AFTER DELETE ON YPromo
+        FOR EACH ROW
+        BEGIN
+            UPDATE customer_stats
+            SET TotalSpent = customer_stats.TotalSpent - {_visit_amount('OLD')},
+                VisitCount = customer_stats.VisitCount - 1,
+                LastVisit  = (
+                    SELECT MAX(i2.DateCreated) FROM YPromo y JOIN Invoice i2 ON i2.InvoiceID = y.YInvoiceID
+                    WHERE i2.CustomerID = i.CustomerID
+                )
+            FROM Invoice i
+            WHERE i.InvoiceID = OLD.YInvoiceID AND customer_stats.CustomerID = i.CustomerID;
+
+            UPDATE customer_stats_daily
+            SET TotalSpent = customer_stats_daily.TotalSpent - {_visit_amount('OLD')},
+                VisitCount = customer_stats_daily.VisitCount - 1
+            FROM Invoice i
+            WHERE i.InvoiceID = OLD.YInvoiceID AND customer_stats_daily.CustomerID = i.CustomerID
+              AND customer_stats_daily.BusinessDay = DATE(i.DateCreated);
+        END
+    """,
+    'trg_material_item_availability_au': f"""
+        CREATE TRIGGER trg_material_item_availability_au
+        AFTER UPDATE ON Material
+        FOR EACH ROW
+        WHEN NEW.Quantity IS NOT OLD.Quantity
+        BEGIN
+            UPDATE item_availability
+            SET Portions = ({_item_portions('item_availability.ItemID')})
+            WHERE ItemID IN (SELECT QDItemID FROM QDMaterial WHERE QDMaterialID = NEW.MaterialID);
+        END
+    """,
+    'trg_qdmaterial_item_availability_ai': f"""
+        CREATE TRIGGER trg_qdmaterial_item_availability_ai
+        AFTER INSERT ON QDMaterial
+        FOR EACH ROW
+        BEGIN
+            {_refresh_item_availability('NEW.QDItemID')}
+        END
+    """,
+    'trg_qdmaterial_item_availability_au': f"""
+        CREATE TRIGGER trg_qdmaterial_item_availability_au
+        AFTER UPDATE ON QDMaterial
+        FOR EACH ROW
+        BEGIN
+            {_refresh_item_availability('OLD.QDItemID')}
+            {_refresh_item_availability('NEW.QDItemID')}
+        END
+    """,
+    'trg_qdmaterial_item_availability_ad': f"""
+        CREATE TRIGGER trg_qdmaterial_item_availability_ad
+        AFTER DELETE ON QDMaterial
+        FOR EACH ROW
+        BEGIN
+            {_refresh_item_availability('OLD.QDItemID')}
+        END
+    """,
+}
+
+
+def install_triggers(using='default'):
+    """Cài (lại) các trigger SQLite - chạy lại nhiều lần không sao"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for name, sql in SQLITE_TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(sql)
+
+
+def prepare_database(using='default', **kwargs):
+    """
+    pre_migrate: database không phải MySQL thì tự dựng các bảng nghiệp vụ
+    (MySQL dùng các script trong backend/mysql_code)
+    """
+    if connections[using].vendor == 'sqlite':
+        create_unmanaged_tables(using)
+
+
+def finish_database(using='default', **kwargs):
+    """post_migrate: cài trigger sau khi migrate (trigger dùng cả bảng managed như id_sequence)"""
+    if connections[using].vendor == 'sqlite':
+        install_triggers(using)
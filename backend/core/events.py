@@ -0,0 +1,120 @@
+"""
+Change feed cho bàn / order (thay cho việc client polling)
+
+Các view ghi dữ liệu gọi publish() sau khi transaction commit; client mở
+GET /api/events/ (Server-Sent Events) và nhận sự kiện ngay khi có thay đổi.
+Sự kiện được giữ trong bộ đệm vòng để client kết nối lại có thể nhận bù
+qua header Last-Event-ID (hoặc ?since=<id>).
+
+Lưu ý: broker nằm trong bộ nhớ của từng process - phù hợp khi chạy 1 process
+ASGI/WSGI (runserver, uvicorn 1 worker). Nhiều worker cần một kênh pub/sub dùng chung.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+HEARTBEAT_SECONDS = 15
+ASYNC_CHECK_SECONDS = 0.25
+BUFFER_SIZE = 1000
+
+
+class EventBroker:
+    """Bộ đệm vòng các sự kiện + Condition để đánh thức các client đang chờ"""
+
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self._events = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._condition = threading.Condition()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, event_type, data):
+        with self._condition:
+            self._last_id += 1
+            self._events.append({'id': self._last_id, 'type': event_type, 'data': data})
+            self._condition.notify_all()
+        return self._last_id
+
+    def events_since(self, last_id):
+        with self._condition:
+            return [event for event in self._events if event['id'] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Chờ tối đa `timeout` giây cho tới khi có sự kiện mới hơn `last_id`"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_id > last_id, timeout=timeout)
+        return self.events_since(last_id)
+
+
+broker = EventBroker()
+
+
+def publish(event_type, **data):
+    """Phát sự kiện sau khi transaction hiện tại commit (ngay lập tức nếu không trong transaction)"""
+    transaction.on_commit(lambda: broker.publish(event_type, data))
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def _start_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    try:
+        # id lớn hơn last_id hiện tại -> server đã khởi động lại, bắt đầu từ hiện tại
+        return min(int(value), broker.last_id)
+    except (TypeError, ValueError):
+        return broker.last_id
+
+
+def _sync_stream(last_id, heartbeat):
+    yield 'retry: 1000\n\n'
+    while True:
+        events = broker.wait(last_id, heartbeat)
+        if not events:
+            yield ': keep-alive\n\n'
+        for event in events:
+            last_id = event['id']
+            yield format_sse(event)
+
+
+async def _async_stream(last_id, heartbeat):
+    # Không giữ thread cho mỗi client: kiểm tra last_id (chỉ đọc 1 số nguyên) theo chu kỳ ngắn
+    yield 'retry: 1000\n\n'
+    idle = 0
+    while True:
+        if broker.last_id > last_id:
+            for event in broker.events_since(last_id):
+                last_id = event['id']
+                yield format_sse(event)
+            idle = 0
+            continue
+        await asyncio.sleep(ASYNC_CHECK_SECONDS)
+        idle += ASYNC_CHECK_SECONDS
+        if idle >= heartbeat:
+            idle = 0
+            yield ': keep-alive\n\n'
+
+
+def event_stream(request):
+    """
+    GET /api/events/
+    Server-Sent Events: table.status, order.created, order.items, order.paid, order.deleted
+    """
+    last_id = _start_id(request)
+    if isinstance(request, ASGIRequest):
+        stream = _async_stream(last_id, HEARTBEAT_SECONDS)
+    else:
+        stream = _sync_stream(last_id, HEARTBEAT_SECONDS)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,258 @@
+import json
+import math
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.utils import timezone
+from backend.core.models import Item, Rtable
+
+# Endpoint chỉ đọc: tên -> URL
+READ_ENDPOINTS = {
+    'tables': '/api/tables/',
+    'items_available': '/api/items/available/',
+    'revenue': '/api/revenue/',
+    'materials': '/api/materials/',
+    'staff': '/api/staff/',
+}
+# Luồng ghi: mỗi worker giữ 1 bàn trống và lặp tạo order -> add_item -> complete
+# -> gửi lại complete cùng Idempotency-Key (như client retry khi mạng chậm)
+ORDER_FLOW = 'order_flow'
+ORDER_STEPS = ('order_create', 'order_add_item', 'order_complete', 'order_complete_retry')
+ALL_SCENARIOS = list(READ_ENDPOINTS) + [ORDER_FLOW]
+
+
+def percentile(sorted_values, pct):
+    """Percentile kiểu nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def default_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host not in ('*', '') and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+class Recorder:
+    """Gom latency / số query / lỗi của các worker (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.elapsed = {}
+
+    def record(self, name, seconds, response):
+        with self._lock:
+            self.latencies[name].append(seconds * 1000)
+            stats = getattr(response, 'query_stats', None)
+            if stats is not None:
+                self.queries[name].append(stats.count)
+            if response.status_code >= 400:
+                self.errors[name] += 1
+
+    def summary(self, name):
+        latencies = sorted(self.latencies[name])
+        queries = self.queries[name]
+        elapsed = self.elapsed.get(name) or 0
+        rounded = lambda value: round(value, 3) if value is not None else None
+        return {
+            'requests': len(latencies),
+            'errors': self.errors[name],
+            'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+            'latency_ms': {
+                'mean': rounded(statistics.fmean(latencies)) if latencies else None,
+                'p50': rounded(percentile(latencies, 50)),
+                'p95': rounded(percentile(latencies, 95)),
+                'p99': rounded(percentile(latencies, 99)),
+                'max': rounded(latencies[-1]) if latencies else None,
+            },
+            'queries_per_request': {
+                'mean': rounded(statistics.fmean(queries)) if queries else None,
+                'max': max(queries) if queries else None,
+            },
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-benchmark the hot API endpoints in-process (Django test client) and report '
+        'throughput, p50/p95/p99 latency and queries per request as JSON. '
+        'order_flow writes orders/invoices: run it against a benchmark database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(ALL_SCENARIOS),
+                            help=f'Comma separated, any of: {", ".join(ALL_SCENARIOS)}')
+        parser.add_argument('--concurrency', type=int, default=4, help='Parallel workers (threads)')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint before measuring')
+        parser.add_argument('--host', default=None, help='Host header (default: first entry of ALLOWED_HOSTS)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--baseline', help='Previous JSON report to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative p95 increase over the baseline before failing (0.2 = +20%%)')
+
+    def handle(self, *args, scenarios, concurrency, duration, warmup, host, output, baseline, tolerance, **kwargs):
+        selected = [name.strip() for name in scenarios.split(',') if name.strip()]
+        unknown = sorted(set(selected) - set(ALL_SCENARIOS))
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(unknown)}')
+        if concurrency < 1 or duration <= 0:
+            raise CommandError('--concurrency must be >= 1 and --duration > 0')
+
+        self.host = host or default_host()
+        recorder = Recorder()
+        for name in selected:
+            if name == ORDER_FLOW:
+                self.run_order_flow(recorder, concurrency, duration)
+            else:
+                self.run_read(recorder, name, READ_ENDPOINTS[name], concurrency, duration, warmup)
+
+        names = [step for name in selected for step in (ORDER_STEPS if name == ORDER_FLOW else (name,))]
+        report = {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+                'concurrency': concurrency,
+                'duration_s': duration,
+            },
+            'endpoints': {name: recorder.summary(name) for name in names},
+        }
+        text = json.dumps(report, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(text)
+            self.stderr.write(f'Report written to {output}')
+        else:
+            self.stdout.write(text)
+
+        if baseline:
+            self.compare(report, baseline, tolerance)
+
+    # ==================== SCENARIOS ====================
+    def client(self):
+        # Lỗi 500 được ghi vào errors thay vì làm dừng worker
+        return Client(SERVER_NAME=self.host, raise_request_exception=False)
+
+    def run_workers(self, recorder, name, workers):
+        """Chạy các worker song song, ghi thời gian thực tế của scenario"""
+        threads = [threading.Thread(target=self.worker_wrapper, args=(worker,)) for worker in workers]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        for step in (ORDER_STEPS if name == ORDER_FLOW else (name,)):
+            recorder.elapsed[step] = elapsed
+
+    @staticmethod
+    def worker_wrapper(worker):
+        try:
+            worker()
+        finally:
+            # Mỗi thread có connection riêng
+            connections.close_all()
+
+    def run_read(self, recorder, name, url, concurrency, duration, warmup):
+        client = self.client()
+        for _ in range(warmup):
+            client.get(url)
+
+        def worker():
+            client = self.client()
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = client.get(url)
+                recorder.record(name, time.perf_counter() - start, response)
+
+        self.run_workers(recorder, name, [worker] * concurrency)
+
+    def run_order_flow(self, recorder, concurrency, duration):
+        tables = list(
+            Rtable.objects.filter(status='Available').order_by('tableid').values_list('tableid', flat=True)[:concurrency]
+        )
+        # Xoay vòng các món để không một nguyên liệu nào hết kho sau vài chục order
+        items = list(
+            Item.objects.filter(status='Available', superitemid__isnull=False).order_by('itemid')
+            .values_list('itemid', flat=True)
+        )
+        if not tables or not items:
+            self.stderr.write('order_flow skipped: needs an Available table and an Available menu item')
+            return
+        if len(tables) < concurrency:
+            self.stderr.write(f'order_flow: only {len(tables)} Available table(s), running {len(tables)} worker(s)')
+
+        def make_worker(index, table_id):
+            def worker():
+                client = self.client()
+                deadline = time.perf_counter() + duration
+                turn = index
+                while time.perf_counter() < deadline:
+                    item_id = items[turn % len(items)]
+                    turn += len(tables)
+                    order_id = self.timed_post(
+                        recorder, client, 'order_create', '/api/orders/', {'otableid': table_id}
+                    ).get('orderid')
+                    if not order_id:
+                        return  # bàn không còn trống (order trước chưa complete được)
+                    self.timed_post(
+                        recorder, client, 'order_add_item', f'/api/orders/{order_id}/add_item/',
+                        {'ditemid': item_id, 'quantity': 1}
+                    )
+                    checkout = {'customer_name': f'Bench {index}', 'customer_phone': f'0999{index:06d}'}
+                    headers = {'Idempotency-Key': uuid.uuid4().hex}
+                    for step in ('order_complete', 'order_complete_retry'):
+                        self.timed_post(
+                            recorder, client, step, f'/api/orders/{order_id}/complete/', checkout, headers
+                        )
+            return worker
+
+        self.run_workers(recorder, ORDER_FLOW, [make_worker(i, table_id) for i, table_id in enumerate(tables)])
+
+    def timed_post(self, recorder, client, name, url, data, headers=None):
+        start = time.perf_counter()
+        response = client.post(url, data, content_type='application/json', headers=headers)
+        recorder.record(name, time.perf_counter() - start, response)
+        try:
+            return response.json() if response.status_code < 400 else {}
+        except ValueError:
+            return {}
+
+    # ==================== BASELINE ====================
+    def compare(self, report, baseline_path, tolerance):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)['endpoints']
+
+        regressions = []
+        for name, current in report['endpoints'].items():
+            previous = baseline.get(name)
+            if not previous:
+                continue
+            self.stderr.write(
+                f'{name}: p99 {previous["latency_ms"]["p99"]} ms -> {current["latency_ms"]["p99"]} ms'
+            )
+            old_p95, new_p95 = previous['latency_ms']['p95'], current['latency_ms']['p95']
+            if old_p95 and new_p95 and new_p95 > old_p95 * (1 + tolerance):
+                regressions.append(f'{name}: p95 {old_p95} ms -> {new_p95} ms')
+            old_queries, new_queries = previous['queries_per_request']['max'], current['queries_per_request']['max']
+            if old_queries is not None and new_queries is not None and new_queries > old_queries:
+                regressions.append(f'{name}: queries/request {old_queries} -> {new_queries}')
+
+        if regressions:
+            raise CommandError('Performance regression vs baseline:\n  ' + '\n  '.join(regressions))
+        self.stderr.write(self.style.SUCCESS('No regression vs baseline'))
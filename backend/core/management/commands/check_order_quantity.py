@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Q, F, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from backend.core.models import Rorder, Detail
+
+
+def detail_quantity_subquery():
+    """SUM(Detail.Quantity) của order hiện tại (0 nếu chưa có món)"""
+    total = (
+        Detail.objects.filter(dorderid=OuterRef('pk'))
+        .values('dorderid')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+class Command(BaseCommand):
+    help = 'Find (and with --fix repair) orders whose ROrder.Quantity drifted from SUM(Detail.Quantity)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite Quantity of drifted orders')
+        parser.add_argument('--limit', type=int, default=20, help='Number of drifted orders to print')
+
+    def handle(self, *args, fix=False, limit=20, **kwargs):
+        drifted = list(
+            Rorder.objects
+            .annotate(actual=detail_quantity_subquery())
+            .filter(Q(quantity__isnull=True) | ~Q(quantity=F('actual')))
+            .order_by('orderid')
+            .values_list('orderid', 'quantity', 'actual')
+        )
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All order quantities are consistent'))
+            return
+
+        for order_id, stored, actual in drifted[:limit]:
+            self.stdout.write(f'{order_id}: Quantity={stored}, SUM(Detail.Quantity)={actual}')
+        if len(drifted) > limit:
+            self.stdout.write(f'... and {len(drifted) - limit} more')
+
+        if not fix:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drifted)} order(s) drifted, run with --fix to repair'
+            ))
+            return
+
+        # Tính lại trong chính câu UPDATE để không ghi đè thay đổi xảy ra sau lúc kiểm tra
+        with transaction.atomic():
+            repaired = (
+                Rorder.objects
+                .filter(orderid__in=[order_id for order_id, _, _ in drifted])
+                .update(quantity=detail_quantity_subquery())
+            )
+        self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} order(s)'))
@@ -0,0 +1,132 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, models
+from django.utils import timezone
+from backend.core.models import Detail, Invoice, Material, Payment, Qdmaterial, Rorder, Ypromo
+
+# (model, tên index, các field) - các điều kiện lọc chạy nhiều nhất trên bảng unmanaged
+INDEXES = [
+    (Detail, 'idx_detail_order', ['dorderid']),                    # detail của 1 order (serializer, trigger)
+    (Rorder, 'idx_rorder_table_status', ['otableid', 'status']),   # order Serving của bàn
+    (Rorder, 'idx_rorder_status_created', ['status', 'createdat']),  # doanh thu theo khoảng ngày
+    (Rorder, 'idx_rorder_created', ['createdat', 'orderid']),      # phân trang keyset /api/orders/
+    (Invoice, 'idx_invoice_customer_date', ['customerid', 'datecreated']),  # hóa đơn của khách, fn_CustomerTotalSpent
+    (Invoice, 'idx_invoice_created', ['datecreated', 'invoiceid']),  # phân trang keyset /api/invoices/
+    (Payment, 'idx_payment_paydate', ['paydate', 'paymentid']),    # phân trang keyset /api/payments/
+    (Material, 'idx_material_quantity', ['quantity']),             # lọc trước của /api/materials/low_stock/
+    (Qdmaterial, 'idx_qdmaterial_item', ['qditemid']),             # nguyên liệu của món (trigger kho)
+    (Ypromo, 'idx_ypromo_order', ['yorderid']),                    # khuyến mãi của order
+]
+
+
+def index_columns(model, fields):
+    return [model._meta.get_field(name).column for name in fields]
+
+
+def sample_queries():
+    """Các truy vấn đại diện dùng để đo trước/sau khi tạo index"""
+    order = Rorder.objects.values('orderid', 'otableid').order_by('-createdat').first()
+    invoice = Invoice.objects.values('customerid').first()
+    material_link = Qdmaterial.objects.values('qditemid').first()
+    since = timezone.now() - timedelta(days=30)
+
+    queries = {}
+    if order:
+        queries['Detail by order'] = Detail.objects.filter(dorderid=order['orderid'])
+        queries['Serving order of table'] = Rorder.objects.filter(otableid=order['otableid'], status='Serving')
+        queries['YPromo by order'] = Ypromo.objects.filter(yorderid=order['orderid'])
+    queries['Paid orders, last 30 days'] = Rorder.objects.filter(status='Paid', createdat__gte=since)
+    queries['Latest orders page'] = Rorder.objects.order_by('-createdat', '-orderid')[:50]
+    queries['Latest invoices page'] = Invoice.objects.order_by('-datecreated', '-invoiceid')[:50]
+    queries['Latest payments page'] = Payment.objects.order_by('-paydate', '-paymentid')[:50]
+    queries['Low-stock materials'] = Material.objects.filter(quantity__lte=10)
+    if invoice:
+        queries['Invoices of customer'] = Invoice.objects.filter(customerid=invoice['customerid'], datecreated__gte=since)
+    if material_link:
+        queries['Materials of item'] = Qdmaterial.objects.filter(qditemid=material_link['qditemid'])
+    return queries
+
+
+class Command(BaseCommand):
+    help = 'Create (idempotently) the secondary indexes used by hot queries on the unmanaged tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list the indexes that would be created')
+        parser.add_argument('--drop', action='store_true', help='Drop the indexes created by this command')
+        parser.add_argument('--benchmark', action='store_true',
+                            help='Time the representative queries before and after creating the indexes')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query when benchmarking')
+
+    def handle(self, *args, dry_run=False, drop=False, benchmark=False, repeat=20, **kwargs):
+        if drop:
+            self.drop_indexes(dry_run)
+            return
+
+        before = self.run_benchmark(repeat) if benchmark else None
+        created = self.create_indexes(dry_run)
+        if before is not None and not dry_run:
+            after = self.run_benchmark(repeat)
+            self.stdout.write(f"{'query':<30} {'before (ms)':>12} {'after (ms)':>12}")
+            for label, elapsed in before.items():
+                self.stdout.write(f'{label:<30} {elapsed:>12.3f} {after[label]:>12.3f}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} index(es) {"missing" if dry_run else "created"}, '
+            f'{len(INDEXES) - created} already present'
+        ))
+
+    def existing_indexes(self, model):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return {
+            name.lower(): [column.lower() for column in info['columns']]
+            for name, info in constraints.items()
+            if info['index'] or info['primary_key'] or info['unique']
+        }
+
+    def create_indexes(self, dry_run):
+        created = 0
+        with connection.schema_editor(atomic=False) as editor:
+            for model, name, fields in INDEXES:
+                existing = self.existing_indexes(model)
+                wanted = [column.lower() for column in index_columns(model, fields)]
+                # Đã có index cùng tên, hoặc index khác có cùng các cột đứng đầu (vd index tự tạo cho FK)
+                covering = next(
+                    (index for index, columns in existing.items() if columns[:len(wanted)] == wanted), None
+                )
+                if name.lower() in existing or covering:
+                    self.stdout.write(f'  ok      {model._meta.db_table}.{name} ({covering or name})')
+                    continue
+                created += 1
+                self.stdout.write(f'  create  {model._meta.db_table}.{name} ({", ".join(wanted)})')
+                if not dry_run:
+                    editor.add_index(model, models.Index(fields=fields, name=name))
+        return created
+
+    def drop_indexes(self, dry_run):
+        dropped = 0
+        with connection.schema_editor(atomic=False) as editor:
+            for model, name, fields in INDEXES:
+                if name.lower() not in self.existing_indexes(model):
+                    continue
+                self.stdout.write(f'  drop    {model._meta.db_table}.{name}')
+                if not dry_run:
+                    try:
+                        editor.remove_index(model, models.Index(fields=fields, name=name))
+                    except DatabaseError as e:
+                        # MySQL giữ lại index nếu nó đang là index duy nhất phục vụ một FK
+                        self.stdout.write(self.style.WARNING(f'  skip    {name}: {e}'))
+                        continue
+                dropped += 1
+        self.stdout.write(self.style.SUCCESS(f'{dropped} index(es) dropped'))
+
+    def run_benchmark(self, repeat):
+        timings = {}
+        for label, queryset in sample_queries().items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            timings[label] = (time.perf_counter() - start) * 1000 / repeat
+        return timings
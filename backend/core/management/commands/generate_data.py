@@ -0,0 +1,308 @@
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from backend.core import procedures
+from backend.core.models import (
+    Admin, Manager, Staff, Chef, Cashier, Waiter, Customer, Rtable, Item, Material, Qdmaterial,
+    Promotion, Rorder, Ptorder, Detail, Invoice, Ypromo, Payment, StockMovement,
+)
+
+# Mọi mã sinh ra đều bắt đầu bằng 'G' (bàn: từ TABLE_OFFSET) để không đụng dữ liệu mẫu và có thể --purge
+PREFIX = 'G'
+TABLE_OFFSET = 10000
+TAX_RATE = Decimal('10')  # % thuế, như sp_CreateInvoice
+START_STOCK = 2_000_000_000  # trigger kho trừ dần khi thêm Detail, đặt lại số thực tế ở cuối
+CENT = Decimal('0.01')
+
+AREAS = ['Tầng 1 - Sảnh', 'Tầng 1 - Góc', 'Tầng 2 - VIP', 'Sân vườn']
+CATEGORY_NAMES = ['Khai vị', 'Món chính', 'Lẩu', 'Nướng', 'Hải sản', 'Cơm - Mì', 'Tráng miệng', 'Đồ uống']
+DISH_WORDS = ['Gà', 'Bò', 'Heo', 'Tôm', 'Mực', 'Cá', 'Đậu hũ', 'Rau', 'Nấm', 'Vịt']
+DISH_STYLES = ['nướng', 'xào', 'hấp', 'chiên', 'kho', 'luộc', 'sốt me', 'rang muối']
+LAST_NAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Võ', 'Đặng', 'Bùi']
+FIRST_NAMES = ['An', 'Bình', 'Chi', 'Dũng', 'Giang', 'Hà', 'Khoa', 'Linh', 'Minh', 'Nam', 'Phúc', 'Trang', 'Vy']
+PAYMENT_METHODS = ['Cash', 'Card', 'E-Wallet']
+
+
+def gid(kind, number, width):
+    return f'{PREFIX}{kind}{number:0{width}d}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic synthetic dataset (same --seed and --end-date -> same data) '
+        'with bulk inserts. All generated IDs start with "G"; --purge removes a previous run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Last day of history (YYYY-MM-DD), default: today')
+        parser.add_argument('--days', type=int, default=365, help='Days of order history')
+        parser.add_argument('--orders-per-day', type=int, default=300)
+        parser.add_argument('--max-lines', type=int, default=5, help='Max distinct dishes per order')
+        parser.add_argument('--tables', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--items', type=int, default=120, help='Dishes (besides categories)')
+        parser.add_argument('--materials', type=int, default=360)
+        parser.add_argument('--recipe-size', type=int, default=3, help='Materials per dish (QDMaterial rows)')
+        parser.add_argument('--managers', type=int, default=3)
+        parser.add_argument('--chefs', type=int, default=10)
+        parser.add_argument('--cashiers', type=int, default=5)
+        parser.add_argument('--waiters', type=int, default=15)
+        parser.add_argument('--customers', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk INSERT')
+        parser.add_argument('--purge', action='store_true', help='Delete previously generated rows first')
+        parser.add_argument('--purge-only', action='store_true', help='Only delete previously generated rows')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        if options['purge'] or options['purge_only']:
+            self.purge()
+            if options['purge_only']:
+                call_command('rebuild_revenue_daily', stdout=self.stdout)
+                return
+        if Rorder.objects.filter(orderid__startswith=PREFIX).exists():
+            raise CommandError('Generated data already exists, run with --purge to replace it')
+        if options['materials'] < options['recipe_size']:
+            raise CommandError('--materials must be >= --recipe-size')
+
+        self.rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        with transaction.atomic():
+            self.create_reference_data()
+        self.create_history()
+        self.reset_stock()
+        call_command('rebuild_revenue_daily', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
+
+    def bulk(self, model, rows):
+        model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    # ==================== PURGE ====================
+    def purge(self):
+        # Xóa theo thứ tự ngược khóa ngoại (món con trước danh mục)
+        generated = [
+            (Payment, 'paymentid'), (Ypromo, 'yinvoiceid'), (Invoice, 'invoiceid'), (Ptorder, 'ptorderid'),
+            (Detail, 'dorderid'), (Rorder, 'orderid'), (Qdmaterial, 'qditemid'),
+            (Item, 'itemid', {'superitemid__isnull': False}), (Item, 'itemid'), (Material, 'materialid'),
+            (StockMovement, 'materialid'),
+            (Promotion, 'promoid'), (Chef, 'staffid'), (Cashier, 'staffid'), (Waiter, 'staffid'),
+            (Staff, 'staffid'), (Manager, 'managerid'), (Admin, 'adminid'), (Customer, 'customerid'),
+        ]
+        with transaction.atomic():
+            for model, field, *extra in generated:
+                target = model._meta.get_field(field)
+                if target.is_relation:
+                    field = f'{field}__{target.target_field.name}'  # so sánh ngay trên cột FK, không JOIN
+                filters = {f'{field}__startswith': PREFIX, **(extra[0] if extra else {})}
+                deleted, _ = model.objects.filter(**filters).delete()
+                self.stdout.write(f'  purge {model._meta.db_table}: {deleted}')
+            Rtable.objects.filter(tableid__gte=TABLE_OFFSET).delete()
+
+    # ==================== REFERENCE DATA ====================
+    def person_name(self):
+        return f'{self.rng.choice(LAST_NAMES)} {self.rng.choice(FIRST_NAMES)}'
+
+    def create_reference_data(self):
+        o, rng = self.options, self.rng
+        admin = Admin.objects.create(adminid=gid('AD', 1, 2), fullname='Generated Admin', permission='SuperAdmin')
+        self.managers = [
+            Manager(managerid=gid('MG', n, 3), fullname=self.person_name(), madminid=admin, permission='All')
+            for n in range(1, o['managers'] + 1)
+        ]
+        self.bulk(Manager, self.managers)
+
+        staff, chefs, cashiers, waiters = [], [], [], []
+        roles = [('chefs', chefs), ('cashiers', cashiers), ('waiters', waiters)]
+        number = 0
+        for role, members in roles:
+            for _ in range(o[role]):
+                number += 1
+                member = Staff(
+                    staffid=gid('S', number, 5), fullname=self.person_name(), phone=f'030{number:07d}',
+                    status='Working', smanagerid=rng.choice(self.managers),
+                )
+                staff.append(member)
+                members.append(member)
+        self.bulk(Staff, staff)
+        self.bulk(Chef, [Chef(staffid=s, experience=rng.randint(0, 20)) for s in chefs])
+        self.bulk(Cashier, [Cashier(staffid=s, education=rng.choice(['THPT', 'Cao đẳng', 'Đại học'])) for s in cashiers])
+        self.bulk(Waiter, [Waiter(staffid=s, fluency=rng.choice(['Tiếng Anh', 'Tiếng Nhật', 'Tiếng Hàn'])) for s in waiters])
+        self.chef_ids = [s.staffid for s in chefs]
+        self.cashier_ids = [s.staffid for s in cashiers]
+        self.waiter_ids = [s.staffid for s in waiters]
+        if not (self.chef_ids and self.cashier_ids and self.waiter_ids):
+            raise CommandError('Need at least one chef, one cashier and one waiter')
+
+        self.customer_ids = [gid('C', n, 7) for n in range(1, o['customers'] + 1)]
+        self.bulk(Customer, [
+            Customer(customerid=customer_id, fullname=self.person_name(), phone=f'031{n:07d}')
+            for n, customer_id in enumerate(self.customer_ids, start=1)
+        ])
+
+        self.table_ids = [TABLE_OFFSET + n for n in range(1, o['tables'] + 1)]
+        self.bulk(Rtable, [
+            Rtable(tableid=table_id, tablenumber=table_id, area=rng.choice(AREAS), status='Available')
+            for table_id in self.table_ids
+        ])
+
+        # Danh mục (Price = 0) -> món (SuperItemID trỏ về danh mục)
+        categories = [
+            Item(itemid=gid('K', n, 3), name=CATEGORY_NAMES[(n - 1) % len(CATEGORY_NAMES)], price=0, status='Available')
+            for n in range(1, o['categories'] + 1)
+        ]
+        self.bulk(Item, categories)
+        dishes = [
+            Item(
+                itemid=gid('D', n, 5), name=f'{rng.choice(DISH_WORDS)} {rng.choice(DISH_STYLES)} #{n}',
+                price=Decimal(rng.randrange(25, 400) * 1000), status='Available',
+                superitemid=categories[(n - 1) % len(categories)] if categories else None,
+            )
+            for n in range(1, o['items'] + 1)
+        ]
+        self.bulk(Item, dishes)
+        self.prices = {dish.itemid: dish.price for dish in dishes}
+        self.dish_ids = list(self.prices)
+        if not self.dish_ids:
+            raise CommandError('Need at least one menu item')
+
+        materials = [
+            Material(materialid=gid('M', n, 4), name=f'Nguyên liệu {n}', quantity=START_STOCK)
+            for n in range(1, o['materials'] + 1)
+        ]
+        self.bulk(Material, materials)
+        # Công thức xoay vòng: món thứ i dùng các nguyên liệu liên tiếp bắt đầu từ i * recipe_size
+        size = o['recipe_size']
+        self.bulk(Qdmaterial, [
+            Qdmaterial(qdmaterialid=materials[(i * size + j) % len(materials)], qditemid=dish,
+                       qdmanagerid=rng.choice(self.managers))
+            for i, dish in enumerate(dishes) for j in range(size)
+        ])
+
+        # GPR00 = không khuyến mãi (mỗi hóa đơn cần 1 dòng YPromo để nối với order, như trigger dùng P001)
+        self.promotions = [Promotion(promoid=gid('PR', 0, 2), description='Không khuyến mãi', minvalue=0,
+                                     expiredate=date(2099, 12, 31), discountpercent=0)]
+        self.promotions += [
+            Promotion(promoid=gid('PR', n, 2), description=f'Giảm {percent}%', minvalue=Decimal(minimum * 1000),
+                      expiredate=date(2099, 12, 31), discountpercent=Decimal(percent))
+            for n, (percent, minimum) in enumerate([(5, 200), (10, 500), (15, 1000)], start=1)
+        ]
+        self.bulk(Promotion, self.promotions)
+        # trg_order_create_invoice (order thanh toán qua API) cần khách C001 và khuyến mãi P001 của dữ liệu mẫu:
+        # tạo nếu database chỉ có dữ liệu sinh ra (không bị --purge xóa)
+        Customer.objects.get_or_create(customerid='C001', defaults={'fullname': 'Khách lẻ'})
+        procedures.advance_sequence('C', 'C001')
+        Promotion.objects.get_or_create(promoid='P001', defaults={
+            'description': 'Không khuyến mãi', 'minvalue': 0, 'expiredate': date(2099, 12, 31), 'discountpercent': 0,
+        })
+        self.stdout.write(
+            f'Reference data: {len(staff)} staff, {len(self.customer_ids)} customers, {len(self.table_ids)} tables, '
+            f'{len(categories)} categories, {len(dishes)} dishes, {len(materials)} materials'
+        )
+
+    # ==================== ORDER HISTORY ====================
+    def create_history(self):
+        o, rng = self.options, self.rng
+        end = o['end_date'] or timezone.localdate()
+        first_day = end - timedelta(days=o['days'] - 1)
+        tz = timezone.get_current_timezone()
+        self.pending = {model: [] for model in (Rorder, Ptorder, Detail, Invoice, Ypromo, Payment)}
+        self.totals = {'orders': 0, 'details': 0, 'invoices': 0}
+        self.quantities = {}
+        order_number = invoice_number = 0
+        started = time.perf_counter()
+
+        for offset in range(o['days']):
+            day = first_day + timedelta(days=offset)
+            opening = timezone.make_aware(datetime.combine(day, dtime(10, 0)), tz)
+            for _ in range(max(0, round(o['orders_per_day'] * rng.uniform(0.8, 1.2)))):
+                order_number += 1
+                order_id = gid('O', order_number, 8)
+                created = opening + timedelta(seconds=rng.randrange(12 * 3600))
+                paid = rng.random() >= 0.03
+                customer_id = rng.choice(self.customer_ids)
+                self.pending[Rorder].append(Rorder(
+                    orderid=order_id, createdat=created, status='Paid' if paid else 'Cancelled',
+                    quantity=0, otableid_id=rng.choice(self.table_ids),
+                ))
+                self.pending[Ptorder].append(Ptorder(
+                    ptorderid_id=order_id, ptstaffid_id=rng.choice(self.waiter_ids), ptcustomerid_id=customer_id,
+                ))
+
+                subtotal, item_count = Decimal(0), 0
+                lines = rng.sample(self.dish_ids, min(rng.randint(1, o['max_lines']), len(self.dish_ids)))
+                for item_id in lines:
+                    quantity = rng.randint(1, 3)
+                    subtotal += self.prices[item_id] * quantity
+                    item_count += quantity
+                    self.pending[Detail].append(Detail(
+                        dorderid_id=order_id, ditemid_id=item_id, dstaffid_id=rng.choice(self.chef_ids),
+                        quantity=quantity,
+                    ))
+
+                self.quantities[order_id] = item_count
+                if paid:
+                    invoice_number += 1
+                    self.add_invoice(invoice_number, order_id, customer_id, created, subtotal)
+
+            if len(self.pending[Detail]) >= self.batch_size or offset == o['days'] - 1:
+                self.flush()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'  {day}: {self.totals["orders"]} orders, {self.totals["details"]} details '
+                    f'({self.totals["details"] / elapsed:,.0f} details/s)'
+                )
+
+    def add_invoice(self, number, order_id, customer_id, created, subtotal):
+        rng = self.rng
+        invoice_id = gid('V', number, 8)
+        promotion = self.promotions[0]
+        if rng.random() < 0.2:
+            candidate = rng.choice(self.promotions[1:] or self.promotions)
+            if subtotal >= candidate.minvalue:
+                promotion = candidate
+        discount = (subtotal * promotion.discountpercent / 100).quantize(CENT)
+        tax = ((subtotal - discount) * TAX_RATE / 100).quantize(CENT)
+        paid_at = created + timedelta(minutes=rng.randint(20, 120))
+        cashier_id = rng.choice(self.cashier_ids)
+
+        self.pending[Invoice].append(Invoice(
+            invoiceid=invoice_id, datecreated=paid_at, tax=tax, istaffid_id=cashier_id, customerid_id=customer_id,
+        ))
+        self.pending[Ypromo].append(Ypromo(ypromoid=promotion, yinvoiceid_id=invoice_id, yorderid_id=order_id))
+        self.pending[Payment].append(Payment(
+            paymentid=gid('Y', number, 8), amount=subtotal - discount + tax, paydate=paid_at,
+            method=rng.choice(PAYMENT_METHODS), status='Success', pinvoiceid_id=invoice_id, pstaffid_id=cashier_id,
+        ))
+
+    def flush(self):
+        orders = self.pending[Rorder]
+        with transaction.atomic():
+            for model, rows in self.pending.items():
+                self.bulk(model, rows)
+            # Quantity: ghi 0 lúc INSERT rồi đặt giá trị tuyệt đối sau khi có Detail
+            # - đúng dù DB có trigger cộng dồn theo Detail (MySQL) hay không
+            for order in orders:
+                order.quantity = self.quantities.pop(order.orderid)
+            Rorder.objects.bulk_update(orders, ['quantity'], batch_size=self.batch_size)
+        self.totals['orders'] += len(orders)
+        self.totals['details'] += len(self.pending[Detail])
+        self.totals['invoices'] += len(self.pending[Invoice])
+        for rows in self.pending.values():
+            rows.clear()
+
+    def reset_stock(self):
+        materials = list(Material.objects.filter(materialid__startswith=PREFIX).order_by('materialid'))
+        for material in materials:
+            material.quantity = self.rng.randint(20, 500)
+        with transaction.atomic():
+            # Tồn kho đặt lại tuyệt đối: bỏ các dòng sổ kho do Detail vừa sinh ghi vào
+            StockMovement.objects.filter(materialid__startswith=PREFIX).delete()
+            Material.objects.bulk_update(materials, ['quantity'], batch_size=self.batch_size)
@@ -0,0 +1,71 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from backend.core.models import CustomerStats, CustomerStatsDaily, Detail, Ypromo
+from backend.core.serializers import order_total_expression
+
+CENT = Decimal('0.01')
+
+
+def visit_amount(subtotal, promo, day):
+    """fn_VisitAmount: tổng tiền order trừ giảm giá (khuyến mãi còn hạn vào ngày lập hóa đơn, đủ mức tối thiểu)"""
+    expire, minvalue, percent = promo
+    if day and expire and expire >= day and minvalue is not None and subtotal >= minvalue and percent is not None:
+        return subtotal - (subtotal * percent / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    return subtotal
+
+
+class Command(BaseCommand):
+    help = 'Backfill / rebuild the customer_stats and customer_stats_daily rollup tables from invoice history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size=1000, **kwargs):
+        # 1 query GROUP BY order cho tổng tiền, 1 query cho các dòng YPromo
+        subtotals = dict(
+            Detail.objects
+            .filter(dorderid__in=Ypromo.objects.values('yorderid'))
+            .values('dorderid')
+            .annotate(total=order_total_expression(''))
+            .values_list('dorderid', 'total')
+            .order_by()
+        )
+        links = Ypromo.objects.values_list(
+            'yorderid', 'yinvoiceid__customerid', 'yinvoiceid__datecreated',
+            'ypromoid__expiredate', 'ypromoid__minvalue', 'ypromoid__discountpercent',
+        )
+
+        totals = defaultdict(lambda: {'spent': Decimal('0'), 'visits': 0, 'last': None})
+        daily = defaultdict(lambda: {'spent': Decimal('0'), 'visits': 0})
+        for order_id, customer_id, created, *promo in links.iterator(chunk_size=batch_size):
+            day = created.date() if created else None
+            amount = visit_amount(subtotals.get(order_id, Decimal('0')), promo, day)
+            customer = totals[customer_id]
+            customer['spent'] += amount
+            customer['visits'] += 1
+            if created and (customer['last'] is None or created > customer['last']):
+                customer['last'] = created
+            if day:
+                daily[customer_id, day]['spent'] += amount
+                daily[customer_id, day]['visits'] += 1
+
+        with transaction.atomic():
+            CustomerStatsDaily.objects.all().delete()
+            CustomerStats.objects.all().delete()
+            CustomerStats.objects.bulk_create([
+                CustomerStats(customerid_id=customer_id, totalspent=row['spent'],
+                              visitcount=row['visits'], lastvisit=row['last'])
+                for customer_id, row in totals.items()
+            ], batch_size=batch_size)
+            CustomerStatsDaily.objects.bulk_create([
+                CustomerStatsDaily(customerid=customer_id, businessday=day,
+                                   totalspent=row['spent'], visitcount=row['visits'])
+                for (customer_id, day), row in daily.items()
+            ], batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt customer_stats: {len(totals)} customer(s), {len(daily)} customer-day row(s)'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from backend.core.models import ItemAvailability, Qdmaterial
+
+
+def item_portions():
+    """{ItemID: số phần còn làm được} cho mọi món có nguyên liệu - 1 query GROUP BY trên QDMaterial JOIN Material"""
+    rows = (
+        Qdmaterial.objects
+        .values('qditemid')
+        .annotate(portions=Min('qdmaterialid__quantity'))
+        .values_list('qditemid', 'portions')
+        .order_by()
+    )
+    return {item_id: None if portions is None else max(portions, 0) for item_id, portions in rows}
+
+
+class Command(BaseCommand):
+    help = 'Backfill / rebuild the item_availability table (portions makeable per item) from material stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size=1000, **kwargs):
+        portions = item_portions()
+        with transaction.atomic():
+            ItemAvailability.objects.all().delete()
+            ItemAvailability.objects.bulk_create([
+                ItemAvailability(itemid_id=item_id, portions=value) for item_id, value in portions.items()
+            ], batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt item_availability: {len(portions)} item(s)'))
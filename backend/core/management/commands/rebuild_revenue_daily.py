@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from backend.core.models import Rorder, RevenueDaily
+from backend.core.serializers import order_total_expression
+
+
+class Command(BaseCommand):
+    help = 'Backfill / rebuild the revenue_daily rollup table from paid order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help='First business day to rebuild (YYYY-MM-DD), default: beginning of history')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help='Last business day to rebuild (YYYY-MM-DD), default: end of history')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, date_from=None, date_to=None, batch_size=1000, **kwargs):
+        orders = Rorder.objects.filter(status='Paid')
+        rollup = RevenueDaily.objects.all()
+        if date_from:
+            orders = orders.filter(createdat__date__gte=date_from)
+            rollup = rollup.filter(businessday__gte=date_from)
+        if date_to:
+            orders = orders.filter(createdat__date__lte=date_to)
+            rollup = rollup.filter(businessday__lte=date_to)
+
+        # 1 query GROUP BY ngày cho toàn bộ lịch sử cần nạp
+        rows = (
+            orders
+            .annotate(day=TruncDate('createdat'))
+            .values('day')
+            .annotate(
+                revenue=order_total_expression(),
+                ordercount=Count('orderid', distinct=True),
+                itemcount=Coalesce(Sum('detail__quantity'), 0),
+            )
+            .order_by('day')
+        )
+        days = [
+            RevenueDaily(businessday=row['day'], revenue=row['revenue'],
+                         ordercount=row['ordercount'], itemcount=row['itemcount'])
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            deleted, _ = rollup.delete()
+            RevenueDaily.objects.bulk_create(days, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt revenue_daily: {len(days)} day(s) written, {deleted} old row(s) replaced'
+        ))
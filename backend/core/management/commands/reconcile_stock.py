@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from backend.core import stock
+from backend.core.models import Material, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold pending stock_movement rows into Material.Quantity (run periodically, e.g. every minute) '
+        'and report materials whose stock went negative'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report pending movements, do not fold them')
+
+    def handle(self, *args, dry_run=False, **kwargs):
+        if dry_run:
+            pending = stock.pending_deltas()
+            self.stdout.write(
+                f'{StockMovement.objects.count()} pending movement(s) across {len(pending)} material(s)'
+            )
+        else:
+            # Tồn kho hiện tại không đổi (chỉ chuyển từ sổ kho sang số dư) nên không cần bump('materials')
+            materials, movements = stock.compact()
+            self.stdout.write(self.style.SUCCESS(
+                f'Folded {movements} movement(s) into {materials} material(s)'
+            ))
+
+        # Kiểm tra kho không khóa dòng: các order đồng thời có thể cùng lấy phần cuối cùng
+        oversold = (
+            Material.objects
+            .annotate(stock=stock.stock_expression())
+            .filter(stock__lt=0)
+            .order_by('materialid')
+            .values_list('materialid', 'name', 'stock')
+        )
+        for material_id, name, quantity in oversold:
+            self.stdout.write(self.style.WARNING(f'  {material_id} {name}: stock {quantity}'))
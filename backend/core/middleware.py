@@ -0,0 +1,101 @@
+"""
+Đo số query, thời gian DB và thời gian Python cho từng request
+
+- Gắn kết quả vào header Server-Timing (xem được trong tab Network của DevTools):
+    Server-Timing: db;dur=3.2;desc="4 queries", db-slowest;dur=1.1, app;dur=8.4, total;dur=11.6
+- Ghi log cảnh báo (logger 'backend.core.slow_requests') khi request chậm hơn SLOW_REQUEST_MS.
+- response.query_stats giữ số liệu để test có thể kiểm tra ngân sách query của từng endpoint.
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import replica
+
+logger = logging.getLogger('backend.core.slow_requests')
+
+SLOWEST_SQL_LENGTH = 300
+
+
+class QueryStats:
+    """execute_wrapper ghi lại số query, tổng thời gian và câu chậm nhất"""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.db_time += elapsed
+            if elapsed >= self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+
+    @property
+    def app_time(self):
+        return max(self.total_time - self.db_time, 0.0)
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.count} queries"',
+            f'db-slowest;dur={self.slowest_time * 1000:.2f}',
+            f'app;dur={self.app_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+
+class QueryTimingMiddleware:
+    """Đặt ở đầu MIDDLEWARE để tính cả query của session/auth"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            # Connection là thread-local nên wrapper chỉ thấy query của request này
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        stats.total_time = time.perf_counter() - start
+
+        response['Server-Timing'] = stats.server_timing()
+        response.query_stats = stats
+        threshold = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        if threshold is not None and stats.total_time * 1000 >= threshold:
+            logger.warning(
+                'Slow request %s %s -> %s: %.1f ms total, %.1f ms DB in %d queries, slowest %.1f ms: %s',
+                request.method, request.get_full_path(), response.status_code,
+                stats.total_time * 1000, stats.db_time * 1000, stats.count,
+                stats.slowest_time * 1000, (stats.slowest_sql or '')[:SLOWEST_SQL_LENGTH],
+            )
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Chọn database đọc cho request (xem replica.py); ghi thành công thì ghim client vào primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = replica.set_read_alias(replica.read_alias_for(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            replica.reset_read_alias(token)
+        if replica.enabled() and request.method in replica.WRITE_METHODS and response.status_code < 400:
+            replica.pin_to_primary(request)
+        return response
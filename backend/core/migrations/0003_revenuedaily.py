@@ -0,0 +1,26 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_userprofile_admin_profile_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueDaily',
+            fields=[
+                ('businessday', models.DateField(db_column='BusinessDay', primary_key=True, serialize=False)),
+                ('revenue', models.DecimalField(db_column='Revenue', decimal_places=2, default=0, max_digits=14)),
+                ('ordercount', models.IntegerField(db_column='OrderCount', default=0)),
+                ('itemcount', models.IntegerField(db_column='ItemCount', default=0)),
+            ],
+            options={
+                'db_table': 'revenue_daily',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_resourceversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(db_column='Name', max_length=30, primary_key=True, serialize=False)),
+                ('nextvalue', models.BigIntegerField(db_column='NextValue')),
+            ],
+            options={
+                'db_table': 'id_sequence',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# (tên bộ đếm, model, cột khóa) - NextValue = số lớn nhất đang có + 1
+COUNTERS = [
+    ('INV', 'Invoice', 'invoiceid'),
+    ('ST', 'Staff', 'staffid'),
+]
+
+
+def seed_counters(apps, schema_editor, counters=COUNTERS):
+    IdSequence = apps.get_model('core', 'IdSequence')
+    existing_tables = {table.lower() for table in schema_editor.connection.introspection.table_names()}
+    for name, model_name, field in counters:
+        model = apps.get_model('core', model_name)
+        if model._meta.db_table.lower() not in existing_tables:
+            # Chưa chạy script SQL: bộ đếm bắt đầu từ 1
+            used = []
+        else:
+            used = [
+                int(value[len(name):])
+                for value in model.objects.filter(**{f'{field}__startswith': name}).values_list(field, flat=True)
+                if value[len(name):].isdigit()
+            ]
+        next_value = max(used, default=0) + 1
+        sequence, created = IdSequence.objects.get_or_create(name=name, defaults={'nextvalue': next_value})
+        if not created and sequence.nextvalue < next_value:
+            sequence.nextvalue = next_value
+            sequence.save(update_fields=['nextvalue'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_idsequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
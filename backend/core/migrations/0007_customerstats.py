@@ -0,0 +1,40 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_seed_id_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customerid', models.OneToOneField(db_column='CustomerID', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='core.customer')),
+                ('totalspent', models.DecimalField(db_column='TotalSpent', decimal_places=2, default=0, max_digits=14)),
+                ('visitcount', models.IntegerField(db_column='VisitCount', default=0)),
+                ('lastvisit', models.DateTimeField(blank=True, db_column='LastVisit', null=True)),
+            ],
+            options={
+                'db_table': 'customer_stats',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerStatsDaily',
+            fields=[
+                ('customerid', models.CharField(db_column='CustomerID', max_length=10, primary_key=True, serialize=False)),
+                ('businessday', models.DateField(db_column='BusinessDay')),
+                ('totalspent', models.DecimalField(db_column='TotalSpent', decimal_places=2, default=0, max_digits=14)),
+                ('visitcount', models.IntegerField(db_column='VisitCount', default=0)),
+            ],
+            options={
+                'db_table': 'customer_stats_daily',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_customerstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemAvailability',
+            fields=[
+                ('itemid', models.OneToOneField(db_column='ItemID', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='availability', serialize=False, to='core.item')),
+                ('portions', models.IntegerField(blank=True, db_column='Portions', null=True)),
+            ],
+            options={
+                'db_table': 'item_availability',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_itemavailability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('movementid', models.BigAutoField(db_column='MovementID', primary_key=True, serialize=False)),
+                ('materialid', models.CharField(db_column='MaterialID', max_length=10)),
+                ('orderid', models.CharField(blank=True, db_column='OrderID', max_length=10, null=True)),
+                ('detailid', models.IntegerField(blank=True, db_column='DetailID', null=True)),
+                ('delta', models.IntegerField(db_column='Delta')),
+                ('createdat', models.DateTimeField(blank=True, db_column='CreatedAt', null=True)),
+            ],
+            options={
+                'db_table': 'stock_movement',
+                'managed': False,
+            },
+        ),
+    ]
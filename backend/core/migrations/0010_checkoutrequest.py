@@ -0,0 +1,26 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:11
+
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutRequest',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('orderid', models.CharField(max_length=10)),
+                ('response', models.JSONField(encoder=rest_framework.utils.encoders.JSONEncoder)),
+                ('createdat', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'checkout_request',
+            },
+        ),
+    ]
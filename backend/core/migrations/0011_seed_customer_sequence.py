@@ -0,0 +1,24 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# Bộ đếm C cho sp_GetOrCreateCustomer (thay cho quét MAX trên bảng Customer)
+COUNTERS = [
+    ('C', 'Customer', 'customerid'),
+]
+
+
+def seed_counters(apps, schema_editor):
+    seed = import_module('backend.core.migrations.0006_seed_id_sequence').seed_counters
+    seed(apps, schema_editor, COUNTERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_checkoutrequest'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
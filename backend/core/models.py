@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from rest_framework.utils.encoders import JSONEncoder
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -23,6 +24,47 @@ class UserProfile(models.Model):
             return self.staff_profile.fullname
         return self.user.username
 
+class ResourceVersion(models.Model):
+    """Bộ đếm thay đổi cho từng nhóm dữ liệu (items, tables, ...) - tăng mỗi khi ghi qua API, dùng làm ETag"""
+    resource = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updatedat = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.resource} v{self.version}"
+
+class IdSequence(models.Model):
+    """
+    Bộ đếm sinh mã
+    - ORD: IdAllocator (utils.py) thuê từng block giá trị cho mỗi process
+    - INV, ST: fn_NextSequenceValue trong store_and_funcs.sql (seed bởi migration 0006)
+    """
+    name = models.CharField(db_column='Name', max_length=30, primary_key=True)
+    nextvalue = models.BigIntegerField(db_column='NextValue')
+
+    class Meta:
+        db_table = 'id_sequence'
+
+    def __str__(self):
+        return f"{self.name} -> {self.nextvalue}"
+
+class CheckoutRequest(models.Model):
+    """
+    Idempotency-Key của POST /api/orders/{id}/complete/ - ghi trong cùng transaction với thanh toán;
+    client gửi lại cùng key (retry khi mạng chậm) nhận lại đúng response đã lưu, không thanh toán lần nữa
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    orderid = models.CharField(max_length=10)
+    # Mã hóa như response của DRF để lần gửi lại trả về giống hệt lần đầu
+    response = models.JSONField(encoder=JSONEncoder)
+    createdat = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'checkout_request'
+
+    def __str__(self):
+        return f"{self.key} -> {self.orderid}"
+
 class Admin(models.Model):
     adminid = models.CharField(db_column='AdminID', primary_key=True, max_length=10)
     fullname = models.CharField(db_column='FullName', max_length=100)
@@ -96,6 +138,8 @@ class Invoice(models.Model):
     class Meta:
         managed = False
         db_table = 'invoice'
+        # MySQL: index do ensure_indexes tạo; khai báo ở đây để bảng SQLite nhúng (embedded.create_unmanaged_tables) cũng có
+        indexes = [models.Index(fields=['datecreated', 'invoiceid'], name='idx_invoice_created')]
 
 
 class Item(models.Model):
@@ -132,6 +176,8 @@ class Material(models.Model):
     class Meta:
         managed = False
         db_table = 'material'
+        # MySQL: index do ensure_indexes tạo; khai báo ở đây để bảng SQLite nhúng (embedded.create_unmanaged_tables) cũng có
+        indexes = [models.Index(fields=['quantity'], name='idx_material_quantity')]
 
 
 class Payment(models.Model):
@@ -146,6 +192,8 @@ class Payment(models.Model):
     class Meta:
         managed = False
         db_table = 'payment'
+        # MySQL: index do ensure_indexes tạo; khai báo ở đây để bảng SQLite nhúng (embedded.create_unmanaged_tables) cũng có
+        indexes = [models.Index(fields=['paydate', 'paymentid'], name='idx_payment_paydate')]
 
 
 class Promotion(models.Model):
@@ -191,6 +239,8 @@ class Rorder(models.Model):
     class Meta:
         managed = False
         db_table = 'rorder'
+        # MySQL: index do ensure_indexes tạo; khai báo ở đây để bảng SQLite nhúng (embedded.create_unmanaged_tables) cũng có
+        indexes = [models.Index(fields=['createdat', 'orderid'], name='idx_rorder_created')]
 
 
 class Rtable(models.Model):
@@ -243,4 +293,70 @@ class Ypromo(models.Model):
 
     class Meta:
         managed = False
-        db_table = 'ypromo'
\ No newline at end of file
+        db_table = 'ypromo'
+
+class RevenueDaily(models.Model):
+    # Bảng tổng hợp doanh thu theo ngày, cập nhật bởi trigger khi order chuyển sang 'Paid'
+    businessday = models.DateField(db_column='BusinessDay', primary_key=True)
+    revenue = models.DecimalField(db_column='Revenue', max_digits=14, decimal_places=2, default=0)
+    ordercount = models.IntegerField(db_column='OrderCount', default=0)
+    itemcount = models.IntegerField(db_column='ItemCount', default=0)
+
+    class Meta:
+        managed = False
+        db_table = 'revenue_daily'
+
+
+class CustomerStats(models.Model):
+    # Tổng chi tiêu của khách (customer_stats.sql), cộng dồn bởi trigger khi YPromo (hóa đơn <-> order) được tạo
+    customerid = models.OneToOneField(Customer, models.DO_NOTHING, db_column='CustomerID', primary_key=True, related_name='stats')
+    totalspent = models.DecimalField(db_column='TotalSpent', max_digits=14, decimal_places=2, default=0)
+    visitcount = models.IntegerField(db_column='VisitCount', default=0)
+    lastvisit = models.DateTimeField(db_column='LastVisit', blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'customer_stats'
+        indexes = [models.Index(fields=['totalspent'], name='idx_customer_stats_spent')]
+
+
+class CustomerStatsDaily(models.Model):
+    # Chi tiêu của khách theo ngày lập hóa đơn; khóa chính thật là (CustomerID, BusinessDay), chọn customerid làm khóa chính giả
+    customerid = models.CharField(db_column='CustomerID', primary_key=True, max_length=10)
+    businessday = models.DateField(db_column='BusinessDay')
+    totalspent = models.DecimalField(db_column='TotalSpent', max_digits=14, decimal_places=2, default=0)
+    visitcount = models.IntegerField(db_column='VisitCount', default=0)
+
+    class Meta:
+        managed = False
+        db_table = 'customer_stats_daily'
+        indexes = [models.Index(fields=['businessday'], name='idx_customer_stats_daily_day')]
+
+
+class ItemAvailability(models.Model):
+    # Số phần còn làm được của món theo tồn kho (item_availability.sql) = MIN(Quantity) các nguyên liệu của món,
+    # cập nhật bởi trigger khi Material.Quantity / QDMaterial đổi; NULL (hoặc không có dòng) = không giới hạn
+    # Quantity là số dư đã gộp: phần chưa gộp trong stock_movement được cộng lúc đọc (stock.item_portions)
+    itemid = models.OneToOneField(Item, models.DO_NOTHING, db_column='ItemID', primary_key=True, related_name='availability')
+    portions = models.IntegerField(db_column='Portions', blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'item_availability'
+
+
+class StockMovement(models.Model):
+    # Sổ nhập-xuất kho, chỉ ghi thêm (stock_ledger.sql): trigger trg_detail_* ghi Delta cho từng nguyên liệu
+    # thay vì UPDATE Material; tồn kho hiện tại = Material.Quantity + SUM(Delta) các dòng chưa gộp (stock.py)
+    # Không có khóa ngoại: dòng vẫn còn sau khi order / Detail bị xóa, tới khi reconcile_stock gộp vào Material
+    movementid = models.BigAutoField(db_column='MovementID', primary_key=True)
+    materialid = models.CharField(db_column='MaterialID', max_length=10)
+    orderid = models.CharField(db_column='OrderID', max_length=10, blank=True, null=True)
+    detailid = models.IntegerField(db_column='DetailID', blank=True, null=True)
+    delta = models.IntegerField(db_column='Delta')
+    createdat = models.DateTimeField(db_column='CreatedAt', blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'stock_movement'
+        indexes = [models.Index(fields=['materialid', 'delta'], name='idx_stock_movement_material')]
@@ -0,0 +1,77 @@
+"""
+Backend MySQL dùng connection pool (dbpool.ConnectionPool)
+
+DATABASES['default'] = {'ENGINE': 'backend.core.mysql_pool', ..., 'OPTIONS': {..., 'pool': {...}}}
+
+OPTIONS['pool'] (đều không bắt buộc): min_size, max_size, max_lifetime, max_idle, timeout, reset_sql
+- Lấy connection: ping() trước khi giao (connection chết thì bỏ, lấy/mở cái khác). Connection dùng lại
+  đã có sẵn trạng thái session (isolation level, SQL_AUTO_IS_NULL) nên không chạy lại init_connection_state.
+- Trả connection: chạy reset_sql - ROLLBACK phần transaction còn sót và xóa biến session
+  (@staff_id do procedures.add_staff đặt) để request sau không thấy trạng thái của request trước.
+  Connection đang trong atomic / autocommit bị đổi / có lỗi chưa kiểm tra thì đóng hẳn, không trả vào pool.
+- Cần CONN_MAX_AGE = 0: Django "đóng" connection cuối mỗi request = trả về pool.
+"""
+from django.db.backends.mysql import base
+from django.utils.asyncio import async_unsafe
+
+from .. import dbpool
+
+DEFAULT_RESET_SQL = 'ROLLBACK; SET @staff_id = NULL'
+
+
+def open_connection(conn_params):
+    """Như mysql.DatabaseWrapper.get_new_connection"""
+    connection = base.Database.connect(**conn_params)
+    if connection.encoders.get(bytes) is bytes:
+        connection.encoders.pop(bytes)
+    return connection
+
+
+def ping(connection):
+    connection.ping()
+
+
+def reset_session(connection, sql):
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pool = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        options = dict(self.settings_dict['OPTIONS'].get('pool') or {})
+        reset_sql = options.pop('reset_sql', DEFAULT_RESET_SQL)
+        # conv (bảng chuyển kiểu) không so sánh được - giống nhau giữa các connection
+        key = tuple(sorted((name, str(value)) for name, value in conn_params.items() if name != 'conv'))
+        self.pool = dbpool.get_pool(
+            self.alias, key,
+            connect=lambda: open_connection(conn_params),
+            check=ping,
+            reset=(lambda connection: reset_session(connection, reset_sql)) if reset_sql else None,
+            **options,
+        )
+        return self.pool.acquire()
+
+    def init_connection_state(self):
+        if getattr(self.connection, 'pool_initialized', False):
+            return
+        super().init_connection_state()
+        self.connection.pool_initialized = True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        discard = (
+            self.in_atomic_block
+            or self.autocommit != self.settings_dict['AUTOCOMMIT']
+            or self.errors_occurred
+        )
+        with self.wrap_database_errors:
+            self.pool.release(self.connection, discard=discard)
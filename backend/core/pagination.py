@@ -0,0 +1,204 @@
+"""
+Phân trang cho các danh sách lớn
+
+Keyset (cursor) cho /api/orders/, /api/details/, /api/invoices/,
+/api/payments/, /api/customers/
+
+- Thứ tự lấy từ queryset sau OrderingFilter (view.ordering hoặc ?ordering=), luôn thêm khóa chính
+  làm khóa phụ để thứ tự ổn định khi trùng (vd. nhiều order cùng CreatedAt).
+- Trang sau lọc WHERE (CreatedAt, OrderID) "sau" dòng cuối trang trước rồi LIMIT page_size + 1,
+  dùng được index (CreatedAt, OrderID) -> trang 1000 tốn như trang 1 (OFFSET phải đọc bỏ mọi dòng trước).
+- Không đếm tổng mặc định; ?count=1 mới chạy thêm SELECT COUNT(*).
+- Response: {"next": url, "previous": url, "results": [...]} (+ "count" khi ?count=1)
+
+GET /api/orders/?page_size=100
+GET /api/orders/?cursor=<next của trang trước>
+GET /api/invoices/?ordering=datecreated&count=1
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _row_value(obj, field):
+    if field == 'pk':
+        return obj.pk
+    try:
+        # Khóa ngoại: đọc cột <fk>_id, không query object liên quan
+        field = obj._meta.get_field(field).attname
+    except FieldDoesNotExist:
+        # Annotation (total_billed, ...) hoặc trường qua quan hệ (a__b)
+        pass
+    for name in field.split('__'):
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return obj
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        values, reverse = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+
+        ordering = [self._reversed(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            after = self._after(ordering, values)
+            queryset = queryset.none() if after is None else queryset.filter(after)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # ==================== THỨ TỰ ====================
+    def get_ordering(self, queryset):
+        """Các trường sắp xếp của queryset ('-createdat', ...) + khóa chính làm khóa phụ"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        for field in ordering:
+            if not isinstance(field, str) or field.lstrip('-') in ('', '?'):
+                raise ImproperlyConfigured(f'KeysetPagination chỉ hỗ trợ sắp xếp theo tên trường: {field!r}')
+        pk_name = queryset.model._meta.pk.name
+        if not any(field.lstrip('-') in ('pk', pk_name) for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return ordering
+
+    @staticmethod
+    def _reversed(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, values):
+        """
+        Điều kiện "đứng sau dòng có khóa `values`" theo `ordering`, cùng quy ước NULL của MySQL/SQLite
+        (tăng dần: NULL đứng đầu, giảm dần: NULL đứng cuối); None nếu không còn dòng nào
+        """
+        condition = None
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            if value is None:
+                beyond = None if descending else Q(**{f'{name}__isnull': False})
+            elif descending:
+                beyond = Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+            else:
+                beyond = Q(**{f'{name}__gt': value})
+            if beyond is not None:
+                term = equal & beyond
+                condition = term if condition is None else condition | term
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+    # ==================== CURSOR ====================
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """(giá trị khóa của dòng mốc, có phải lùi trang không); (None, False) nếu là trang đầu"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values, reverse, ordering = data['v'], bool(data.get('r')), data['o']
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        # Cursor của thứ tự khác (đổi ?ordering= giữa chừng, cursor của endpoint khác)
+        if ordering != ','.join(self.ordering) or not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, row, reverse):
+        data = {
+            'o': ','.join(self.ordering),
+            'v': [_encode_value(_row_value(row, field.lstrip('-'))) for field in self.ordering],
+        }
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class PageSizePagination(PageNumberPagination):
+    """Phân trang theo số trang (LIMIT/OFFSET) có ?page_size= cho danh sách cần tổng số dòng (nhân viên, nguyên liệu)"""
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,175 @@
+"""
+Stored procedure mà view gọi, kèm bản Python tương đương
+
+- MySQL (mặc định): CALL sp_... trong store_and_funcs.sql
+- USE_STORED_PROCEDURES = False hoặc database không phải MySQL (EMBEDDED_DB): chạy bản Python (ORM).
+  Trigger vẫn do database xử lý (trigger.sql trên MySQL, embedded.SQLITE_TRIGGERS trên SQLite),
+  nên bản Python chỉ làm đúng phần việc của procedure.
+Hai bản phải cho cùng kết quả - xem ProcedureTests (chạy trên MySQL khi có).
+"""
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+
+from .models import (
+    Cashier, Chef, Customer, Detail, IdSequence, Invoice, RevenueDaily, Rorder, Staff, Waiter, Ypromo,
+)
+from .serializers import order_total_expression
+
+
+class ProcedureError(DatabaseError):
+    """Tương đương SIGNAL SQLSTATE '45000' trong procedure"""
+
+
+def use_stored_procedures():
+    return connection.vendor == 'mysql' and getattr(settings, 'USE_STORED_PROCEDURES', True)
+
+
+def _leading_int(value):
+    """CAST(x AS UNSIGNED) của MySQL: lấy phần số ở đầu chuỗi, không có thì 0"""
+    match = re.match(r'\s*(\d+)', str(value or ''))
+    return int(match.group(1)) if match else 0
+
+
+# ==================== sp_GetOrCreateCustomer ====================
+def get_or_create_customer(phone, name):
+    """Trả về CustomerID của số điện thoại; chưa có thì tạo khách mới (C001, C002, ...)"""
+    if use_stored_procedures():
+        with connection.cursor() as cursor:
+            cursor.execute("CALL sp_GetOrCreateCustomer(%s, %s)", [phone, name])
+            result = cursor.fetchone()
+        return result[0] if result else None
+    return _get_or_create_customer(phone, name)
+
+
+def _get_or_create_customer(phone, name):
+    with transaction.atomic():
+        customer_id = Customer.objects.filter(phone=phone).values_list('customerid', flat=True).first()
+        if customer_id:
+            # Đã có: cập nhật tên nếu khác
+            Customer.objects.filter(customerid=customer_id).exclude(fullname=name).update(fullname=name)
+            return customer_id
+
+        # Bộ đếm C trong id_sequence (O(1), không quét bảng Customer); pad tối thiểu 3 chữ số, không cắt
+        customer_id = f"C{_next_sequence_value('C'):03d}"
+        Customer.objects.create(customerid=customer_id, fullname=name, phone=phone)
+        return customer_id
+
+
+# ==================== sp_DeleteOrder ====================
+def delete_order(order_id):
+    """Xóa order cùng Detail, YPromo (trigger trả lại kho) và trừ doanh thu đã cộng nếu order đã thanh toán"""
+    if use_stored_procedures():
+        with connection.cursor() as cursor:
+            cursor.execute("CALL sp_DeleteOrder(%s)", [order_id])
+        return
+    try:
+        with transaction.atomic():
+            _delete_order(order_id)
+    except DatabaseError as e:
+        raise ProcedureError('Lỗi khi xóa đơn hàng!') from e
+
+
+def _delete_order(order_id):
+    paid = Rorder.objects.filter(orderid=order_id, status='Paid').values('createdat', 'quantity').first()
+    if paid and paid['createdat']:
+        # Trừ revenue_daily trước khi xóa Detail (tổng tiền tính từ Detail)
+        subtotal = Detail.objects.filter(dorderid=order_id).aggregate(total=order_total_expression(''))['total']
+        RevenueDaily.objects.filter(businessday=paid['createdat'].date()).update(
+            revenue=F('revenue') - subtotal,
+            ordercount=F('ordercount') - 1,
+            itemcount=F('itemcount') - (paid['quantity'] or 0),
+        )
+
+    # Cùng thứ tự với sp_DeleteOrder: Invoice lọc theo YPromo sau khi YPromo của order đã bị xóa
+    Ypromo.objects.filter(yorderid=order_id).delete()
+    Invoice.objects.filter(invoiceid__in=Ypromo.objects.filter(yorderid=order_id).values('yinvoiceid')).delete()
+    Detail.objects.filter(dorderid=order_id).delete()
+    Rorder.objects.filter(orderid=order_id).delete()
+
+
+# ==================== sp_AddStaff ====================
+def add_staff(name, phone, manager_id, role, role_detail, staff_id=None):
+    """Thêm Staff + bảng chuyên môn (Chef/Cashier/Waiter), trả về StaffID (tự sinh STxx nếu không truyền)"""
+    if use_stored_procedures():
+        with connection.cursor() as cursor:
+            # INOUT parameter cho StaffID
+            cursor.execute("SET @staff_id = %s", [staff_id])
+            cursor.execute(
+                "CALL sp_AddStaff(@staff_id, %s, %s, %s, %s, %s)",
+                [name, phone, manager_id, role, role_detail]
+            )
+            cursor.execute("SELECT @staff_id")
+            return cursor.fetchone()[0]
+    try:
+        with transaction.atomic():
+            return _add_staff(name, phone, manager_id, role, role_detail, staff_id)
+    except DatabaseError as e:
+        raise ProcedureError('Lỗi khi thêm nhân viên!') from e
+
+
+def _next_sequence_value(name):
+    """fn_NextSequenceValue: khóa dòng bộ đếm tới hết transaction"""
+    sequence = IdSequence.objects.select_for_update().filter(name=name).first()
+    if sequence is None:
+        raise ProcedureError(f'ID sequence not found: {name}')
+    value = sequence.nextvalue
+    IdSequence.objects.filter(name=name).update(nextvalue=F('nextvalue') + 1)
+    return value
+
+
+def advance_sequence(name, object_id):
+    """Mã tạo thẳng, không qua bộ đếm (vd 'ST10', 'C042'): đẩy bộ đếm `name` qua mã đó để không cấp trùng"""
+    if re.fullmatch(rf'{name}[0-9]+', object_id or ''):
+        number = int(object_id[len(name):]) + 1
+        IdSequence.objects.filter(name=name, nextvalue__lt=number).update(nextvalue=number)
+
+
+def _add_staff(name, phone, manager_id, role, role_detail, staff_id):
+    if not staff_id:
+        # Pad tối thiểu 2 chữ số, không cắt (ST100) - như sp_AddStaff
+        staff_id = f"ST{_next_sequence_value('ST'):02d}"
+    else:
+        advance_sequence('ST', staff_id)
+
+    staff = Staff.objects.create(
+        staffid=staff_id, fullname=name, phone=phone, status='Working', smanagerid_id=manager_id
+    )
+    if role == 'Chef':
+        Chef.objects.create(staffid=staff, experience=_leading_int(role_detail))
+    elif role == 'Cashier':
+        Cashier.objects.create(staffid=staff, education=role_detail)
+    elif role == 'Waiter':
+        Waiter.objects.create(staffid=staff, fluency=role_detail)
+    else:
+        raise ProcedureError('Vai trò không hợp lệ! Chỉ chấp nhận: Chef, Cashier, Waiter')
+    return staff_id
+
+
+# ==================== sp_UpdateStaff ====================
+def update_staff(staff_id, name, phone, status, role_detail):
+    """Cập nhật Staff và thông tin chuyên môn theo vai trò hiện có"""
+    if use_stored_procedures():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CALL sp_UpdateStaff(%s, %s, %s, %s, %s)",
+                [staff_id, name, phone, status, role_detail]
+            )
+        return
+    try:
+        with transaction.atomic():
+            _update_staff(staff_id, name, phone, status, role_detail)
+    except DatabaseError as e:
+        raise ProcedureError('Lỗi khi cập nhật nhân viên!') from e
+
+
+def _update_staff(staff_id, name, phone, status, role_detail):
+    Staff.objects.filter(staffid=staff_id).update(fullname=name, phone=phone, status=status)
+    if Chef.objects.filter(staffid=staff_id).exists():
+        Chef.objects.filter(staffid=staff_id).update(experience=_leading_int(role_detail))
+    elif Cashier.objects.filter(staffid=staff_id).exists():
+        Cashier.objects.filter(staffid=staff_id).update(education=role_detail)
+    elif Waiter.objects.filter(staffid=staff_id).exists():
+        Waiter.objects.filter(staffid=staff_id).update(fluency=role_detail)
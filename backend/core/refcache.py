@@ -0,0 +1,164 @@
+"""
+Cache cho dữ liệu tham chiếu (món, đầu bếp, bàn, khuyến mãi, nhân viên)
+
+- Dùng cache alias settings.REFERENCE_CACHE_ALIAS (mặc định 'reference', LocMemCache:
+  TTL = TIMEOUT, LRU khi vượt MAX_ENTRIES) - có thể đổi sang Redis/Memcached trong CACHES.
+- Mỗi nhóm có một "generation"; invalidate(group) tăng generation nên mọi key cũ
+  của nhóm đó không còn được đọc nữa (và sẽ bị TTL/LRU dọn).
+- Các view ghi dữ liệu qua API phải gọi invalidate() cho nhóm tương ứng.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from . import replica
+from .models import Chef, Item, Rtable
+
+GROUPS = ('items', 'chefs', 'tables', 'promotions', 'staff')
+
+MISSING = object()
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+_invalidations = Counter()
+
+
+def _cache():
+    return caches[getattr(settings, 'REFERENCE_CACHE_ALIAS', 'reference')]
+
+
+def _generation_key(group):
+    return f'refcache:{group}:generation'
+
+
+def _generation(cache, group):
+    generation = cache.get(_generation_key(group))
+    if generation is None:
+        # Key generation bị xóa/evict: lấy giá trị mới theo thời gian để không đụng key cũ
+        cache.add(_generation_key(group), time.time_ns(), timeout=None)
+        generation = cache.get(_generation_key(group))
+    return generation
+
+
+def _full_key(cache, group, key):
+    return f'refcache:{group}:{_generation(cache, group)}:{key}'
+
+
+def lookup(group, key):
+    """Đọc `key` trong nhóm `group`; trả về MISSING nếu chưa có"""
+    cache = _cache()
+    value = cache.get(_full_key(cache, group, key), MISSING)
+    with _stats_lock:
+        if value is MISSING:
+            _misses[group] += 1
+        else:
+            _hits[group] += 1
+    return value
+
+
+def store(group, key, value):
+    cache = _cache()
+    cache.set(_full_key(cache, group, key), value)
+
+
+def get_or_load(group, key, loader):
+    """
+    Đọc `key` trong nhóm `group`, nếu chưa có thì gọi loader() và lưu lại
+    loader() luôn đọc từ primary: replica còn trễ ngay sau invalidate() sẽ đưa dữ liệu cũ vào cache tới hết TTL
+    """
+    value = lookup(group, key)
+    if value is MISSING:
+        with replica.primary_reads():
+            value = loader()
+        store(group, key, value)
+    return value
+
+
+def invalidate(*groups):
+    """Bỏ toàn bộ dữ liệu đã cache của các nhóm"""
+    cache = _cache()
+    for group in groups:
+        try:
+            cache.incr(_generation_key(group))
+        except ValueError:
+            cache.set(_generation_key(group), time.time_ns(), timeout=None)
+        with _stats_lock:
+            _invalidations[group] += 1
+
+
+def clear():
+    """Xóa cache và bộ đếm (dùng trong test)"""
+    _cache().clear()
+    with _stats_lock:
+        _hits.clear()
+        _misses.clear()
+        _invalidations.clear()
+
+
+def stats():
+    """Số lần hit/miss/invalidate của từng nhóm trong process hiện tại"""
+    with _stats_lock:
+        result = {}
+        for group in GROUPS:
+            hits, misses = _hits[group], _misses[group]
+            result[group] = {
+                'hits': hits,
+                'misses': misses,
+                'invalidations': _invalidations[group],
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            }
+        return result
+
+
+# ==================== LOADERS ====================
+def get_item(item_id):
+    return get_or_load('items', f'item:{item_id}', lambda: Item.objects.filter(itemid=item_id).first())
+
+
+def get_default_chef():
+    return get_or_load('chefs', 'default', lambda: Chef.objects.order_by('staffid').first())
+
+
+def get_table(table_id):
+    # Chỉ dùng cho thông tin cố định của bàn (số bàn, khu vực); Status luôn ghi bằng update_fields
+    return get_or_load('tables', f'table:{table_id}', lambda: Rtable.objects.filter(tableid=table_id).first())
+
+
+class ReferenceCacheMixin:
+    """
+    Mixin cho ModelViewSet: cache response của list/retrieve theo URL (kể cả query string)
+    trong nhóm `cache_group`; create/update/destroy qua API sẽ invalidate nhóm đó
+    """
+    cache_group = None
+
+    def _cached_response(self, request, render):
+        key = request.get_full_path()
+        data = lookup(self.cache_group, key)
+        if data is not MISSING:
+            return Response(data)
+        response = render()
+        if response.status_code == 200:
+            store(self.cache_group, key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, lambda: super(ReferenceCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, lambda: super(ReferenceCacheMixin, self).retrieve(request, *args, **kwargs))
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate(self.cache_group)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate(self.cache_group)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate(self.cache_group)
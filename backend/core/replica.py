@@ -0,0 +1,160 @@
+"""
+Đọc từ read replica cho các endpoint báo cáo / danh sách (alias 'replica' trong DATABASES)
+
+- ReplicaRoutingMiddleware chọn database đọc cho từng request: GET/HEAD có path bắt đầu bằng
+  một trong REPLICA_READ_PATHS thì đọc từ replica; mọi thứ khác (và mọi lệnh ghi) ở primary ('default').
+- Read-your-writes: client vừa ghi thành công (POST/PUT/PATCH/DELETE) được đọc từ primary
+  trong REPLICA_STICKY_SECONDS giây. Client nhận diện theo header Authorization (hoặc IP nếu chưa đăng nhập),
+  lưu trong cache REPLICA_STICKY_CACHE (dùng Redis/Memcached nếu chạy nhiều process).
+- Replica trễ hơn REPLICA_MAX_LAG_SECONDS (hoặc không đo được) thì quay về primary.
+  Độ trễ đo bằng SHOW REPLICA STATUS, tối đa một lần mỗi REPLICA_LAG_CHECK_INTERVAL giây mỗi process;
+  database đứng thay replica (không phải replica thật, SQLite) được coi là trễ 0.
+"""
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+_read_alias = ContextVar('replica_read_alias', default=None)
+_lag_lock = threading.Lock()
+_lag = {'checked_at': None, 'seconds': None}
+
+
+def enabled():
+    return REPLICA_ALIAS in settings.DATABASES and getattr(settings, 'REPLICA_READS', False)
+
+
+# ==================== ĐỘ TRỄ ====================
+def measure_lag(alias=REPLICA_ALIAS):
+    """Độ trễ replica (giây); None khi replication dừng"""
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        return 0
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except DatabaseError:
+            # MySQL < 8.0.22
+            cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            # Database thứ hai đứng thay replica: không có replication để trễ
+            return 0
+        status = dict(zip([column[0] for column in cursor.description], row))
+    return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+
+
+def replica_lag():
+    """Độ trễ đo gần nhất (đo lại sau REPLICA_LAG_CHECK_INTERVAL giây); None nếu không đo được"""
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+    now = time.monotonic()
+    with _lag_lock:
+        if _lag['checked_at'] is not None and now - _lag['checked_at'] < interval:
+            return _lag['seconds']
+        # Đánh dấu trước để các thread khác dùng giá trị cũ trong lúc đang đo
+        _lag['checked_at'] = now
+    try:
+        seconds = measure_lag()
+    except DatabaseError:
+        logger.warning('Không đo được độ trễ replica, đọc từ primary', exc_info=True)
+        seconds = None
+    with _lag_lock:
+        _lag['seconds'] = seconds
+    return seconds
+
+
+def replica_available():
+    lag = replica_lag()
+    return lag is not None and lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+
+
+# ==================== READ-YOUR-WRITES ====================
+def _sticky_key(request):
+    identity = request.META.get('HTTP_AUTHORIZATION') or request.META.get('REMOTE_ADDR', '')
+    return 'replica:sticky:' + hashlib.sha256(identity.encode()).hexdigest()
+
+
+def _sticky_cache():
+    return caches[getattr(settings, 'REPLICA_STICKY_CACHE', 'default')]
+
+
+def pin_to_primary(request):
+    """Client vừa ghi: các lần đọc trong REPLICA_STICKY_SECONDS giây tới đi primary"""
+    _sticky_cache().set(_sticky_key(request), True, timeout=getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def pinned_to_primary(request):
+    return bool(_sticky_cache().get(_sticky_key(request)))
+
+
+# ==================== CHỌN DATABASE ====================
+def read_alias_for(request):
+    """'replica' nếu request được đọc từ replica, None = primary"""
+    if not enabled() or request.method not in READ_METHODS:
+        return None
+    if not request.path.startswith(tuple(getattr(settings, 'REPLICA_READ_PATHS', ()))):
+        return None
+    if pinned_to_primary(request) or not replica_available():
+        return None
+    return REPLICA_ALIAS
+
+
+def set_read_alias(alias):
+    return _read_alias.set(alias)
+
+
+def reset_read_alias(token):
+    _read_alias.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Trong khối này mọi lệnh đọc đi primary (vd nạp dữ liệu vào cache dùng chung, xem refcache)"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def clear():
+    """Xóa độ trễ đã đo (dùng trong test)"""
+    with _lag_lock:
+        _lag.update(checked_at=None, seconds=None)
+
+
+class ReplicaRouter:
+    """Đọc theo lựa chọn của ReplicaRoutingMiddleware, ghi luôn ở primary"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Object đọc từ replica vẫn được lưu vào primary
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, REPLICA_ALIAS):
+            return None
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {'default', REPLICA_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replica nhận schema qua replication từ primary
+        if db == REPLICA_ALIAS:
+            return False
+        return None
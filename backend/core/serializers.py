@@ -1,8 +1,11 @@
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import (
     Item, Rtable, Rorder, Detail, Customer, Invoice, 
-    Payment, Promotion, Staff, Chef, Cashier, Waiter, Material
+    Payment, Promotion, Staff, Chef, Cashier, Waiter, Material, Ypromo
 )
 
 # ==================== ITEM SERIALIZER ====================
@@ -34,6 +37,19 @@ class DetailSerializer(serializers.ModelSerializer):
 
 
 # ==================== ORDER SERIALIZER ====================
+def order_total_expression(prefix='detail__'):
+    """
+    Biểu thức SUM(Quantity * Price) tính tổng tiền order ngay trong SQL
+    - prefix='detail__' khi annotate trên Rorder, '' khi aggregate trên Detail
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    return Coalesce(
+        Sum(F(f'{prefix}quantity') * F(f'{prefix}ditemid__price'), output_field=money),
+        Value(Decimal('0')),
+        output_field=money,
+    )
+
+
 class OrderDetailSerializer(serializers.ModelSerializer):
     """
     Serializer chi tiết cho Order - bao gồm tất cả Detail của order
@@ -46,16 +62,19 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         fields = ['orderid', 'createdat', 'status', 'quantity', 'otableid', 'details', 'total_price']
     
     def get_details(self, obj):
-        """Lấy tất cả Detail liên quan đến Order này"""
-        details = Detail.objects.filter(dorderid=obj)
+        """Lấy tất cả Detail liên quan đến Order này (dùng dữ liệu prefetch nếu có)"""
+        details = getattr(obj, 'prefetched_details', None)
+        if details is None:
+            details = Detail.objects.filter(dorderid=obj).select_related('ditemid')
         return DetailSerializer(details, many=True).data
     
     def get_total_price(self, obj):
-        """Tính tổng tiền của Order"""
-        details = Detail.objects.filter(dorderid=obj)
-        total = 0
-        for detail in details:
-            total += detail.quantity * detail.ditemid.price
+        """Tính tổng tiền của Order bằng SUM trong SQL (dùng annotation nếu có)"""
+        total = getattr(obj, 'order_total', None)
+        if total is None:
+            total = Detail.objects.filter(dorderid=obj).aggregate(
+                total=order_total_expression('')
+            )['total']
         return total
 
 
@@ -80,8 +99,12 @@ class TableSerializer(serializers.ModelSerializer):
         fields = ['tableid', 'tablenumber', 'area', 'status', 'current_order']
     
     def get_current_order(self, obj):
-        """Lấy order đang phục vụ (nếu có)"""
-        order = Rorder.objects.filter(otableid=obj, status='Serving').first()
+        """Lấy order đang phục vụ (nếu có) - dùng serving_orders đã prefetch nếu có"""
+        serving_orders = getattr(obj, 'serving_orders', None)
+        if serving_orders is not None:
+            order = serving_orders[0] if serving_orders else None
+        else:
+            order = Rorder.objects.filter(otableid=obj, status='Serving').order_by('orderid').first()
         if order:
             return OrderDetailSerializer(order).data
         return None
@@ -96,6 +119,44 @@ class CustomerSerializer(serializers.ModelSerializer):
         read_only_fields = ['customerid']
 
 
+def customer_invoice_aggregates():
+    """
+    Annotate cho Customer (1 query GROUP BY): số hóa đơn, tổng tiền hóa đơn, ngày hóa đơn gần nhất
+    Tiền 1 hóa đơn = tổng tiền các order gắn với nó qua YPromo + thuế
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    orders = Ypromo.objects.filter(yinvoiceid=OuterRef(OuterRef('invoice__invoiceid'))).values('yorderid')
+    invoice_subtotal = Subquery(
+        Detail.objects
+        .filter(dorderid__in=orders)
+        .annotate(one=Value(1))
+        .values('one')
+        .annotate(total=Sum(F('quantity') * F('ditemid__price'), output_field=money))
+        .values('total'),
+        output_field=money,
+    )
+    return {
+        'invoice_count': Count('invoice'),
+        'total_billed': Coalesce(
+            Sum(Coalesce('invoice__tax', Value(Decimal('0'))) + Coalesce(invoice_subtotal, Value(Decimal('0'))),
+                output_field=money),
+            Value(Decimal('0')),
+            output_field=money,
+        ),
+        'last_invoice_date': Max('invoice__datecreated'),
+    }
+
+
+class CustomerInvoiceStatsSerializer(CustomerSerializer):
+    """Customer kèm số liệu hóa đơn (GET /api/customers/?with_stats=1)"""
+    invoice_count = serializers.IntegerField(read_only=True)
+    total_billed = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    last_invoice_date = serializers.DateTimeField(read_only=True)
+
+    class Meta(CustomerSerializer.Meta):
+        fields = CustomerSerializer.Meta.fields + ['invoice_count', 'total_billed', 'last_invoice_date']
+
+
 # ==================== INVOICE SERIALIZER ====================
 class InvoiceSerializer(serializers.ModelSerializer):
     """Serializer cho Invoice (Hóa đơn)"""
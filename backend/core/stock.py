@@ -0,0 +1,116 @@
+"""
+Tồn kho nguyên liệu theo sổ nhập-xuất kho (bảng stock_movement, stock_ledger.sql)
+
+- Trigger trg_detail_ai/au/ad chỉ INSERT vào stock_movement (MaterialID, OrderID, DetailID, Delta),
+  không UPDATE Material: các order cùng dùng một nguyên liệu phổ biến không còn chờ khóa của cùng một dòng.
+- Tồn kho hiện tại = Material.Quantity (số dư đã gộp) + SUM(Delta) các dòng chưa gộp (fn_MaterialStock).
+- compact() (lệnh reconcile_stock, chạy định kỳ) cộng các dòng vào Material.Quantity rồi xóa chúng;
+  item_availability được trigger cập nhật lúc này, phần chưa gộp được cộng khi đọc (item_portions).
+- Kiểm tra kho (trigger *_check_stock, add_items) đọc tồn kho hiện tại nhưng không khóa dòng nào:
+  hai order đồng thời có thể cùng lấy phần cuối cùng, tồn kho âm được reconcile_stock báo lại.
+"""
+from django.db import transaction
+from django.db.models import F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import ItemAvailability, Material, Qdmaterial, StockMovement
+
+
+def pending_deltas(material_ids=None):
+    """{MaterialID: SUM(Delta) chưa gộp} (GROUP BY trên index idx_stock_movement_material)"""
+    movements = StockMovement.objects.order_by()
+    if material_ids is not None:
+        movements = movements.filter(materialid__in=list(material_ids))
+    return dict(movements.values('materialid').annotate(delta=Sum('delta')).values_list('materialid', 'delta'))
+
+
+def stock_expression():
+    """Tồn kho hiện tại của queryset Material, dùng được trong annotate / filter / order_by"""
+    pending = (
+        StockMovement.objects
+        .filter(materialid=OuterRef('materialid'))
+        .order_by()
+        .values('materialid')
+        .annotate(delta=Sum('delta'))
+        .values('delta')
+    )
+    return F('quantity') + Coalesce(Subquery(pending), 0)
+
+
+def max_pending_debit():
+    """
+    Lượng trừ kho chưa gộp lớn nhất của một nguyên liệu (>= 0) - 1 query GROUP BY trên idx_stock_movement_material
+    Tồn kho hiện tại <= n kéo theo Material.Quantity <= n + max_pending_debit(): điều kiện lọc trước dùng được
+    index idx_material_quantity, trước khi tính tồn kho hiện tại cho từng dòng
+    """
+    lowest = (
+        StockMovement.objects.order_by()
+        .values('materialid')
+        .annotate(delta=Sum('delta'))
+        .aggregate(lowest=Min('delta'))['lowest']
+    )
+    return max(-(lowest or 0), 0)
+
+
+def current_stock(material_ids):
+    """{MaterialID: tồn kho hiện tại} - 1 query, không khóa dòng Material"""
+    return dict(
+        Material.objects
+        .filter(materialid__in=list(material_ids))
+        .annotate(stock=stock_expression())
+        .values_list('materialid', 'stock')
+    )
+
+
+def item_portions():
+    """
+    {ItemID: số phần còn làm được} theo tồn kho hiện tại (None = không giới hạn)
+    item_availability giữ số phần theo số dư đã gộp; chỉ các món dùng nguyên liệu còn dòng chưa gộp mới tính lại
+    """
+    portions = dict(ItemAvailability.objects.values_list('itemid', 'portions'))
+    pending = pending_deltas()
+    if not pending:
+        return portions
+
+    recipes = (
+        Qdmaterial.objects
+        .filter(qditemid__in=Qdmaterial.objects.filter(qdmaterialid__in=list(pending)).values('qditemid'))
+        .values_list('qditemid', 'qdmaterialid', 'qdmaterialid__quantity')
+    )
+    lowest = {}
+    for item_id, material_id, quantity in recipes:
+        # MIN bỏ qua nguyên liệu có Quantity NULL, như sp_RefreshItemAvailability
+        if quantity is not None:
+            stock = quantity + pending.get(material_id, 0)
+            lowest[item_id] = min(stock, lowest.get(item_id, stock))
+    for item_id, stock in lowest.items():
+        portions[item_id] = max(stock, 0)
+    return portions
+
+
+def compact(material_ids=None):
+    """
+    Gộp các dòng chưa gộp vào Material.Quantity rồi xóa chúng; trả về (số nguyên liệu, số dòng đã gộp)
+    Chỉ gộp tới MovementID lớn nhất lúc bắt đầu, dòng ghi thêm trong lúc gộp để lần sau.
+    """
+    with transaction.atomic():
+        movements = StockMovement.objects.order_by()
+        if material_ids is not None:
+            movements = movements.filter(materialid__in=list(material_ids))
+        upto = movements.aggregate(upto=Max('movementid'))['upto']
+        if upto is None:
+            return 0, 0
+        movements = movements.filter(movementid__lte=upto)
+
+        # FOR UPDATE: chờ các order còn đang ghi dòng có MovementID <= upto, để DELETE bên dưới
+        # không xóa dòng chưa được cộng
+        totals = {}
+        count = 0
+        for material_id, delta in movements.select_for_update().values_list('materialid', 'delta').iterator():
+            totals[material_id] = totals.get(material_id, 0) + delta
+            count += 1
+        for material_id, delta in totals.items():
+            if delta:
+                Material.objects.filter(materialid=material_id).update(quantity=F('quantity') + delta)
+        movements.delete()
+    return len(totals), count
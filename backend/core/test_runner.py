@@ -0,0 +1,68 @@
+"""
+Test runner cho các model managed = False
+
+Các bảng nghiệp vụ (Rtable, Rorder, Detail, ...) do script SQL trong mysql_code tạo,
+Django không tự tạo chúng trong test database. Runner này tạo các bảng đó
+ngay trước khi migrate chạy (để FK của UserProfile trỏ tới bảng đã tồn tại).
+
+- SQLite (EMBEDDED_DB=1): trigger SQLite được cài cùng lúc (embedded.prepare_database)
+- MySQL: sau migrate nạp trigger / function / procedure từ mysql_code vào test database,
+  để các test (kể cả ProcedureTests) chạy trên logic thật
+"""
+from pathlib import Path
+
+from django.apps import apps
+from django.db import connections
+from django.db.models.signals import post_migrate, pre_migrate
+from django.test.runner import DiscoverRunner
+
+from .embedded import create_unmanaged_tables
+
+MYSQL_CODE_DIR = Path(__file__).resolve().parent.parent / 'mysql_code'
+# Thứ tự nạp: function/procedure trước (trigger gọi fn_GenerateInvoiceID, fn_OrderSubtotal)
+MYSQL_SCRIPTS = [
+    'store_and_funcs.sql', 'stock_ledger.sql', 'trigger.sql', 'revenue_daily.sql', 'customer_stats.sql',
+    'item_availability.sql',
+]
+
+
+def mysql_script_statements(path):
+    """Tách script kiểu MySQL Workbench thành từng câu lệnh (hiểu DELIMITER, bỏ USE <db>)"""
+    delimiter = ';'
+    buffer = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split()[1]
+            continue
+        if not buffer and (not stripped or stripped.startswith('--')):
+            continue
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(buffer).strip()[:-len(delimiter)].strip()
+            buffer = []
+            # USE RestaurantDatabase sẽ chuyển sang database thật
+            if statement and not statement.upper().startswith('USE '):
+                yield statement
+
+
+def load_mysql_scripts(using='default', **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'mysql':
+        return
+    with connection.cursor() as cursor:
+        for script in MYSQL_SCRIPTS:
+            for statement in mysql_script_statements(MYSQL_CODE_DIR / script):
+                cursor.execute(statement)
+
+
+class UnmanagedTablesTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        core = apps.get_app_config('core')
+        pre_migrate.connect(create_unmanaged_tables, dispatch_uid='core_unmanaged_tables')
+        post_migrate.connect(load_mysql_scripts, sender=core, dispatch_uid='core_mysql_scripts')
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid='core_unmanaged_tables')
+            post_migrate.disconnect(sender=core, dispatch_uid='core_mysql_scripts')
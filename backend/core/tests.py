@@ -1,3 +1,1605 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from . import dbpool, procedures, refcache, replica, stock, utils, views
+from .events import broker
+from .models import (
+    Admin, Manager, Staff, Chef, Cashier, Customer, Invoice, Rtable, Rorder, Detail, Item, Material, Qdmaterial, RevenueDaily, IdSequence,
+    Promotion, Ypromo, Ptorder, CustomerStats, CustomerStatsDaily, Waiter, ItemAvailability, StockMovement,
+    CheckoutRequest, ResourceVersion, Payment,
+)
+from .utils import IdAllocator
+from .versioning import bump
+
+
+def create_base_data():
+    """Dữ liệu tối thiểu: admin, manager, 1 đầu bếp, danh mục + 2 món"""
+    admin = Admin.objects.create(adminid='AD01', fullname='Admin', permission='SuperAdmin')
+    manager = Manager.objects.create(managerid='MGR01', fullname='Manager', madminid=admin, permission='All')
+    staff = Staff.objects.create(staffid='ST01', fullname='Chef', status='Working', smanagerid=manager)
+    chef = Chef.objects.create(staffid=staff, experience=5)
+    category = Item.objects.create(itemid='CAT1', name='Category', price=0)
+    pho = Item.objects.create(itemid='F001', name='Pho', price=Decimal('150000'), status='Available', superitemid=category)
+    coffee = Item.objects.create(itemid='D001', name='Coffee', price=Decimal('35000'), status='Available', superitemid=category)
+    return chef, pho, coffee
+
+
+def create_serving_tables(count, chef, items, start=1):
+    """Tạo `count` bàn, mỗi bàn có 1 order Serving với 1 detail cho mỗi món"""
+    for table_id in range(start, start + count):
+        table = Rtable.objects.create(tableid=table_id, tablenumber=table_id, status='Occupied')
+        order = Rorder.objects.create(
+            orderid=f'ORD{table_id:03d}', createdat=timezone.now(),
+            status='Serving', quantity=0, otableid=table
+        )
+        for item in items:
+            Detail.objects.create(dorderid=order, ditemid=item, dstaffid=chef, quantity=2)
+
+
+def clear_unmanaged_tables():
+    tables = [
+        model._meta.db_table for model in apps.get_app_config('core').get_models()
+        if not model._meta.managed
+    ]
+    with connection.constraint_checks_disabled(), connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(table)}')
+
+
+class CoreTestCase(TestCase):
+    """Xóa cache dữ liệu tham chiếu giữa các test (LocMemCache sống suốt process)"""
+
+    def setUp(self):
+        refcache.clear()
+        self.client = APIClient()
+
+
+class CoreTransactionTestCase(TransactionTestCase):
+    """TransactionTestCase chỉ flush bảng managed: xóa thêm dữ liệu các bảng unmanaged sau mỗi test"""
+
+    def setUp(self):
+        refcache.clear()
+
+    def _fixture_teardown(self):
+        super()._fixture_teardown()
+        clear_unmanaged_tables()
+
+
+class FloorPlanTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+
+    def get_tables(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tables/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], len(ctx.captured_queries)
+
+    def test_current_order_details_and_total(self):
+        create_serving_tables(1, self.chef, [self.pho, self.coffee])
+        Rtable.objects.create(tableid=99, tablenumber=99, status='Available')
+
+        tables, _ = self.get_tables()
+
+        by_id = {table['tableid']: table for table in tables}
+        self.assertIsNone(by_id[99]['current_order'])
+        order = by_id[1]['current_order']
+        self.assertEqual(order['orderid'], 'ORD001')
+        self.assertEqual(len(order['details']), 2)
+        self.assertEqual(order['details'][0]['ditemid']['name'], 'Pho')
+        self.assertEqual(Decimal(order['total_price']), Decimal('370000'))
+
+    def test_query_count_does_not_grow_with_tables(self):
+        create_serving_tables(2, self.chef, [self.pho, self.coffee])
+        _, small_floor_queries = self.get_tables()
+
+        create_serving_tables(20, self.chef, [self.pho, self.coffee], start=3)
+        tables, large_floor_queries = self.get_tables()
+
+        self.assertEqual(len(tables), 22)
+        self.assertEqual(small_floor_queries, large_floor_queries)
+        # version (ETag) + COUNT phân trang + bàn + order Serving + detail/item
+        self.assertLessEqual(large_floor_queries, 5)
+
+
+class RevenueStatsTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+        self.table = Rtable.objects.create(tableid=1, tablenumber=1, status='Available')
+
+    def create_paid_order(self, order_id, created_at, items, status='Paid'):
+        order = Rorder.objects.create(
+            orderid=order_id, createdat=created_at, status=status, quantity=0, otableid=self.table
+        )
+        for item, quantity in items:
+            Detail.objects.create(dorderid=order, ditemid=item, dstaffid=self.chef, quantity=quantity)
+
+    def at(self, year, month, day, hour=12):
+        return timezone.make_aware(datetime(year, month, day, hour))
+
+    def test_daily_buckets_are_filled(self):
+        self.create_paid_order('ORD1', self.at(2025, 3, 2), [(self.pho, 1), (self.coffee, 2)])
+        self.create_paid_order('ORD2', self.at(2025, 3, 2, 18), [(self.pho, 1)])
+        self.create_paid_order('ORD3', self.at(2025, 3, 4), [(self.coffee, 1)])
+        self.create_paid_order('ORD4', self.at(2025, 3, 4), [(self.pho, 5)], status='Serving')
+        call_command('rebuild_revenue_daily', stdout=StringIO())
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/revenue/?from=2025-03-01&to=2025-03-05')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([row['date'] for row in response.data], ['01/03', '02/03', '03/03', '04/03', '05/03'])
+        self.assertEqual(
+            [Decimal(row['revenue']) for row in response.data],
+            [0, Decimal('370000'), 0, Decimal('35000'), 0]
+        )
+        self.assertEqual(response.data[1]['orders'], 2)
+        self.assertEqual(response.data[1]['items'], 4)
+
+    def test_month_buckets(self):
+        self.create_paid_order('ORD1', self.at(2025, 1, 31), [(self.pho, 1)])
+        self.create_paid_order('ORD2', self.at(2025, 3, 1), [(self.coffee, 1)])
+        call_command('rebuild_revenue_daily', stdout=StringIO())
+
+        response = self.client.get('/api/revenue/?from=2025-01-15&to=2025-03-10&bucket=month')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['date'] for row in response.data], ['01/2025', '02/2025', '03/2025'])
+        self.assertEqual(
+            [Decimal(row['revenue']) for row in response.data],
+            [Decimal('150000'), 0, Decimal('35000')]
+        )
+
+    def test_hour_buckets_read_details(self):
+        self.create_paid_order('ORD1', self.at(2025, 3, 2, 9), [(self.pho, 1)])
+        self.create_paid_order('ORD2', self.at(2025, 3, 2, 11), [(self.coffee, 2)])
+
+        response = self.client.get('/api/revenue/?from=2025-03-02&to=2025-03-02&bucket=hour')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 24)
+        self.assertEqual(Decimal(response.data[9]['revenue']), Decimal('150000'))
+        self.assertEqual(Decimal(response.data[11]['revenue']), Decimal('70000'))
+        self.assertEqual(response.data[10]['revenue'], 0)
+
+    def test_rebuild_only_replaces_requested_range(self):
+        self.create_paid_order('ORD1', self.at(2025, 3, 1), [(self.pho, 1)])
+        self.create_paid_order('ORD2', self.at(2025, 3, 2), [(self.coffee, 1)])
+        RevenueDaily.objects.create(businessday=date(2025, 3, 1), revenue=1, ordercount=1, itemcount=1)
+        RevenueDaily.objects.create(businessday=date(2025, 3, 2), revenue=1, ordercount=1, itemcount=1)
+
+        call_command('rebuild_revenue_daily', '--from', '2025-03-02', stdout=StringIO())
+
+        self.assertEqual(RevenueDaily.objects.get(businessday=date(2025, 3, 1)).revenue, 1)
+        rebuilt = RevenueDaily.objects.get(businessday=date(2025, 3, 2))
+        self.assertEqual((rebuilt.revenue, rebuilt.ordercount, rebuilt.itemcount), (Decimal('35000'), 1, 1))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/revenue/?bucket=year').status_code, 400)
+        self.assertEqual(self.client.get('/api/revenue/?from=2025-13-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/revenue/?from=2025-03-02&to=2025-03-01').status_code, 400)
+
+
+class OrderQuantityCheckTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+        create_serving_tables(3, self.chef, [self.pho, self.coffee])
+
+    def run_check(self, *args):
+        out = StringIO()
+        call_command('check_order_quantity', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_drift_without_fixing(self):
+        Rorder.objects.filter(orderid='ORD002').update(quantity=9)
+
+        output = self.run_check()
+
+        self.assertIn('ORD002: Quantity=9, SUM(Detail.Quantity)=4', output)
+        self.assertEqual(Rorder.objects.get(orderid='ORD002').quantity, 9)
+
+    def test_fix_repairs_only_drifted_orders(self):
+        Rorder.objects.filter(orderid='ORD001').update(quantity=None)
+        Rorder.objects.filter(orderid='ORD003').update(quantity=7)
+
+        self.assertIn('Repaired 2 order(s)', self.run_check('--fix'))
+        self.assertEqual(
+            dict(Rorder.objects.values_list('orderid', 'quantity')),
+            {'ORD001': 4, 'ORD002': 4, 'ORD003': 4}
+        )
+        self.assertIn('consistent', self.run_check())
+
+
+class EnsureIndexesTests(CoreTransactionTestCase):
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('ensure_indexes', *args, stdout=out)
+        return out.getvalue()
+
+    def index_names(self, table):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, table))
+
+    def test_creates_missing_indexes_once(self):
+        self.run_command('--drop')
+        self.assertNotIn('idx_rorder_table_status', self.index_names('rorder'))
+
+        self.assertIn('index(es) missing', self.run_command('--dry-run'))
+        self.assertNotIn('idx_rorder_table_status', self.index_names('rorder'))
+
+        self.run_command()
+        self.assertTrue({'idx_rorder_table_status', 'idx_rorder_status_created'} <= self.index_names('rorder'))
+        self.assertIn('idx_invoice_customer_date', self.index_names('invoice'))
+        self.assertIn('0 index(es) created', self.run_command())
+
+    def test_benchmark_reports_before_and_after(self):
+        self.run_command('--drop')
+
+        output = self.run_command('--benchmark', '--repeat', '1')
+
+        self.assertIn('Paid orders, last 30 days', output)
+        self.assertIn('before (ms)', output)
+
+
+class QueryTimingMiddlewareTests(CoreTestCase):
+    # Ngân sách query cho từng endpoint (tính cả query của middleware) - vượt là test fail
+    QUERY_BUDGETS = {
+        '/api/tables/': 5,
+        '/api/orders/': 4,
+        '/api/orders/ORD001/': 3,
+        '/api/items/': 3,
+        '/api/items/available/': 4,  # version + món (cache) + item_availability + sổ kho chưa gộp
+        '/api/revenue/': 1,
+        '/api/promotions/': 2,
+        '/api/details/': 3,
+        '/api/staff/': 3,
+        '/api/materials/': 4,
+        '/api/materials/low_stock/': 3,  # version + lượng trừ kho chưa gộp lớn nhất + danh sách
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+
+    def test_query_budgets(self):
+        for url, budget in self.QUERY_BUDGETS.items():
+            # Số query không được tăng theo số bàn / order
+            for tables in (2, 10):
+                with self.subTest(url=url, tables=tables):
+                    Detail.objects.all().delete()
+                    Rorder.objects.all().delete()
+                    Rtable.objects.all().delete()
+                    create_serving_tables(tables, self.chef, [self.pho, self.coffee])
+                    refcache.clear()
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(response.query_stats.count, budget)
+
+    def test_server_timing_header_matches_executed_queries(self):
+        create_serving_tables(3, self.chef, [self.pho])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tables/')
+
+        stats = response.query_stats
+        self.assertEqual(stats.count, len(ctx.captured_queries))
+        self.assertIn(f'db;dur={stats.db_time * 1000:.2f};desc="{stats.count} queries"', response['Server-Timing'])
+        self.assertIn('app;dur=', response['Server-Timing'])
+        self.assertLessEqual(stats.db_time, stats.total_time)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_logs_slow_requests(self):
+        with self.assertLogs('backend.core.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/tables/')
+
+        self.assertIn('Slow request GET /api/tables/ -> 200', logs.output[0])
+        self.assertIn('queries, slowest', logs.output[0])
+
+    @override_settings(SLOW_REQUEST_MS=60_000)
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs('backend.core.slow_requests', 'WARNING'):
+            self.client.get('/api/tables/')
+
+
+class BenchCommandTests(CoreTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+        create_serving_tables(3, self.chef, [self.pho, self.coffee])
+
+    def bench(self, *args):
+        out = StringIO()
+        call_command(
+            'bench', '--scenarios', 'tables,items_available,revenue', '--concurrency', '2',
+            '--duration', '0.2', '--warmup', '1', *args, stdout=out, stderr=StringIO()
+        )
+        return out.getvalue()
+
+    def test_reports_percentiles_and_queries_as_json(self):
+        report = json.loads(self.bench())
+
+        self.assertEqual(set(report['endpoints']), {'tables', 'items_available', 'revenue'})
+        tables = report['endpoints']['tables']
+        self.assertGreater(tables['requests'], 0)
+        self.assertEqual(tables['errors'], 0)
+        self.assertLessEqual(tables['latency_ms']['p50'], tables['latency_ms']['p99'])
+        self.assertEqual(tables['queries_per_request']['max'], 5)
+
+    def test_fails_on_regression_against_baseline(self):
+        report = json.loads(self.bench())
+        report['endpoints']['tables']['queries_per_request']['max'] = 1
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as baseline:
+            json.dump(report, baseline)
+
+        with self.assertRaisesMessage(CommandError, 'tables: queries/request 1 -> 5'):
+            self.bench('--baseline', baseline.name)
+
+
+class GenerateDataTests(CoreTestCase):
+    OPTIONS = [
+        '--seed', '7', '--end-date', '2025-03-31', '--days', '3', '--orders-per-day', '20', '--tables', '4',
+        '--categories', '2', '--items', '6', '--materials', '12', '--recipe-size', '2', '--managers', '1',
+        '--chefs', '2', '--cashiers', '1', '--waiters', '2', '--customers', '15', '--batch-size', '25',
+    ]
+
+    def generate(self, *extra):
+        call_command('generate_data', *self.OPTIONS, *extra, stdout=StringIO())
+        return list(Rorder.objects.order_by('orderid').values_list('orderid', 'createdat', 'status', 'quantity'))
+
+    def test_generates_consistent_history(self):
+        orders = self.generate()
+
+        self.assertGreater(len(orders), 40)
+        self.assertEqual(Item.objects.filter(superitemid__isnull=False).count(), 6)
+        self.assertEqual(Qdmaterial.objects.count(), 12)
+        self.assertEqual(Invoice.objects.count(), Rorder.objects.filter(status='Paid').count())
+        self.assertEqual(RevenueDaily.objects.count(), 3)
+        self.assertIn('consistent', self.run_quantity_check())
+        self.assertEqual({created.date() for _, created, _, _ in orders}, {date(2025, 3, 29), date(2025, 3, 30), date(2025, 3, 31)})
+
+    def run_quantity_check(self):
+        out = StringIO()
+        call_command('check_order_quantity', stdout=out)
+        return out.getvalue()
+
+    def test_same_seed_gives_same_data(self):
+        first = self.generate()
+        self.assertEqual(self.generate('--purge'), first)
+
+    def test_refuses_to_generate_twice_without_purge(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
+
+
+class ChangeFeedTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        create_base_data()
+        Rtable.objects.create(tableid=1, tablenumber=1, status='Available')
+
+    def test_order_create_publishes_events(self):
+        since = broker.last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/', {'otableid': 1}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        events = broker.events_since(since)
+        self.assertEqual([event['type'] for event in events], ['order.created', 'table.status'])
+        self.assertEqual(events[1]['data'], {'tableid': 1, 'status': 'Occupied'})
+
+    def test_stream_replays_events_after_last_event_id(self):
+        since = broker.last_id
+        broker.publish('table.status', {'tableid': 1, 'status': 'Reserved'})
+
+        response = self.client.get('/api/events/', HTTP_LAST_EVENT_ID=str(since))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        next(stream)  # retry
+        chunk = next(stream).decode()
+        response.close()
+
+        self.assertIn('event: table.status', chunk)
+        self.assertIn('"status": "Reserved"', chunk)
+
+
+class WriteEventsTests(CoreTestCase):
+    """Ghi Detail / Payment qua API CRUD cũng phát sự kiện cho change feed"""
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee, self.order = create_business_data()
+
+    def events(self, method, path, data=None):
+        since = broker.last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return [(event['type'], event['data']) for event in broker.events_since(since)]
+
+    def test_detail_writes_publish_order_items(self):
+        detail = Detail.objects.create(dorderid=self.order, ditemid=self.coffee, dstaffid=self.chef, quantity=1)
+
+        [(event_type, data)] = self.events('patch', f'/api/details/{detail.pk}/', {'quantity': 3})
+        self.assertEqual(event_type, 'order.items')
+        self.assertEqual((data['orderid'], data['quantity'], data['details']), ('ORD001', 3, [{'ditemid': 'D001', 'quantity': 3}]))
+
+        [(event_type, data)] = self.events('delete', f'/api/details/{detail.pk}/')
+        self.assertEqual((event_type, data['quantity'], data['details']), ('order.items', 0, []))
+
+    def test_payment_writes_publish_payment_events(self):
+        invoice = Invoice.objects.create(invoiceid='INV0001', istaffid_id='ST02', customerid_id='C001')
+        payment = Payment.objects.create(
+            paymentid='PAY01', amount=Decimal('330000'), method='Cash', status='Pending', pinvoiceid=invoice, pstaffid_id='ST02'
+        )
+
+        events = self.events('patch', f'/api/payments/{payment.pk}/', {'status': 'Done'})
+        self.assertEqual(events, [('payment.updated', {
+            'paymentid': 'PAY01', 'invoiceid': 'INV0001', 'amount': Decimal('330000.00'), 'status': 'Done'
+        })])
+        [(event_type, data)] = self.events('delete', f'/api/payments/{payment.pk}/')
+        self.assertEqual((event_type, data['paymentid']), ('payment.deleted', 'PAY01'))
+
+
+class ConditionalGetTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        create_base_data()
+
+    def test_not_modified_skips_list_query(self):
+        first = self.client.get('/api/items/')
+        etag = first['ETag']
+        self.assertEqual(first.status_code, 200)
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get('/api/items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_write_through_api_changes_etag(self):
+        etag = self.client.get('/api/promotions/')['ETag']
+
+        created = self.client.post('/api/promotions/', {
+            'promoid': 'P001', 'description': 'Opening', 'minvalue': '0', 'discountpercent': '10'
+        }, format='json')
+        self.assertEqual(created.status_code, 201)
+
+        response = self.client.get('/api/promotions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+    def test_table_etag_follows_orders(self):
+        Rtable.objects.create(tableid=1, tablenumber=1, status='Available')
+        etag = self.client.get('/api/tables/')['ETag']
+
+        self.client.post('/api/orders/', {'otableid': 1}, format='json')
+
+        self.assertEqual(self.client.get('/api/tables/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Tên/giá món lồng trong detail của bàn và order
+        etags = {path: self.client.get(path)['ETag'] for path in ('/api/tables/', '/api/orders/', '/api/details/')}
+        self.client.patch('/api/items/F001/', {'price': '160000'}, format='json')
+        for path, etag in etags.items():
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200, path)
+
+    def test_if_modified_since_same_second_is_modified(self):
+        bump('items')
+        last_modified = ResourceVersion.objects.get(resource='items').updatedat
+        second = int(last_modified.timestamp())
+
+        # Header cùng giây với lần ghi cuối: có thể có lần ghi sau lần đọc của client -> trả lại đầy đủ
+        response = self.client.get('/api/items/', HTTP_IF_MODIFIED_SINCE=http_date(second))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/items/', HTTP_IF_MODIFIED_SINCE=http_date(second + 1))
+        self.assertEqual(response.status_code, 304)
+
+
+class ReferenceCacheTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+        self.table = Rtable.objects.create(tableid=1, tablenumber=1, status='Available')
+
+    def test_add_item_reuses_cached_item_and_chef(self):
+        order_id = self.client.post('/api/orders/', {'otableid': 1}, format='json').data['orderid']
+        self.client.post(f'/api/orders/{order_id}/add_item/', {'ditemid': 'F001', 'quantity': 1}, format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/api/orders/{order_id}/add_item/', {'ditemid': 'F001', 'quantity': 1}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([d['quantity'] for d in response.data['details']], [2])
+        sql = [query['sql'] for query in ctx.captured_queries]
+        self.assertFalse([q for q in sql if 'FROM "chef"' in q or 'FROM "item"' in q])
+        self.assertGreaterEqual(refcache.stats()['chefs']['hits'], 1)
+        self.assertGreaterEqual(refcache.stats()['items']['hits'], 1)
+
+    def test_available_items_invalidated_on_write(self):
+        self.assertEqual(len(self.client.get('/api/items/available/').data), 2)
+        self.assertEqual(len(self.client.get('/api/items/available/').data), 2)
+        self.assertEqual(refcache.stats()['items']['hits'], 1)
+
+        self.client.patch('/api/items/D001/', {'status': 'Unavailable'}, format='json')
+
+        self.assertEqual([item['itemid'] for item in self.client.get('/api/items/available/').data], ['F001'])
+        self.assertEqual(refcache.stats()['items']['invalidations'], 1)
+
+    def test_stats_endpoint(self):
+        self.client.get('/api/promotions/')
+        self.client.get('/api/promotions/')
+
+        stats = self.client.get('/api/cache-stats/').data
+        self.assertEqual(stats['promotions'], {'hits': 1, 'misses': 1, 'invalidations': 0, 'hit_rate': 0.5})
+
+
+class BatchAddItemsTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+        self.table = Rtable.objects.create(tableid=1, tablenumber=1, status='Occupied')
+        self.order = Rorder.objects.create(
+            orderid='ORD001', createdat=timezone.now(), status='Serving', quantity=0, otableid=self.table
+        )
+        manager = Manager.objects.get(managerid='MGR01')
+        beef = Material.objects.create(materialid='M001', name='Beef', quantity=5)
+        Qdmaterial.objects.create(qdmaterialid=beef, qditemid=self.pho, qdmanagerid=manager)
+
+    def add_items(self, items):
+        return self.client.post(f'/api/orders/{self.order.orderid}/add_items/', {'items': items}, format='json')
+
+    def test_adds_and_merges_lines(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.coffee, dstaffid=self.chef, quantity=1)
+
+        response = self.add_items([
+            {'ditemid': 'F001', 'quantity': 2},
+            {'ditemid': 'D001', 'quantity': 1},
+            {'ditemid': 'F001', 'quantity': 1},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        quantities = {d['ditemid']['itemid']: d['quantity'] for d in response.data['details']}
+        self.assertEqual(quantities, {'D001': 2, 'F001': 3})
+        self.assertEqual(Decimal(response.data['total_price']), Decimal('520000'))
+        # trg_detail_*: tổng số món theo chênh lệch từng dòng, trừ kho theo số phần
+        self.assertEqual(response.data['quantity'], 5)
+        self.assertEqual(stock.current_stock(['M001']), {'M001': 2})
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def count_queries(items):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.add_items(items).status_code, 200)
+            return len(ctx.captured_queries)
+
+        count_queries([{'ditemid': 'F001', 'quantity': 1}])  # nạp cache đầu bếp + version
+        Detail.objects.all().delete()
+        small = count_queries([{'ditemid': 'F001', 'quantity': 1}])
+        Detail.objects.all().delete()
+        for item_id in ('D002', 'D003', 'D004'):
+            Item.objects.create(itemid=item_id, name=item_id, price=1, status='Available', superitemid_id='CAT1')
+        large = count_queries([{'ditemid': item_id, 'quantity': 1} for item_id in ('F001', 'D001', 'D002', 'D003', 'D004')])
+
+        self.assertEqual(small, large)
+
+    def test_resource_versions_bumped_after_commit(self):
+        # Dòng resource_version dùng chung cho mọi order: không được khóa suốt transaction thêm món,
+        # nếu không các add_items đồng thời (khác order) phải chờ nhau
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.add_items([{'ditemid': 'F001', 'quantity': 1}]).status_code, 200)
+
+        statements = [query['sql'] for query in ctx.captured_queries]
+        release = next(i for i, sql in enumerate(statements) if sql.startswith('RELEASE SAVEPOINT'))
+        versions = [i for i, sql in enumerate(statements) if ResourceVersion._meta.db_table in sql]
+        self.assertTrue(versions)
+        self.assertGreater(min(versions), release)
+
+    def test_rejects_whole_batch_on_shortage(self):
+        response = self.add_items([{'ditemid': 'D001', 'quantity': 1}, {'ditemid': 'F001', 'quantity': 6}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['materials'], [{'materialid': 'M001', 'required': 6, 'available': 5}])
+        self.assertFalse(Detail.objects.filter(dorderid=self.order).exists())
+
+    def test_rejects_unknown_items_and_bad_quantities(self):
+        self.assertEqual(self.add_items([{'ditemid': 'NOPE', 'quantity': 1}]).status_code, 404)
+        self.assertEqual(self.add_items([{'ditemid': 'F001', 'quantity': 0}]).status_code, 400)
+        self.assertEqual(self.add_items([]).status_code, 400)
+        self.assertEqual(self.add_items([{'ditemid': ['F001'], 'quantity': 1}]).status_code, 400)
+        self.assertEqual(self.add_items([{'ditemid': {'id': 'F001'}, 'quantity': 1}]).status_code, 400)
+
+    def test_rejects_orders_not_serving(self):
+        # Order bị hủy sau get_object(): trạng thái được kiểm tra lại dưới select_for_update
+        serving = Rorder.objects.get(pk=self.order.pk)
+        Rorder.objects.filter(pk=self.order.pk).update(status='Cancelled')
+        with mock.patch.object(views.OrderViewSet, 'get_object', return_value=serving):
+            response = self.add_items([{'ditemid': 'F001', 'quantity': 1}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'Cancelled')
+
+        self.assertEqual(self.add_items([{'ditemid': 'F001', 'quantity': 1}]).status_code, 409)
+        self.assertFalse(Detail.objects.filter(dorderid=self.order).exists())
+
+
+class IdAllocatorTests(CoreTransactionTestCase):
+    """Mỗi IdAllocator đóng vai 1 worker process; các thread gọi song song như nhiều terminal"""
+
+    WORKERS = 8
+    ORDERS_PER_WORKER = 250
+
+    def allocate(self, allocator):
+        try:
+            return [allocator.next_id() for _ in range(self.ORDERS_PER_WORKER)]
+        finally:
+            connections.close_all()
+
+    def test_parallel_allocation_is_unique_and_monotonic(self):
+        allocators = [IdAllocator('ORD', block_size=20) for _ in range(self.WORKERS)]
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            batches = list(pool.map(self.allocate, allocators))
+
+        ids = [order_id for batch in batches for order_id in batch]
+        self.assertEqual(len(ids), len(set(ids)))
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch))
+            self.assertTrue(all(len(order_id) == 10 for order_id in batch))
+
+        # Mở toàn bộ order với các mã đã cấp: khóa chính không được trùng
+        table = Rtable.objects.create(tableid=1, tablenumber=1, status='Occupied')
+        Rorder.objects.bulk_create([
+            Rorder(orderid=order_id, createdat=timezone.now(), status='Serving', quantity=0, otableid=table)
+            for order_id in ids
+        ])
+        self.assertEqual(Rorder.objects.count(), self.WORKERS * self.ORDERS_PER_WORKER)
+
+    @override_settings(ID_BLOCK_SIZE=5)
+    def test_concurrent_order_creation_through_api(self):
+        # Các thread = worker của server; mỗi thread 1 connection riêng, block nhỏ để thuê block trong lúc chạy
+        tables = self.WORKERS * 12
+        Rtable.objects.bulk_create([
+            Rtable(tableid=table_id, tablenumber=table_id, status='Available') for table_id in range(1, tables + 1)
+        ])
+        self.addCleanup(utils._allocators.clear)
+        utils._allocators.clear()
+
+        def open_orders(table_ids):
+            client = APIClient()
+            try:
+                return [client.post('/api/orders/', {'otableid': table_id}, format='json') for table_id in table_ids]
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            batches = list(pool.map(open_orders, [range(start, tables + 1, self.WORKERS) for start in range(1, self.WORKERS + 1)]))
+
+        responses = [response for batch in batches for response in batch]
+        self.assertEqual([response.status_code for response in responses], [201] * tables)
+        ids = [response.data['orderid'] for response in responses]
+        self.assertEqual(len(set(ids)), tables)
+        self.assertEqual(sorted(Rorder.objects.values_list('orderid', flat=True)), sorted(ids))
+        self.assertFalse(Rtable.objects.exclude(status='Occupied').exists())
+
+    def test_ids_do_not_collide_with_legacy_format(self):
+        order_id = IdAllocator('ORD').next_id()
+
+        self.assertRegex(order_id, r'^ORD[A-Z][0-9A-Z]{6}$')
+        sequence = IdSequence.objects.get(name='ORD')
+        self.assertEqual(sequence.nextvalue, int(order_id[3:], 36) + 100)
+
+
+class SeedIdSequenceTests(CoreTestCase):
+    """Migration 0006: bộ đếm INV/ST bắt đầu sau mã lớn nhất đang có"""
+
+    def seed(self):
+        for name in ('0006_seed_id_sequence', '0011_seed_customer_sequence'):
+            migration = import_module(f'backend.core.migrations.{name}')
+            # seed_counters chỉ dùng schema_editor.connection
+            migration.seed_counters(apps, SimpleNamespace(connection=connection))
+        return dict(IdSequence.objects.values_list('name', 'nextvalue'))
+
+    def test_seeds_from_existing_ids(self):
+        chef, _, _ = create_base_data()
+        manager = chef.staffid.smanagerid
+        cashier = Cashier.objects.create(
+            staffid=Staff.objects.create(staffid='ST12', fullname='Cashier', status='Working', smanagerid=manager)
+        )
+        Staff.objects.create(staffid='STX', fullname='Legacy', status='Working', smanagerid=manager)
+        customer = Customer.objects.create(customerid='C001', fullname='Customer')
+        for invoice_id in ('INV0003', 'INV0041', 'INVOLD'):
+            Invoice.objects.create(invoiceid=invoice_id, istaffid=cashier, customerid=customer)
+
+        counters = self.seed()
+
+        self.assertEqual(counters['ST'], 13)
+        self.assertEqual(counters['INV'], 42)
+        self.assertEqual(counters['C'], 2)
+
+    def test_never_moves_counter_backwards(self):
+        IdSequence.objects.update_or_create(name='INV', defaults={'nextvalue': 500})
+
+        self.assertEqual(self.seed()['INV'], 500)
+
+
+def create_business_data():
+    """create_base_data + những dòng trigger / procedure cần: thu ngân, khách C001, khuyến mãi P001, kho, bộ đếm"""
+    chef, pho, coffee = create_base_data()
+    manager = Manager.objects.get(managerid='MGR01')
+    Cashier.objects.create(
+        staffid=Staff.objects.create(staffid='ST02', fullname='Cashier', status='Working', smanagerid=manager)
+    )
+    Customer.objects.create(customerid='C001', fullname='Khách lẻ')
+    Promotion.objects.create(promoid='P001', description='Không khuyến mãi', minvalue=0, discountpercent=0)
+    beef = Material.objects.create(materialid='M001', name='Beef', quantity=5)
+    Qdmaterial.objects.create(qdmaterialid=beef, qditemid=pho, qdmanagerid=manager)
+    for name, value in (('INV', 1), ('ST', 3), ('C', 2)):
+        IdSequence.objects.update_or_create(name=name, defaults={'nextvalue': value})
+    table = Rtable.objects.create(tableid=1, tablenumber=1, status='Occupied')
+    order = Rorder.objects.create(
+        orderid='ORD001', createdat=timezone.make_aware(datetime(2025, 3, 2, 12)),
+        status='Serving', quantity=0, otableid=table
+    )
+    return chef, pho, coffee, order
+
+
+class TriggerTests(CoreTestCase):
+    """trigger.sql / revenue_daily.sql - trên SQLite là bản trong embedded.SQLITE_TRIGGERS"""
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee, self.order = create_business_data()
+
+    def state(self):
+        return (
+            Rorder.objects.get(orderid='ORD001').quantity,
+            stock.current_stock(['M001'])['M001'],
+        )
+
+    def test_detail_changes_track_order_quantity_and_stock(self):
+        detail = Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=2)
+        Detail.objects.create(dorderid=self.order, ditemid=self.coffee, dstaffid=self.chef, quantity=1)
+        self.assertEqual(self.state(), (3, 3))
+
+        detail.quantity = 4
+        detail.save()
+        self.assertEqual(self.state(), (5, 1))
+
+        detail.ditemid = self.coffee
+        detail.save()
+        self.assertEqual(self.state(), (5, 5))
+
+        Detail.objects.filter(dorderid=self.order).delete()
+        self.assertEqual(self.state(), (0, 5))
+
+    def test_insufficient_stock_is_rejected(self):
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=6)
+
+        detail = Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=3)
+        detail.quantity = 6
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            detail.save()
+        self.assertEqual(self.state(), (3, 2))
+
+    def test_paying_order_creates_invoice_and_revenue(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=2)
+
+        self.order.status = 'Paid'
+        self.order.save(update_fields=['status'])
+
+        link = Ypromo.objects.select_related('yinvoiceid').get(yorderid='ORD001')
+        self.assertEqual(link.ypromoid_id, 'P001')
+        self.assertEqual(link.yinvoiceid.invoiceid, 'INV0001')
+        self.assertEqual(link.yinvoiceid.tax, Decimal('30000'))
+        self.assertEqual((link.yinvoiceid.customerid_id, link.yinvoiceid.istaffid_id), ('C001', 'ST02'))
+        day = RevenueDaily.objects.get(businessday=date(2025, 3, 2))
+        self.assertEqual((day.revenue, day.ordercount, day.itemcount), (Decimal('300000'), 1, 2))
+
+        # Hủy order đã thanh toán: trừ lại doanh thu, không tạo hóa đơn mới
+        self.order.status = 'Cancelled'
+        self.order.save(update_fields=['status'])
+        day.refresh_from_db()
+        self.assertEqual((day.revenue, day.ordercount, day.itemcount), (0, 0, 0))
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_invoice_ids_grow_past_pad_width(self):
+        IdSequence.objects.update_or_create(name='INV', defaults={'nextvalue': 9999})
+        for order_id in ('ORD001', 'ORD002'):
+            order = Rorder.objects.get_or_create(
+                orderid=order_id,
+                defaults={'createdat': self.order.createdat, 'status': 'Serving', 'quantity': 0, 'otableid': self.order.otableid},
+            )[0]
+            Detail.objects.create(dorderid=order, ditemid=self.coffee, dstaffid=self.chef, quantity=1)
+            Rorder.objects.filter(orderid=order_id).update(status='Paid')
+
+        invoices = dict(Ypromo.objects.values_list('yorderid', 'yinvoiceid'))
+        self.assertEqual(invoices, {'ORD001': 'INV9999', 'ORD002': 'INV10000'})
+
+
+class CustomerStatsTests(CoreTestCase):
+    """customer_stats.sql (trigger trên YPromo, rebuild_customer_stats, /api/customers/top/) và ?with_stats=1"""
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee, self.order = create_business_data()
+        # Giảm 10% cho hóa đơn từ 100.000
+        Promotion.objects.filter(promoid='P001').update(
+            minvalue=100000, discountpercent=10, expiredate=date(2099, 12, 31)
+        )
+        regular = Customer.objects.create(customerid='C002', fullname='An', phone='0911111111')
+        self.second = Rorder.objects.create(
+            orderid='ORD002', createdat=timezone.now(), status='Serving', quantity=0, otableid_id=1
+        )
+        Ptorder.objects.create(ptorderid=self.second, ptstaffid_id='ST02', ptcustomerid=regular)
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=2)
+        Detail.objects.create(dorderid=self.second, ditemid=self.coffee, dstaffid=self.chef, quantity=2)
+
+    def pay(self, *orders):
+        for order in orders:
+            order.status = 'Paid'
+            order.save(update_fields=['status'])
+
+    def snapshot(self):
+        return (
+            sorted(CustomerStats.objects.values_list('customerid', 'totalspent', 'visitcount', 'lastvisit')),
+            sorted(CustomerStatsDaily.objects.values_list('customerid', 'businessday', 'totalspent', 'visitcount')),
+        )
+
+    def test_paid_invoice_updates_stats_incrementally(self):
+        self.pay(self.order, self.second)
+
+        stats = {row.customerid_id: row for row in CustomerStats.objects.all()}
+        # 300.000 - 10%; 70.000 dưới mức tối thiểu nên không giảm
+        self.assertEqual((stats['C001'].totalspent, stats['C001'].visitcount), (Decimal('270000'), 1))
+        self.assertEqual((stats['C002'].totalspent, stats['C002'].visitcount), (Decimal('70000'), 1))
+        self.assertEqual(stats['C002'].lastvisit, Invoice.objects.get(customerid='C002').datecreated)
+
+        # Xóa liên kết hóa đơn - order (sp_DeleteOrder): trừ lại
+        Ypromo.objects.filter(yorderid='ORD001').delete()
+        stats = CustomerStats.objects.get(customerid='C001')
+        self.assertEqual((stats.totalspent, stats.visitcount, stats.lastvisit), (0, 0, None))
+        self.assertEqual(CustomerStatsDaily.objects.get(customerid='C001').visitcount, 0)
+
+    def test_rebuild_matches_triggers(self):
+        self.pay(self.order, self.second)
+        expected = self.snapshot()
+        CustomerStats.objects.all().delete()
+
+        call_command('rebuild_customer_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_top_and_customer_stats_endpoints(self):
+        self.pay(self.order, self.second)
+        today = timezone.now().date()
+
+        top = self.client.get('/api/customers/top/').data
+        self.assertEqual([row['customerid'] for row in top], ['C001', 'C002'])
+        self.assertEqual(top[1]['fullname'], 'An')
+        self.assertEqual((top[0]['total_spent'], top[0]['average_ticket']), (Decimal('270000'), Decimal('270000')))
+        self.assertEqual(len(self.client.get('/api/customers/top/?limit=1').data), 1)
+        self.assertEqual(self.client.get(f'/api/customers/top/?since={today + timedelta(days=1)}').data, [])
+        self.assertEqual(len(self.client.get(f'/api/customers/top/?since={today}').data), 2)
+        self.assertEqual(self.client.get('/api/customers/top/?limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/customers/top/?since=yesterday').status_code, 400)
+
+        stats = self.client.get('/api/customers/C002/stats/').data
+        self.assertEqual((stats['total_spent'], stats['visit_count']), (Decimal('70000'), 1))
+        stats = self.client.get(f'/api/customers/C002/stats/?since={today + timedelta(days=1)}').data
+        self.assertEqual((stats['total_spent'], stats['visit_count'], stats['average_ticket']), (0, 0, 0))
+        self.assertEqual(self.client.get('/api/customers/C999/stats/').status_code, 404)
+
+    def test_customer_list_with_invoice_aggregates(self):
+        self.pay(self.order, self.second)
+        Customer.objects.create(customerid='C003', fullname='Binh')
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/customers/?with_stats=1&ordering=-total_billed&count=1').data
+        self.assertEqual(len(ctx.captured_queries), 2)  # COUNT + 1 query GROUP BY
+        self.assertEqual(data['count'], 3)
+        rows = {row['customerid']: row for row in data['results']}
+        self.assertEqual([row['customerid'] for row in data['results']], ['C001', 'C002', 'C003'])
+        # Tổng tiền order + thuế 10%
+        self.assertEqual((rows['C001']['invoice_count'], rows['C001']['total_billed']), (1, '330000.00'))
+        self.assertEqual((rows['C002']['total_billed'], rows['C003']['total_billed']), ('77000.00', '0.00'))
+        self.assertIsNone(rows['C003']['last_invoice_date'])
+
+        data = self.client.get('/api/customers/?with_stats=1&ordering=total_billed').data
+        self.assertEqual(data['results'][0]['customerid'], 'C003')
+        # Không có with_stats: danh sách thường, bỏ qua ordering theo cột tổng hợp
+        data = self.client.get('/api/customers/?ordering=-total_billed').data
+        self.assertEqual(list(data['results'][0]), ['customerid', 'fullname', 'phone'])
+
+class ProcedureTests(CoreTransactionTestCase):
+    """
+    procedures.py: trên MySQL mỗi kịch bản chạy 2 lần trên cùng dữ liệu - stored procedure rồi bản Python -
+    và 2 kết quả phải giống nhau (parity); database khác chỉ có bản Python
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee, self.order = create_business_data()
+
+    def run_each_implementation(self, scenario):
+        results = {}
+        for stored in ([True, False] if connection.vendor == 'mysql' else [False]):
+            if results:
+                clear_unmanaged_tables()
+                self.chef, self.pho, self.coffee, self.order = create_business_data()
+            with override_settings(USE_STORED_PROCEDURES=stored):
+                results[stored] = scenario()
+        if len(results) == 2:
+            self.assertEqual(results[True], results[False])
+        return results[False]
+
+    def test_get_or_create_customer(self):
+        def scenario():
+            first = procedures.get_or_create_customer('0901000001', 'An')
+            again = procedures.get_or_create_customer('0901000001', 'An Nguyễn')
+            second = procedures.get_or_create_customer('0901000002', 'Bình')
+            return first, again, second, list(Customer.objects.order_by('customerid').values_list('customerid', 'fullname'))
+
+        self.assertEqual(self.run_each_implementation(scenario), (
+            'C002', 'C002', 'C003', [('C001', 'Khách lẻ'), ('C002', 'An Nguyễn'), ('C003', 'Bình')]
+        ))
+
+    def test_new_customer_ids_come_from_counter(self):
+        def scenario():
+            # Mã mới lấy từ bộ đếm C, không từ mã lớn nhất trong bảng Customer
+            IdSequence.objects.filter(name='C').update(nextvalue=42)
+            customer_id = procedures.get_or_create_customer('0901000001', 'An')
+            IdSequence.objects.filter(name='C').update(nextvalue=999)
+            rollover = [procedures.get_or_create_customer(f'090100010{i}', name) for i, name in enumerate('AB')]
+            return customer_id, rollover, IdSequence.objects.get(name='C').nextvalue
+
+        self.assertEqual(self.run_each_implementation(scenario), ('C042', ['C999', 'C1000'], 1001))
+
+    def test_delete_paid_order_reverts_revenue_and_stock(self):
+        def scenario():
+            Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=2)
+            self.order.status = 'Paid'
+            self.order.save(update_fields=['status'])
+            procedures.delete_order('ORD001')
+            day = RevenueDaily.objects.get(businessday=date(2025, 3, 2))
+            return (
+                Rorder.objects.filter(orderid='ORD001').exists(),
+                Detail.objects.count(),
+                Ypromo.objects.count(),
+                stock.current_stock(['M001'])['M001'],
+                (Decimal(day.revenue), day.ordercount, day.itemcount),
+            )
+
+        self.assertEqual(self.run_each_implementation(scenario), (False, 0, 0, 5, (0, 0, 0)))
+
+    def test_add_and_update_staff(self):
+        def scenario():
+            chef_id = procedures.add_staff('Lan', '0902000001', 'MGR01', 'Chef', '7 năm')
+            waiter_id = procedures.add_staff('Hoa', '0902000002', 'MGR01', 'Waiter', 'English', staff_id='ST10')
+            cashier_id = procedures.add_staff('Minh', '0902000003', 'MGR01', 'Cashier', 'Đại học')
+            procedures.update_staff(chef_id, 'Lan Trần', '0902000001', 'Retired', '9')
+            staff = Staff.objects.get(staffid=chef_id)
+            return (
+                chef_id, waiter_id, cashier_id,
+                (staff.fullname, staff.status, Chef.objects.get(staffid=chef_id).experience),
+                IdSequence.objects.get(name='ST').nextvalue,
+            )
+
+        self.assertEqual(
+            self.run_each_implementation(scenario),
+            ('ST03', 'ST10', 'ST11', ('Lan Trần', 'Retired', 9), 12)
+        )
+
+    def test_generated_ids_grow_past_pad_width(self):
+        def scenario():
+            IdSequence.objects.filter(name='ST').update(nextvalue=99)
+            return [procedures.add_staff(name, f'090300000{i}', 'MGR01', 'Waiter', '') for i, name in enumerate('AB')]
+
+        self.assertEqual(self.run_each_implementation(scenario), ['ST99', 'ST100'])
+
+    def test_invalid_role_rolls_back(self):
+        def scenario():
+            with self.assertRaises(DatabaseError):
+                procedures.add_staff('X', '0902000009', 'MGR01', 'Janitor', '')
+            return Staff.objects.filter(phone='0902000009').exists(), IdSequence.objects.get(name='ST').nextvalue
+
+        self.assertEqual(self.run_each_implementation(scenario), (False, 3))
+
+
+class ConnectionPoolTests(CoreTestCase):
+    """dbpool.ConnectionPool với connection sqlite3 thật (backend mysql_pool dùng cùng pool này)"""
+
+    def make_pool(self, **options):
+        import sqlite3
+
+        def check(conn):
+            conn.execute('SELECT 1')
+
+        self.resets = []
+        options.setdefault('check', check)
+        options.setdefault('reset', self.resets.append)
+        return dbpool.ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **options)
+
+    def test_reuses_connection_and_resets_session(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(self.resets, [first])
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['size'], stats['in_use']), (1, 1, 1, 1))
+
+    def test_waits_then_times_out_when_full(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(dbpool.PoolTimeout):
+            pool.acquire()
+        self.assertEqual((pool.stats()['waits'], pool.stats()['timeouts']), (1, 1))
+
+    def test_broken_connection_replaced_on_checkout(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        first.close()  # vd. MySQL đã ngắt (wait_timeout, restart)
+
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        second.execute('SELECT 1')
+        self.assertEqual((pool.stats()['closed_broken'], pool.stats()['size']), (1, 1))
+
+    def test_failed_reset_and_discard_close_connection(self):
+        def failing_reset(conn):
+            raise DatabaseError('reset failed')
+
+        pool = self.make_pool(reset=failing_reset)
+        pool.release(pool.acquire())
+        pool.release(pool.acquire(), discard=True)
+        stats = pool.stats()
+        self.assertEqual((stats['closed_broken'], stats['closed_discarded'], stats['size']), (1, 1, 0))
+
+    def test_lifetime_and_idle_eviction_keep_min_size(self):
+        pool = self.make_pool(max_lifetime=0)
+        pool.release(pool.acquire())
+        self.assertEqual((pool.stats()['closed_expired'], pool.stats()['size']), (1, 0))
+
+        pool = self.make_pool(min_size=1, max_size=3, max_idle=0)
+        opened = [pool.acquire() for _ in range(3)]
+        for conn in opened:
+            pool.release(conn)
+        # Connection rảnh được dọn khi lấy connection mới, giữ lại min_size = 1 (cái dùng gần nhất)
+        self.assertIs(pool.acquire(), opened[-1])
+        stats = pool.stats()
+        self.assertEqual((stats['closed_idle'], stats['size'], stats['idle']), (2, 1, 0))
+
+    def test_stats_endpoint(self):
+        self.addCleanup(dbpool.close_all)
+        pool = dbpool.get_pool('pooled', ('db',), self.make_pool().connect, max_size=4)
+        pool.release(pool.acquire())
+
+        stats = self.client.get('/api/db-pool-stats/').data
+        self.assertEqual(
+            {key: stats['pooled'][key] for key in ('max_size', 'size', 'idle', 'in_use', 'created')},
+            {'max_size': 4, 'size': 1, 'idle': 1, 'in_use': 0, 'created': 1},
+        )
+
+
+@override_settings(REPLICA_READS=True, REPLICA_MAX_LAG_SECONDS=10)
+class ReplicaRoutingTests(CoreTransactionTestCase):
+    """'replica' là mirror của 'default' trong test: kiểm tra connection nào chạy query"""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        replica.clear()
+        caches['default'].clear()
+        self.client = APIClient()
+        Customer.objects.create(customerid='C001', fullname='Khách lẻ', phone='0900000000')
+
+    def queries_on(self, method, path, data=None):
+        """Số query chạy trên (primary, replica)"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as secondary:
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return len(primary.captured_queries), len(secondary.captured_queries)
+
+    def test_list_reads_from_replica(self):
+        primary, secondary = self.queries_on('get', '/api/customers/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(secondary, 0)
+        self.assertEqual(self.client.get('/api/customers/?count=1').data['count'], 1)
+        # Endpoint không nằm trong REPLICA_READ_PATHS vẫn đọc primary
+        self.assertEqual(self.queries_on('get', '/api/items/')[1], 0)
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.queries_on('post', '/api/customers/', {'customerid': 'C002', 'fullname': 'An', 'phone': '0911111111'})
+        primary, secondary = self.queries_on('get', '/api/customers/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(secondary, 0)
+
+        # Hết thời gian ghim
+        caches['default'].clear()
+        self.assertEqual(self.queries_on('get', '/api/customers/')[0], 0)
+
+    def test_cached_projections_load_from_primary(self):
+        create_base_data()
+        # /api/staff/ nằm trong REPLICA_READ_PATHS nhưng trang được nạp vào cache dùng chung:
+        # đọc từ replica còn trễ sau invalidate('staff') sẽ giữ danh bạ cũ tới hết TTL
+        with CaptureQueriesContext(connections['replica']) as secondary:
+            response = self.client.get('/api/staff/')
+        self.assertEqual([row['staffid'] for row in response.data['results']], ['ST01'])
+        self.assertFalse(any('"staff"' in query['sql'] for query in secondary.captured_queries))
+
+        # Request không nạp cache vẫn đọc replica
+        self.assertEqual(self.queries_on('get', '/api/customers/')[0], 0)
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch.object(replica, 'measure_lag', return_value=120):
+            self.assertEqual(self.queries_on('get', '/api/customers/')[1], 0)
+        # Độ trễ được nhớ tới lần đo sau
+        self.assertEqual(self.queries_on('get', '/api/customers/')[1], 0)
+
+        replica.clear()
+        with mock.patch.object(replica, 'measure_lag', side_effect=DatabaseError('replica down')), \
+                self.assertLogs('backend.core.replica', 'WARNING'):
+            self.assertEqual(self.queries_on('get', '/api/customers/')[1], 0)
+
+
+class StaffDirectoryTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chef = create_base_data()[0]
+        manager = self.chef.staffid.smanagerid
+        for staff_id, name, staff_status, model, extra in [
+            ('ST02', 'Minh', 'Working', Cashier, {'education': 'Đại học'}),
+            ('ST03', 'Hoa', 'On Leave', Waiter, {'fluency': 'English'}),
+            ('ST04', 'Lan', 'Working', None, {}),
+        ]:
+            staff = Staff.objects.create(staffid=staff_id, fullname=name, phone=f'09000000{staff_id[-2:]}',
+                                         status=staff_status, smanagerid=manager)
+            if model is not None:
+                model.objects.create(staffid=staff, **extra)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_projection_filters_and_pagination(self):
+        data, _ = self.get('/api/staff/')
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(
+            [(row['staffid'], row['role'], row['detail']) for row in data['results']],
+            [('ST01', 'Đầu Bếp', '5'), ('ST02', 'Thu Ngân', 'Đại học'), ('ST03', 'Phục Vụ', 'English'), ('ST04', 'Nhân Viên', '')],
+        )
+        self.assertEqual([row['staffid'] for row in self.get('/api/staff/?role=waiter')[0]['results']], ['ST03'])
+        self.assertEqual([row['staffid'] for row in self.get('/api/staff/?status=Working&ordering=-fullname')[0]['results']],
+                         ['ST02', 'ST04', 'ST01'])
+        self.assertEqual([row['staffid'] for row in self.get('/api/staff/?search=hoa')[0]['results']], ['ST03'])
+        self.assertEqual(self.get('/api/staff/role_counts/')[0], {'all': 4, 'chef': 1, 'cashier': 1, 'waiter': 1})
+        self.assertEqual(self.client.get('/api/staff/?role=janitor').status_code, 400)
+
+        data, _ = self.get('/api/staff/?page=2&page_size=3')
+        self.assertEqual([row['staffid'] for row in data['results']], ['ST04'])
+
+    def test_cached_until_staff_changes(self):
+        _, cold = self.get('/api/staff/?role=all')
+        data, warm = self.get('/api/staff/?role=all')
+        self.assertEqual(warm, 1)  # chỉ đọc version cho ETag
+        self.assertLess(warm, cold)
+
+        response = self.client.put('/api/staff/ST04/update_staff/', {'name': 'Lan Anh'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data, _ = self.get('/api/staff/?role=all')
+        self.assertEqual(data['results'][3]['fullname'], 'Lan Anh')
+
+        self.assertEqual(self.client.delete('/api/staff/ST04/').status_code, 200)
+        self.assertEqual(self.get('/api/staff/?role=all')[0]['count'], 3)
+        self.assertEqual(self.get('/api/staff/role_counts/')[0]['all'], 3)
+
+
+class MaterialListTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        _, pho, coffee = create_base_data()
+        manager = Manager.objects.get(managerid='MGR01')
+        for material_id, name, quantity, items in [
+            ('M001', 'Beef', 5, [pho]),
+            ('M002', 'Milk', 40, [coffee, pho]),
+            ('M003', 'Salt', 5, []),
+            ('M004', 'Sugar', 12, [coffee]),
+        ]:
+            material = Material.objects.create(materialid=material_id, name=name, quantity=quantity)
+            for item in items:
+                Qdmaterial.objects.create(qdmaterialid=material, qditemid=item, qdmanagerid=manager)
+
+    def test_sorted_page_with_linked_items(self):
+        data = self.client.get('/api/materials/').data
+        self.assertEqual(data['count'], 4)
+        by_id = {row['materialid']: row for row in data['results']}
+        self.assertEqual((by_id['M002']['item_ids'], by_id['M002']['item_names']), ('D001, F001', 'Coffee, Pho'))
+        self.assertEqual((by_id['M003']['item_ids'], by_id['M003']['item_names']), ('--', '--'))
+
+        data = self.client.get('/api/materials/?sort_by=quantity&order=desc').data
+        self.assertEqual([row['materialid'] for row in data['results']], ['M002', 'M004', 'M003', 'M001'])
+        self.assertEqual(self.client.get('/api/materials/?sort_by=name').status_code, 400)
+
+        # Trang 2 chỉ đọc đúng số dòng của trang (LIMIT/OFFSET trong SQL)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/materials/?sort_by=quantity&page=2&page_size=2').data
+        self.assertEqual([row['materialid'] for row in data['results']], ['M004', 'M002'])
+        self.assertTrue(any('LIMIT 2 OFFSET 2' in query['sql'] for query in ctx.captured_queries))
+
+    def test_low_stock(self):
+        data = self.client.get('/api/materials/low_stock/?threshold=5').data
+        self.assertEqual(data['threshold'], 5)
+        self.assertEqual([row['materialid'] for row in data['materials']], ['M001', 'M003'])
+        self.assertEqual(len(self.client.get('/api/materials/low_stock/').data['materials']), 2)
+        self.assertEqual(len(self.client.get('/api/materials/low_stock/?threshold=12').data['materials']), 3)
+        self.assertEqual(self.client.get('/api/materials/low_stock/?threshold=-1').status_code, 400)
+
+        # Poll với ETag: 304 cho tới khi tồn kho đổi
+        etag = self.client.get('/api/materials/low_stock/')['ETag']
+        self.assertEqual(self.client.get('/api/materials/low_stock/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch('/api/materials/M004/', {'quantity': 3}, format='json')
+        response = self.client.get('/api/materials/low_stock/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual([row['materialid'] for row in response.data['materials']], ['M004', 'M001', 'M003'])
+
+
+class ItemAvailabilityTests(CoreTestCase):
+    """item_availability.sql - trên SQLite là bản trong embedded.SQLITE_TRIGGERS"""
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee = create_base_data()
+        Item.objects.create(itemid='D002', name='Tea', price=Decimal('20000'), status='Available', superitemid_id='CAT1')
+        manager = Manager.objects.get(managerid='MGR01')
+        for material_id, quantity, item in [('M001', 5, self.pho), ('M002', 8, self.pho), ('M003', 3, self.coffee)]:
+            material = Material.objects.create(materialid=material_id, name=material_id, quantity=quantity)
+            Qdmaterial.objects.create(qdmaterialid=material, qditemid=item, qdmanagerid=manager)
+        table = Rtable.objects.create(tableid=1, tablenumber=1, status='Occupied')
+        self.order = Rorder.objects.create(orderid='ORD001', createdat=timezone.now(), status='Serving',
+                                           quantity=0, otableid=table)
+
+    def portions(self, query=''):
+        response = self.client.get(f'/api/items/available/{query}')
+        self.assertEqual(response.status_code, 200)
+        return {item['itemid']: item['portions'] for item in response.data}
+
+    def snapshot(self):
+        return dict(ItemAvailability.objects.values_list('itemid', 'portions'))
+
+    def test_portions_follow_stock(self):
+        self.assertEqual(self.portions(), {'F001': 5, 'D001': 3, 'D002': None})
+
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=2)
+        Detail.objects.create(dorderid=self.order, ditemid=self.coffee, dstaffid=self.chef, quantity=3)
+        self.assertEqual(self.portions(), {'F001': 3, 'D001': 0, 'D002': None})
+        self.assertEqual(self.portions('?in_stock=1'), {'F001': 3, 'D002': None})
+
+        # Trả kho khi xóa món khỏi order; bảng chỉ đổi khi sổ kho được gộp vào Material
+        Detail.objects.filter(ditemid=self.coffee).delete()
+        self.assertEqual(self.snapshot(), {'F001': 5, 'D001': 3})
+        call_command('reconcile_stock', stdout=StringIO())
+        self.assertEqual(self.snapshot(), {'F001': 3, 'D001': 3})
+        # Bỏ nguyên liệu khỏi công thức
+        Qdmaterial.objects.filter(qdmaterialid='M001').delete()
+        self.assertEqual(self.snapshot(), {'F001': 6, 'D001': 3})
+        Qdmaterial.objects.filter(qdmaterialid='M003').delete()
+        self.assertEqual(self.snapshot(), {'F001': 6})
+
+    def test_etag_changes_with_stock(self):
+        etag = self.client.get('/api/items/available/')['ETag']
+        self.assertEqual(self.client.get('/api/items/available/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.patch('/api/materials/M003/', {'quantity': 0}, format='json')
+        response = self.client.get('/api/items/available/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item['itemid']: item['portions'] for item in response.data}['D001'], 0)
+
+    def test_rebuild_matches_triggers(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=4)
+        call_command('reconcile_stock', stdout=StringIO())
+        Material.objects.filter(materialid='M003').update(quantity=-2)
+        expected = self.snapshot()
+        self.assertEqual(expected, {'F001': 1, 'D001': 0})
+
+        ItemAvailability.objects.all().delete()
+        call_command('rebuild_item_availability', stdout=StringIO())
+        self.assertEqual(self.snapshot(), expected)
+
+
+class CheckoutTests(CoreTestCase):
+    """POST /api/orders/{id}/complete/ - 1 transaction, Idempotency-Key"""
+
+    BODY = {'customer_name': 'An', 'customer_phone': '0901000001'}
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee, self.order = create_business_data()
+
+    def complete(self, order_id='ORD001', key=None, body=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(f'/api/orders/{order_id}/complete/', body or self.BODY, format='json', headers=headers)
+
+    def new_order(self, order_id):
+        number = int(order_id[3:])
+        table = Rtable.objects.create(tableid=number, tablenumber=number, status='Occupied')
+        return Rorder.objects.create(orderid=order_id, createdat=timezone.now(), status='Serving', quantity=0,
+                                     otableid=table)
+
+    def test_pays_order_in_fixed_number_of_queries(self):
+        def checkout(order, lines):
+            for item in lines:
+                Detail.objects.create(dorderid=order, ditemid=item, dstaffid=self.chef, quantity=1)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.complete(order.orderid)
+            self.assertEqual(response.status_code, 200)
+            return response, len(ctx.captured_queries)
+
+        response, _ = checkout(self.order, [self.pho])
+        self.assertEqual(response.data['order']['status'], 'Paid')
+        self.assertEqual(len(response.data['order']['details']), 1)
+        self.assertEqual(response.data['customer'], {'id': 'C002', 'name': 'An', 'phone': '0901000001'})
+        self.assertEqual(Rtable.objects.get(tableid=1).status, 'Available')
+        self.assertEqual(Ptorder.objects.values_list('ptorderid', 'ptstaffid', 'ptcustomerid').get(),
+                         ('ORD001', 'ST01', 'C002'))
+        self.assertEqual(Invoice.objects.get().customerid_id, 'C002')
+
+        # Khách cũ: số câu lệnh không phụ thuộc số món trong order
+        _, small = checkout(self.new_order('ORD002'), [self.pho])
+        _, large = checkout(self.new_order('ORD003'), [self.pho, self.coffee, self.coffee])
+        self.assertEqual(large, small)
+
+    def test_idempotency_key_replays_first_response(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=1)
+        first = self.complete(key='checkout-1')
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.complete(key='checkout-1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(Invoice.objects.count(), 1)
+
+        # Không có key: thanh toán lại order đã Paid bị từ chối; key của order khác cũng vậy
+        self.assertEqual(self.complete().status_code, 409)
+        self.new_order('ORD002')
+        self.assertEqual(self.complete('ORD002', key='checkout-1').status_code, 409)
+        self.assertEqual(self.complete(key='x' * 65).status_code, 400)
+
+    def test_paid_order_items_are_frozen(self):
+        detail = Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=1)
+        self.assertEqual(self.complete().status_code, 200)
+
+        # API: 409 cho mọi lần ghi món vào order đã thanh toán
+        responses = [
+            self.client.patch(f'/api/details/{detail.pk}/', {'quantity': 2}, format='json'),
+            self.client.delete(f'/api/details/{detail.pk}/'),
+            self.client.post('/api/orders/ORD001/add_item/', {'ditemid': 'D001', 'quantity': 1}, format='json'),
+            self.client.post('/api/orders/ORD001/add_items/', {'items': [{'ditemid': 'D001'}]}, format='json'),
+        ]
+        self.assertEqual([response.status_code for response in responses], [409] * 4)
+        # Database: trigger trg_detail_b*_invoiced chặn cả khi ghi thẳng
+        for write in (
+            lambda: Detail.objects.create(dorderid=self.order, ditemid=self.coffee, dstaffid=self.chef, quantity=1),
+            lambda: Detail.objects.filter(pk=detail.pk).update(quantity=2),
+            lambda: Detail.objects.filter(pk=detail.pk).delete(),
+        ):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                write()
+
+        # Bảng tổng hợp khớp với Detail: mốc ngày (revenue_daily) = tổng các mốc giờ (đọc Detail), customer_stats = rebuild
+        day = self.client.get('/api/revenue/?from=2025-03-02&to=2025-03-02').data
+        hours = self.client.get('/api/revenue/?from=2025-03-02&to=2025-03-02&bucket=hour').data
+        self.assertEqual(Decimal(day[0]['revenue']), sum(Decimal(bucket['revenue']) for bucket in hours))
+        self.assertEqual(Decimal(day[0]['revenue']), Decimal('150000'))
+        stats = list(CustomerStats.objects.order_by('customerid').values_list('customerid', 'totalspent', 'visitcount'))
+        call_command('rebuild_customer_stats', stdout=StringIO())
+        self.assertEqual(
+            list(CustomerStats.objects.order_by('customerid').values_list('customerid', 'totalspent', 'visitcount')), stats
+        )
+
+    def test_failure_rolls_back_whole_checkout(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=1)
+        with mock.patch.object(CheckoutRequest.objects, 'create', side_effect=DatabaseError('disk full')), \
+                self.assertLogs('backend.core.views', 'ERROR') as logs:
+            response = self.complete(key='checkout-1')
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('disk full', logs.output[0])
+        self.assertEqual(Rorder.objects.get(orderid='ORD001').status, 'Serving')
+        self.assertEqual(Rtable.objects.get(tableid=1).status, 'Occupied')
+        self.assertFalse(Ptorder.objects.exists())
+        self.assertFalse(Invoice.objects.exists())
+
+        # Procedure ghi rồi không trả về mã khách: raise để rollback, không commit nửa chừng
+        def no_customer_id(phone, name):
+            Customer.objects.create(customerid='C099', fullname=name, phone=phone)
+
+        with mock.patch.object(procedures, 'get_or_create_customer', side_effect=no_customer_id), \
+                self.assertLogs('backend.core.views', 'ERROR'):
+            response = self.complete(key='checkout-1')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.data['error'], 'Lỗi khi hoàn thành đơn hàng: Không thể tạo thông tin khách hàng!')
+        self.assertFalse(Customer.objects.filter(customerid='C099').exists())
+        self.assertEqual(Rorder.objects.get(orderid='ORD001').status, 'Serving')
+
+        # Retry cùng key sau lỗi chạy lại thanh toán
+        self.assertEqual(self.complete(key='checkout-1').status_code, 200)
+        self.assertEqual(Rorder.objects.get(orderid='ORD001').status, 'Paid')
+
+
+class StockLedgerTests(CoreTestCase):
+    """stock_ledger.sql - trigger trg_detail_* ghi sổ kho thay vì UPDATE Material"""
+
+    def setUp(self):
+        super().setUp()
+        self.chef, self.pho, self.coffee, self.order = create_business_data()
+        rice = Material.objects.create(materialid='M002', name='Rice', quantity=10)
+        Qdmaterial.objects.create(qdmaterialid=rice, qditemid=self.pho, qdmanagerid=Manager.objects.get(managerid='MGR01'))
+
+    def movements(self):
+        return sorted(StockMovement.objects.values_list('materialid', 'orderid', 'detailid', 'delta'))
+
+    def test_detail_writes_append_movements(self):
+        detail = Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=2)
+        detail.quantity = 3
+        detail.save()
+        key = ('ORD001', detail.detailid)
+        detail.delete()
+
+        self.assertEqual(self.movements(), [
+            ('M001', *key, -2), ('M001', *key, -1), ('M001', *key, 3),
+            ('M002', *key, -2), ('M002', *key, -1), ('M002', *key, 3),
+        ])
+        # Dòng Material không bị ghi
+        self.assertEqual(dict(Material.objects.values_list('materialid', 'quantity')), {'M001': 5, 'M002': 10})
+
+    def test_stock_reads_include_pending_movements(self):
+        self.client.post('/api/orders/ORD001/add_items/', {'items': [{'ditemid': 'F001', 'quantity': 4}]}, format='json')
+        self.assertEqual(stock.current_stock(['M001', 'M002']), {'M001': 1, 'M002': 6})
+        self.assertEqual(Material.objects.get(materialid='M001').quantity, 5)
+
+        materials = self.client.get('/api/materials/?sort_by=quantity').data['results']
+        self.assertEqual([(row['materialid'], row['quantity']) for row in materials], [('M001', 1), ('M002', 6)])
+        low = self.client.get('/api/materials/low_stock/?threshold=5').data['materials']
+        self.assertEqual([(row['materialid'], row['quantity']) for row in low], [('M001', 1)])
+        # Lọc trước trên số dư phải nới theo lượng trừ kho chưa gộp: M002 số dư 10 nhưng tồn kho 6
+        self.assertEqual(stock.max_pending_debit(), 4)
+        low = self.client.get('/api/materials/low_stock/?threshold=6').data['materials']
+        self.assertEqual([(row['materialid'], row['quantity']) for row in low], [('M001', 1), ('M002', 6)])
+        self.assertEqual(self.client.get('/api/materials/M002/').data['quantity'], 6)
+        available = {item['itemid']: item['portions'] for item in self.client.get('/api/items/available/').data}
+        self.assertEqual(available['F001'], 1)
+
+        # Vượt tồn kho hiện tại (không phải số dư) bị từ chối
+        response = self.client.post(
+            '/api/orders/ORD001/add_items/', {'items': [{'ditemid': 'F001', 'quantity': 2}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=2)
+
+    def test_reconcile_folds_ledger_into_balance(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=3)
+        out = StringIO()
+        call_command('reconcile_stock', '--dry-run', stdout=out)
+        self.assertIn('2 pending movement(s) across 2 material(s)', out.getvalue())
+
+        call_command('reconcile_stock', stdout=out)
+        self.assertIn('Folded 2 movement(s) into 2 material(s)', out.getvalue())
+        self.assertEqual(self.movements(), [])
+        self.assertEqual(dict(Material.objects.values_list('materialid', 'quantity')), {'M001': 2, 'M002': 7})
+        self.assertEqual(ItemAvailability.objects.get(itemid='F001').portions, 2)
+
+        # Tồn kho âm (order đồng thời không khóa nhau) được báo lại
+        StockMovement.objects.create(materialid='M001', delta=-4)
+        out = StringIO()
+        call_command('reconcile_stock', stdout=out)
+        self.assertIn('M001 Beef: stock -2', out.getvalue())
+
+    def test_manual_stock_update_folds_pending_first(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=3)
+        response = self.client.patch('/api/materials/M001/', {'quantity': 20}, format='json')
+        self.assertEqual(response.data['quantity'], 20)
+        self.assertEqual(stock.current_stock(['M001', 'M002']), {'M001': 20, 'M002': 7})
+        self.assertEqual([row[0] for row in self.movements()], ['M002'])
+
+    def test_update_without_quantity_keeps_pending_deductions(self):
+        Detail.objects.create(dorderid=self.order, ditemid=self.pho, dstaffid=self.chef, quantity=3)
+        response = self.client.patch('/api/materials/M001/', {'name': 'Thịt bò'}, format='json')
+        self.assertEqual(response.data['quantity'], 2)
+        self.assertEqual(stock.current_stock(['M001']), {'M001': 2})
+        self.assertEqual(Material.objects.get(materialid='M001').name, 'Thịt bò')
+
+
+class KeysetPaginationTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        table = Rtable.objects.create(tableid=1, tablenumber=1, status='Available')
+        start = timezone.now().replace(microsecond=0)
+        # ORD002/ORD003 cùng CreatedAt (khóa phụ OrderID), ORD007 không có CreatedAt (đứng cuối khi giảm dần)
+        created = [start, start + timedelta(minutes=1), start + timedelta(minutes=1),
+                   start + timedelta(minutes=2), start + timedelta(minutes=3), start + timedelta(minutes=4), None]
+        for number, createdat in enumerate(created, start=1):
+            Rorder.objects.create(orderid=f'ORD{number:03d}', createdat=createdat, status='Completed',
+                                  quantity=0, otableid=table)
+
+    def walk(self, url, link='next'):
+        pages, queries = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['orderid'] for row in response.data['results']])
+            queries.append(len(ctx.captured_queries))
+            url = response.data[link]
+        return pages, queries
+
+    def test_pages_follow_stable_key_order(self):
+        pages, queries = self.walk('/api/orders/?page_size=3')
+        self.assertEqual(pages, [['ORD006', 'ORD005', 'ORD004'], ['ORD003', 'ORD002', 'ORD001'], ['ORD007']])
+        # Mọi trang cùng số query, không có COUNT
+        self.assertEqual(len(set(queries)), 1)
+
+        first = self.client.get('/api/orders/?page_size=3').data
+        self.assertNotIn('count', first)
+        self.assertIsNone(first['previous'])
+        self.assertEqual(self.client.get('/api/orders/?page_size=3&count=1').data['count'], 7)
+
+    def test_previous_links_and_ascending_ordering(self):
+        pages, _ = self.walk('/api/orders/?ordering=createdat&page_size=2')
+        self.assertEqual(pages, [['ORD007', 'ORD001'], ['ORD002', 'ORD003'], ['ORD004', 'ORD005'], ['ORD006']])
+
+        last = self.client.get('/api/orders/?ordering=createdat&page_size=2')
+        for _ in range(3):
+            last = self.client.get(last.data['next'])
+        back, _ = self.walk(last.data['previous'], link='previous')
+        self.assertEqual(back, [['ORD004', 'ORD005'], ['ORD002', 'ORD003'], ['ORD007', 'ORD001']])
+
+    def test_annotation_ordering_and_invalid_cursor(self):
+        for number, tax in enumerate(['10', '30', '30'], start=1):
+            customer = Customer.objects.create(customerid=f'C{number:03d}', fullname=f'Khách {number}')
+            Invoice.objects.create(invoiceid=f'INV{number:03d}', datecreated=timezone.now(), tax=Decimal(tax),
+                                   istaffid=self.cashier(), customerid=customer)
+        Customer.objects.create(customerid='C004', fullname='Chưa mua')
+
+        url = '/api/customers/?with_stats=1&ordering=-total_billed&page_size=1'
+        pages = []
+        while url:
+            data = self.client.get(url).data
+            pages.extend(row['customerid'] for row in data['results'])
+            url = data['next']
+        # Bằng nhau thì theo khóa phụ CustomerID cùng chiều giảm dần
+        self.assertEqual(pages, ['C003', 'C002', 'C001', 'C004'])
+
+        self.assertEqual(self.client.get('/api/orders/?cursor=not-a-cursor').status_code, 404)
+        # Cursor của thứ tự khác
+        cursor = self.client.get('/api/orders/?page_size=1').data['next'].split('cursor=')[1].split('&')[0]
+        self.assertEqual(self.client.get(f'/api/customers/?cursor={cursor}&ordering=fullname').status_code, 404)
+
+    def cashier(self):
+        if not hasattr(self, '_cashier'):
+            admin = Admin.objects.create(adminid='AD01', fullname='Admin', permission='SuperAdmin')
+            manager = Manager.objects.create(managerid='MGR01', fullname='Manager', madminid=admin, permission='All')
+            staff = Staff.objects.create(staffid='ST02', fullname='Cashier', status='Working', smanagerid=manager)
+            self._cashier = Cashier.objects.create(staffid=staff)
+        return self._cashier
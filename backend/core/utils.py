@@ -1,11 +1,104 @@
+import os
 import random
 import string
-from datetime import datetime
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+
+BASE36_DIGITS = string.digits + string.ascii_uppercase
+ID_LENGTH = 10  # giới hạn 10 ký tự của các cột khóa (OrderID, ...)
+
+
+def to_base36(value, width):
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(BASE36_DIGITS[remainder])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+class IdAllocator:
+    """
+    Cấp mã không trùng cho một prefix (vd: ORD -> ORDA000001)
+
+    - Mỗi process thuê một block `block_size` giá trị từ bảng id_sequence
+      (SELECT ... FOR UPDATE + UPDATE trong 1 transaction riêng) rồi cấp dần trong bộ nhớ.
+    - Mã tăng dần trong 1 process; 2 process không bao giờ nhận cùng block.
+    - Phần số được mã hóa base36 và bắt đầu từ 'A00...' để không đụng các mã cũ
+      (ORD01, ORD + MMSS + 3 ký tự ngẫu nhiên: ký tự thứ 4 luôn là chữ số).
+    """
+
+    LEASE_RETRIES = 10
+
+    def __init__(self, prefix, block_size=None):
+        from .models import IdSequence  # tránh import models khi load settings
+
+        self.prefix = prefix
+        self.width = ID_LENGTH - len(prefix)
+        self.start = int('A'.ljust(self.width, '0'), 36)
+        self.limit = 36 ** self.width
+        self.block_size = block_size or getattr(settings, 'ID_BLOCK_SIZE', 100)
+        self._model = IdSequence
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def reset(self):
+        """Bỏ block đang giữ (sau fork, process con phải thuê block riêng)"""
+        with self._lock:
+            self._next = self._end = 0
+
+    def _lease(self):
+        for attempt in range(self.LEASE_RETRIES):
+            try:
+                # durable=True: lease phải commit ngay, không được nằm trong transaction của request
+                # (nếu transaction ngoài rollback, process khác có thể thuê lại đúng block này)
+                with transaction.atomic(durable=True):
+                    sequence, _ = self._model.objects.select_for_update().get_or_create(
+                        name=self.prefix, defaults={'nextvalue': self.start}
+                    )
+                    start = sequence.nextvalue
+                    sequence.nextvalue = start + self.block_size
+                    sequence.save(update_fields=['nextvalue'])
+                return start, start + self.block_size
+            except (IntegrityError, OperationalError):
+                # 2 process cùng tạo dòng sequence / deadlock / lock timeout -> thử lại
+                if attempt == self.LEASE_RETRIES - 1:
+                    raise
+                time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+
+    def next_id(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._lease()
+            value = self._next
+            self._next += 1
+        if value >= self.limit:
+            raise OverflowError(f'ID sequence {self.prefix} exhausted')
+        return f"{self.prefix}{to_base36(value, self.width)}"
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(prefix):
+    with _allocators_lock:
+        if prefix not in _allocators:
+            _allocators[prefix] = IdAllocator(prefix)
+        return _allocators[prefix]
+
+
+def _reset_allocators():
+    for allocator in _allocators.values():
+        allocator.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_allocators)
+
 
 def generate_id(prefix='ORD'):
-    # giới hạn 10 ký tự.
-    
-    time_part = datetime.now().strftime('%M%S') 
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=3)) 
-    
-    return f"{prefix}{time_part}{random_part}"
\ No newline at end of file
+    # giới hạn 10 ký tự, không trùng giữa các process (xem IdAllocator)
+    return get_allocator(prefix).next_id()
@@ -0,0 +1,120 @@
+"""
+Version token cho từng nhóm dữ liệu + Conditional GET (ETag / Last-Modified)
+
+Mỗi lần ghi qua API, view gọi bump('items', ...) để tăng bộ đếm của nhóm đó.
+Khi GET, ETag được tính chỉ từ bộ đếm (1 query theo khóa chính); nếu client gửi
+If-None-Match / If-Modified-Since khớp thì trả 304 mà không chạy query danh sách
+hay serializer.
+"""
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ResourceVersion
+
+
+def bump(*resources):
+    """
+    Tăng version của các nhóm dữ liệu vừa bị thay đổi
+    Gọi sau khi transaction ghi dữ liệu đã commit: dòng resource_version dùng chung cho mọi request ghi,
+    gọi trong transaction.atomic() sẽ giữ khóa dòng tới hết transaction
+    """
+    now = timezone.now()
+    for resource in resources:
+        updated = ResourceVersion.objects.filter(resource=resource).update(
+            version=F('version') + 1, updatedat=now
+        )
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                ResourceVersion.objects.create(resource=resource, version=1, updatedat=now)
+        except IntegrityError:
+            # Process khác vừa tạo dòng này
+            ResourceVersion.objects.filter(resource=resource).update(
+                version=F('version') + 1, updatedat=now
+            )
+
+
+def get_versions(resources):
+    """Trả về (etag, last_modified) cho tập nhóm dữ liệu - 1 query"""
+    rows = {
+        row.resource: row
+        for row in ResourceVersion.objects.filter(resource__in=resources)
+    }
+    token = '-'.join(
+        f"{resource}.{rows[resource].version if resource in rows else 0}" for resource in resources
+    )
+    last_modified = max((row.updatedat for row in rows.values()), default=None)
+    return f'W/"{token}"', last_modified
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if if_modified_since and last_modified:
+        # If-Modified-Since chỉ chính xác tới giây: lần ghi cùng giây với header có thể đến sau lần đọc của client
+        # -> chỉ trả 304 khi lần ghi cuối ở hẳn giây trước đó
+        return int(last_modified.timestamp()) < if_modified_since
+    return False
+
+
+def conditional_get(method):
+    """Decorator cho list/retrieve: trả 304 nếu version của view.version_resources không đổi"""
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        etag, last_modified = get_versions(self.version_resources)
+        if _not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Client luôn hỏi lại server, server trả 304 nếu không có gì thay đổi
+        response['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+
+class VersionedResourceMixin:
+    """
+    Mixin cho ModelViewSet:
+    - version_resources: các nhóm dữ liệu mà response phụ thuộc (tạo ETag)
+    - write_resources: các nhóm bị thay đổi khi create/update/destroy (mặc định = version_resources)
+    """
+    version_resources = ()
+    write_resources = None
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def bump_versions(self):
+        bump(*(self.write_resources or self.version_resources))
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.bump_versions()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.bump_versions()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        self.bump_versions()
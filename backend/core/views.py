@@ -1,54 +1,149 @@
+import logging
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
-from django.db import models, connection
+from django.db import models, connection, transaction, DatabaseError, IntegrityError
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView
-from datetime import timedelta
-from django.db.models import Sum
-from django.db.models.functions import TruncDate
+from datetime import datetime, time, timedelta
+from django.db.models import Sum, Count, Prefetch, Case, When, Value, CharField
+from django.db.models.functions import TruncDate, Trunc, Coalesce, Cast
 
-from .models import Rtable, Rorder, Detail, Item, Staff, Chef, Customer, Invoice, Payment, Promotion, Cashier, Waiter, Material, Ptorder
+from .models import Rtable, Rorder, Detail, Item, Staff, Chef, Customer, Invoice, Payment, Promotion, Cashier, Waiter, Material, Ptorder, Qdmaterial, RevenueDaily, CustomerStats, CustomerStatsDaily, CheckoutRequest
 from .serializers import (
     ItemSerializer, TableSerializer, OrderSerializer, OrderDetailSerializer,
     DetailSerializer, CustomerSerializer, InvoiceSerializer, PaymentSerializer,
     PromotionSerializer, StaffSerializer, ChefSerializer, CashierSerializer, WaiterSerializer,
-    CustomTokenObtainPairSerializer, MaterialSerializer
+    CustomTokenObtainPairSerializer, MaterialSerializer, order_total_expression,
+    CustomerInvoiceStatsSerializer, customer_invoice_aggregates,
 )
 from .utils import generate_id
+from .events import publish
+from .versioning import VersionedResourceMixin, conditional_get, bump
+from . import dbpool, procedures, refcache, stock
+from .pagination import KeysetPagination, PageSizePagination
+from .refcache import ReferenceCacheMixin
+
+logger = logging.getLogger(__name__)
+
+
+def orders_with_details(queryset):
+    """
+    Nạp sẵn Detail + Item và tổng tiền (SUM trong SQL) cho một queryset Rorder
+    -> OrderDetailSerializer không phải query thêm cho từng order
+    """
+    return queryset.annotate(order_total=order_total_expression()).prefetch_related(
+        Prefetch(
+            'detail_set',
+            queryset=Detail.objects.select_related('ditemid').order_by('detailid'),
+            to_attr='prefetched_details',
+        )
+    )
+
+
+def floor_plan_queryset():
+    """
+    Sơ đồ bàn: toàn bộ bàn + order đang phục vụ + chi tiết món trong số query cố định
+    (bàn, order Serving kèm tổng tiền, detail kèm item) - không phụ thuộc số lượng bàn
+    """
+    serving_orders = orders_with_details(Rorder.objects.filter(status='Serving').order_by('orderid'))
+    return Rtable.objects.order_by('tableid').prefetch_related(
+        Prefetch('rorder_set', queryset=serving_orders, to_attr='serving_orders')
+    )
+
+
+# Idempotency-Key của POST /api/orders/{id}/complete/ (khóa chính bảng checkout_request)
+CHECKOUT_KEY_MAX_LENGTH = CheckoutRequest._meta.get_field('key').max_length
+
+
+STAFF_ROLES = {
+    # ?role= -> (bảng con, tên chức vụ, cột chi tiết)
+    'chef': ('chef', 'Đầu Bếp', Cast(Coalesce('chef__experience', 0), CharField())),
+    'cashier': ('cashier', 'Thu Ngân', Coalesce('cashier__education', Value(''))),
+    'waiter': ('waiter', 'Phục Vụ', Coalesce('waiter__fluency', Value(''))),
+}
+STAFF_DIRECTORY_FIELDS = ('staffid', 'fullname', 'phone', 'status', 'smanagerid', 'role', 'detail')
+
+
+def staff_directory(role='all'):
+    """
+    Danh bạ nhân viên: Staff + chức vụ + thông tin chi tiết (kinh nghiệm / trình độ / ngoại ngữ) trong 1 query
+    role='all' LEFT JOIN cả 3 bảng con, role cụ thể chỉ JOIN bảng của chức vụ đó
+    """
+    queryset = Staff.objects.all()
+    if role in STAFF_ROLES:
+        relation, role_name, detail = STAFF_ROLES[role]
+        queryset = queryset.filter(**{f'{relation}__isnull': False}).annotate(
+            role=Value(role_name, output_field=CharField()), detail=detail,
+        )
+    else:
+        roles = STAFF_ROLES.values()
+        queryset = queryset.annotate(
+            role=Case(
+                *[When(**{f'{relation}__isnull': False}, then=Value(name)) for relation, name, _ in roles],
+                default=Value('Nhân Viên'), output_field=CharField(),
+            ),
+            detail=Case(
+                *[When(**{f'{relation}__isnull': False}, then=detail) for relation, _, detail in roles],
+                default=Value(''), output_field=CharField(),
+            ),
+        )
+    return queryset.values(*STAFF_DIRECTORY_FIELDS)
 
 # REST API 
 
-class ItemViewSet(viewsets.ModelViewSet):
+class ItemViewSet(VersionedResourceMixin, ReferenceCacheMixin, viewsets.ModelViewSet):
     """
     API ViewSet cho Item (Món ăn)
     
     Endpoints:
     - GET /api/items/              → Danh sách toàn bộ món
     - GET /api/items/?status=Available    → Lọc món có sẵn
-    - GET /api/items/available/    → Custom action: Lấy món Available (không phải danh mục)
+    - GET /api/items/available/    → Custom action: Lấy món Available (không phải danh mục) kèm số phần còn làm được
     - POST /api/items/             → Tạo món mới (Admin only)
+    GET hỗ trợ ETag / If-None-Match (304 khi menu không đổi)
     """
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
     permission_classes = [AllowAny]  # Lúc này mở cho mọi người (sau thêm JWT)
+    cache_group = 'items'
     search_fields = ['name', 'itemid']
     filter_backends = [filters.SearchFilter]
     
+    @property
+    def version_resources(self):
+        # Số phần còn làm được đổi theo tồn kho nguyên liệu
+        return ('items', 'materials') if self.action == 'available' else ('items',)
+    
     @action(detail=False, methods=['get'])
+    @conditional_get
     def available(self, request):
         """
         Custom action: Lấy danh sách món ăn có sẵn (không phải danh mục)
-        GET /api/items/available/
+        GET /api/items/available/             → mỗi món kèm `portions`: số phần còn làm được (null = không giới hạn)
+        GET /api/items/available/?in_stock=1  → bỏ các món đã hết nguyên liệu (portions = 0)
+        Danh sách món lấy từ cache 'items'; portions đọc từ bảng item_availability (trigger cập nhật khi tồn kho đổi)
+        cộng phần chưa gộp trong sổ kho stock_movement
         """
-        items = Item.objects.filter(status='Available', superitemid__isnull=False)
-        serializer = self.get_serializer(items, many=True)
-        return Response(serializer.data)
+        def load():
+            items = Item.objects.filter(status='Available', superitemid__isnull=False)
+            return self.get_serializer(items, many=True).data
+
+        portions = stock.item_portions()
+        items = [
+            {**item, 'portions': portions.get(item['itemid'])}
+            for item in refcache.get_or_load('items', 'available', load)
+        ]
+        if request.query_params.get('in_stock') in ('1', 'true'):
+            items = [item for item in items if item['portions'] != 0]
+        return Response(items)
 
 
-class TableViewSet(viewsets.ModelViewSet):
+class TableViewSet(VersionedResourceMixin, viewsets.ModelViewSet):
     """
     API ViewSet cho Rtable (Bàn)
     
@@ -56,29 +151,87 @@ class TableViewSet(viewsets.ModelViewSet):
     - GET /api/tables/             → Danh sách toàn bộ bàn (kèm order đang phục vụ)
     - GET /api/tables/{id}/        → Chi tiết bàn
     - PUT /api/tables/{id}/        → Cập nhật trạng thái bàn
+    GET hỗ trợ ETag / If-None-Match (phụ thuộc bàn, order và món - tên/giá món lồng trong detail)
     """
     queryset = Rtable.objects.all()
     serializer_class = TableSerializer
     permission_classes = [AllowAny]
+    version_resources = ('tables', 'orders', 'items')
+    write_resources = ('tables',)
 
+    def get_queryset(self):
+        return floor_plan_queryset()
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        refcache.invalidate('tables')
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        refcache.invalidate('tables')
+        table = serializer.instance
+        publish('table.status', tableid=table.tableid, status=table.status)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        refcache.invalidate('tables')
 
-class OrderViewSet(viewsets.ModelViewSet):
+
+def order_not_serving_response(order_status):
+    """
+    Chỉ order Serving được thêm/sửa/xóa món: revenue_daily / customer_stats chốt tổng tiền lúc order được
+    thanh toán, món đổi sau đó sẽ lệch (trigger trg_detail_b*_invoiced chặn thêm ở database)
+    """
+    if order_status is None:
+        return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(
+        {'error': 'Order is not being served', 'status': order_status},
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+def publish_order_items(order_id):
+    """Phát sự kiện order.items (số món, tổng tiền, các dòng detail) của order; trả về dữ liệu order đã render"""
+    order = orders_with_details(Rorder.objects.filter(pk=order_id)).first()
+    if order is None:
+        return None
+    data = OrderDetailSerializer(order).data
+    publish(
+        'order.items', orderid=order.orderid, tableid=order.otableid_id,
+        quantity=order.quantity, total_price=data['total_price'],
+        details=[{'ditemid': d['ditemid']['itemid'], 'quantity': d['quantity']} for d in data['details']]
+    )
+    return data
+
+
+class OrderViewSet(VersionedResourceMixin, viewsets.ModelViewSet):
     """
     API ViewSet cho Rorder (Đơn hàng)
     
     Endpoints:
-    - GET /api/orders/             → Danh sách toàn bộ đơn hàng
+    - GET /api/orders/             → Danh sách đơn hàng mới nhất trước (phân trang keyset: ?cursor=, ?page_size=, ?count=1)
     - GET /api/orders/{id}/        → Chi tiết đơn hàng (bao gồm món)
     - POST /api/orders/            → Tạo đơn hàng mới
     - POST /api/orders/{id}/add_item/   → Thêm món vào đơn
+    - POST /api/orders/{id}/add_items/  → Thêm nhiều món vào đơn trong 1 lần gọi
     - POST /api/orders/{id}/complete/   → Hoàn thành đơn hàng
     """
     queryset = Rorder.objects.all()
     serializer_class = OrderDetailSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    ordering = ('-createdat', '-orderid')
+    version_resources = ('orders', 'items')
+    write_resources = ('orders',)
+    
+    def get_queryset(self):
+        # Chỉ prefetch cho các action chỉ đọc; action ghi (add_item, ...) sẽ đổi detail sau get_object()
+        if self.action in ('list', 'retrieve'):
+            return orders_with_details(Rorder.objects.all())
+        return super().get_queryset()
     
     def get_serializer_class(self):
-        if self.action == 'add_item':
+        if self.action in ('add_item', 'add_items'):
             return DetailSerializer
         return self.serializer_class
     
@@ -89,9 +242,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         Body: {"otableid": 101}
         """
         table_id = request.data.get('otableid')
-        try:
-            table = Rtable.objects.get(tableid=table_id)
-        except Rtable.DoesNotExist:
+        table = refcache.get_table(table_id)
+        if table is None:
             return Response({'error': 'Table not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Kiểm tra có đơn đang phục vụ không
@@ -110,7 +262,11 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         # Cập nhật trạng thái bàn
         table.status = 'Occupied'
-        table.save()
+        table.save(update_fields=['status'])
+        bump('orders', 'tables')
+        
+        publish('order.created', orderid=new_order.orderid, tableid=table.tableid)
+        publish('table.status', tableid=table.tableid, status=table.status)
         
         serializer = self.get_serializer(new_order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -123,18 +279,19 @@ class OrderViewSet(viewsets.ModelViewSet):
         Body: {"ditemid": "F001", "quantity": 1}
         """
         order = self.get_object()
+        if order.status != 'Serving':
+            return order_not_serving_response(order.status)
         
         # Lấy thông tin từ request
         item_id = request.data.get('ditemid')
         quantity = request.data.get('quantity', 1)
         
-        try:
-            item = Item.objects.get(itemid=item_id)
-        except Item.DoesNotExist:
+        item = refcache.get_item(item_id)
+        if item is None:
             return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Lấy đầu bếp mặc định
-        default_chef = Chef.objects.first()
+        default_chef = refcache.get_default_chef()
         if not default_chef:
             return Response({'error': 'No chef available'}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -152,12 +309,106 @@ class OrderViewSet(viewsets.ModelViewSet):
                 quantity=quantity
             )
         
-        # Cập nhật tổng số lượng order
-        order.quantity = Detail.objects.filter(dorderid=order).aggregate(total=models.Sum('quantity'))['total'] or 0
-        order.save()
+        # Trigger trg_detail_* cộng ROrder.Quantity theo chênh lệch và trừ kho nguyên liệu
+        bump('orders', 'materials')
         
-        serializer = OrderDetailSerializer(order)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self._order_items_response(order)
+    
+    @action(detail=True, methods=['post'])
+    def add_items(self, request, pk=None):
+        """
+        POST /api/orders/{id}/add_items/
+        Thêm nhiều món vào đơn trong 1 transaction
+        Body: {"items": [{"ditemid": "F001", "quantity": 2}, {"ditemid": "D001", "quantity": 1}]}
+        (hoặc gửi trực tiếp danh sách)
+        - Kiểm tra món bằng 1 query, kiểm tra kho cho cả lô bằng 1 query
+        - Ghi toàn bộ trong 1 transaction
+        - Order không còn Serving (đã thanh toán / hủy) -> 409
+        """
+        order = self.get_object()
+        if order.status != 'Serving':
+            return order_not_serving_response(order.status)
+        lines = request.data if isinstance(request.data, list) else request.data.get('items')
+        if not isinstance(lines, list) or not lines:
+            return Response({'error': 'items must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Gộp các dòng trùng món: {item_id: quantity}
+        requested = {}
+        for line in lines:
+            item_id = line.get('ditemid') if isinstance(line, dict) else None
+            try:
+                quantity = int(line.get('quantity', 1))
+            except (AttributeError, TypeError, ValueError):
+                quantity = 0
+            if not isinstance(item_id, str) or not item_id or quantity < 1:
+                return Response(
+                    {'error': 'Each item needs a ditemid and a quantity >= 1', 'item': line},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            requested[item_id] = requested.get(item_id, 0) + quantity
+        
+        # 1 query kiểm tra tất cả món
+        items = Item.objects.in_bulk(list(requested))
+        missing = sorted(set(requested) - set(items))
+        if missing:
+            return Response({'error': 'Item not found', 'items': missing}, status=status.HTTP_404_NOT_FOUND)
+        
+        default_chef = refcache.get_default_chef()
+        if not default_chef:
+            return Response({'error': 'No chef available'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            with transaction.atomic():
+                # Kiểm tra lại trạng thái dưới khóa: order có thể vừa được thanh toán / xóa sau get_object()
+                order_status = Rorder.objects.select_for_update().filter(pk=order.pk).values_list('status', flat=True).first()
+                if order_status != 'Serving':
+                    return order_not_serving_response(order_status)
+                
+                # Kiểm tra kho cho cả lô (mỗi phần dùng 1 đơn vị, như trigger) theo tồn kho hiện tại của sổ kho;
+                # không khóa dòng Material nên các order dùng chung nguyên liệu không phải chờ nhau
+                required = {}
+                for row in Qdmaterial.objects.filter(qditemid__in=list(requested)).values('qdmaterialid', 'qditemid'):
+                    required[row['qdmaterialid']] = required.get(row['qdmaterialid'], 0) + requested[row['qditemid']]
+                available = stock.current_stock(required)
+                shortages = [
+                    {'materialid': material_id, 'required': amount, 'available': available.get(material_id) or 0}
+                    for material_id, amount in sorted(required.items())
+                    if amount > (available.get(material_id) or 0)
+                ]
+                if shortages:
+                    return Response(
+                        {'error': 'Insufficient material stock', 'materials': shortages},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                # Detail đã có (cùng order, món, đầu bếp) -> cộng dồn; chưa có -> bulk insert
+                existing = {
+                    detail.ditemid_id: detail
+                    for detail in Detail.objects.select_for_update().filter(
+                        dorderid=order, ditemid__in=list(requested), dstaffid=default_chef
+                    )
+                }
+                for item_id, detail in existing.items():
+                    detail.quantity += requested[item_id]
+                Detail.objects.bulk_update(existing.values(), ['quantity'])
+                Detail.objects.bulk_create([
+                    Detail(dorderid=order, ditemid=items[item_id], dstaffid=default_chef, quantity=quantity)
+                    for item_id, quantity in requested.items()
+                    if item_id not in existing
+                ])
+                # ROrder.Quantity do trigger trg_detail_* cập nhật theo từng dòng
+        except DatabaseError as e:
+            # Trigger kiểm tra kho (trg_detail_*_check_stock) vẫn là chốt chặn cuối
+            return Response({'error': f'Không thể thêm món: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Bump sau khi commit: dòng resource_version dùng chung chỉ bị khóa trong 1 câu UPDATE,
+        # không suốt transaction thêm món (các order đồng thời không chờ nhau ở đây)
+        bump('orders', 'materials')
+        return self._order_items_response(order)
+    
+    def _order_items_response(self, order):
+        """Render order (detail + tổng tiền trong số query cố định) và phát sự kiện order.items"""
+        return Response(publish_order_items(order.pk), status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
@@ -165,8 +416,23 @@ class OrderViewSet(viewsets.ModelViewSet):
         POST /api/orders/{id}/complete/
         Hoàn thành đơn hàng (đổi status thành 'Paid')
         Body: {"customer_name": "Tên KH", "customer_phone": "0123456789"}
+        Header (tùy chọn): Idempotency-Key: <chuỗi client sinh cho mỗi lần thanh toán, tối đa 64 ký tự>
+        - Gửi lại cùng key (retry khi mạng chậm) → trả lại đúng response lần đầu, không thanh toán lại
+        - Cả lần thanh toán là 1 transaction với số câu lệnh cố định: khóa order, khách hàng (sp_GetOrCreateCustomer),
+          nhân viên, PTOrder, order -> Paid (trg_order_create_invoice), bàn -> Available, order trả về, lưu key
+        - Order đã Paid (không có key của lần trước) → 409
         """
-        order = self.get_object()
+        key = request.headers.get('Idempotency-Key', '').strip()
+        if len(key) > CHECKOUT_KEY_MAX_LENGTH:
+            return Response(
+                {'error': f'Idempotency-Key must be at most {CHECKOUT_KEY_MAX_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if key:
+            replay = self._checkout_replay(key, pk)
+            if replay is not None:
+                return replay
+        
         customer_name = request.data.get('customer_name', '').strip()
         customer_phone = request.data.get('customer_phone', '').strip()
         
@@ -177,78 +443,101 @@ class OrderViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            # Tìm hoặc tạo khách hàng bằng stored procedure
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "CALL sp_GetOrCreateCustomer(%s, %s)",
-                    [customer_phone, customer_name]
+            with transaction.atomic():
+                # Khóa order: 2 lần thanh toán cùng order (double click, retry) chạy lần lượt
+                order = (
+                    Rorder.objects.select_for_update()
+                    .filter(orderid=pk)
+                    .values('orderid', 'status', 'otableid')
+                    .first()
                 )
-                # Lấy CustomerID từ kết quả SELECT
-                result = cursor.fetchone()
-                customer_id = result[0] if result else None
-            
-            if not customer_id:
-                return Response(
-                    {'error': 'Không thể tạo thông tin khách hàng!'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                if order is None:
+                    return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+                if order['status'] == 'Paid':
+                    # Lần gửi trước cùng key vừa commit trong lúc chờ khóa
+                    replay = self._checkout_replay(key, pk) if key else None
+                    if replay is not None:
+                        return replay
+                    return Response({'error': 'Order already paid'}, status=status.HTTP_409_CONFLICT)
+                order_id, table_id = order['orderid'], order['otableid']
+                
+                # Nhân viên phục vụ: đầu bếp của Detail đầu tiên (Chef dùng chung StaffID), không có thì staff đầu tiên
+                # (kiểm tra trước khi ghi: return trong transaction.atomic() sẽ commit những gì đã ghi)
+                staff_id = (
+                    Detail.objects.filter(dorderid=order_id).order_by('detailid')
+                    .values_list('dstaffid', flat=True).first()
+                    or Staff.objects.order_by('staffid').values_list('staffid', flat=True).first()
                 )
-            
-            # Lấy object Customer từ database
-            customer = Customer.objects.get(customerid=customer_id)
-            
-            # Lấy nhân viên phục vụ (lấy staff từ Detail - Chef)
-            staff_obj = None
-            detail = Detail.objects.filter(dorderid=order).first()
-            if detail:
-                # detail.dstaffid là Chef object, cần lấy Staff từ Chef.staffid
-                chef = detail.dstaffid
-                staff_obj = Staff.objects.get(staffid=chef.staffid.staffid)
-            else:
-                # Nếu không có detail, lấy staff đầu tiên trong hệ thống
-                staff_obj = Staff.objects.first()
-            
-            if not staff_obj:
-                return Response(
-                    {'error': 'Không tìm thấy nhân viên phục vụ!'},
-                    status=status.HTTP_400_BAD_REQUEST
+                if not staff_id:
+                    return Response(
+                        {'error': 'Không tìm thấy nhân viên phục vụ!'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                # Tìm hoặc tạo khách hàng (sp_GetOrCreateCustomer); lỗi -> raise để rollback cả checkout
+                customer_id = procedures.get_or_create_customer(customer_phone, customer_name)
+                if not customer_id:
+                    raise procedures.ProcedureError('Không thể tạo thông tin khách hàng!')
+                
+                # PTOrder liên kết Customer với Order (giữ dòng đã có, như get_or_create) - 1 câu INSERT IGNORE
+                Ptorder.objects.bulk_create(
+                    [Ptorder(ptorderid_id=order_id, ptstaffid_id=staff_id, ptcustomerid_id=customer_id)],
+                    ignore_conflicts=True
                 )
-            
-            # Tạo PTOrder để liên kết Customer với Order
-            Ptorder.objects.get_or_create(
-                ptorderid=order,
-                defaults={
-                    'ptstaffid': staff_obj,
-                    'ptcustomerid': customer
+                # trg_order_create_invoice tạo Invoice + YPromo khi Status chuyển sang 'Paid'
+                Rorder.objects.filter(orderid=order_id).update(status='Paid')
+                if table_id is not None:
+                    Rtable.objects.filter(tableid=table_id).update(status='Available')
+                
+                paid = orders_with_details(Rorder.objects.filter(orderid=order_id)).get()
+                payload = {
+                    'order': self.get_serializer(paid).data,
+                    'customer': {
+                        'id': customer_id,
+                        'name': customer_name,
+                        'phone': customer_phone
+                    },
+                    'message': 'Hoàn thành đơn hàng và lưu thông tin khách hàng thành công!'
                 }
+                if key:
+                    CheckoutRequest.objects.create(key=key, orderid=order_id, response=payload)
+        
+        except IntegrityError as e:
+            # Cùng key vừa được dùng cho order khác (khóa chính checkout_request)
+            replay = self._checkout_replay(key, pk) if key else None
+            if replay is not None:
+                return replay
+            return Response(
+                {'error': f'Lỗi khi hoàn thành đơn hàng: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            
-            # Cập nhật trạng thái đơn hàng
-            order.status = 'Paid'
-            order.save()
-            
-            # Cập nhật trạng thái bàn về Available
-            order.otableid.status = 'Available'
-            order.otableid.save()
-            
-            serializer = self.get_serializer(order)
-            return Response({
-                'order': serializer.data,
-                'customer': {
-                    'id': customer.customerid,
-                    'name': customer.fullname,
-                    'phone': customer.phone
-                },
-                'message': 'Hoàn thành đơn hàng và lưu thông tin khách hàng thành công!'
-            }, status=status.HTTP_200_OK)
-            
         except Exception as e:
-            import traceback
-            print(f"Error completing order: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception('Error completing order %s', pk)
             return Response(
                 {'error': f'Lỗi khi hoàn thành đơn hàng: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        bump('orders', 'tables')
+        publish('order.paid', orderid=order_id, tableid=table_id, customerid=customer_id)
+        if table_id is not None:
+            publish('table.status', tableid=table_id, status='Available')
+        return Response(payload, status=status.HTTP_200_OK)
+    
+    @staticmethod
+    def _checkout_replay(key, order_id):
+        """Response đã lưu của Idempotency-Key (None nếu key chưa dùng); key của order khác → 409"""
+        stored = CheckoutRequest.objects.filter(key=key).values_list('orderid', 'response').first()
+        if stored is None:
+            return None
+        if stored[0] != order_id:
+            return Response(
+                {'error': 'Idempotency-Key already used for another order'},
+                status=status.HTTP_409_CONFLICT
+            )
+        response = Response(stored[1], status=status.HTTP_200_OK)
+        response['Idempotent-Replayed'] = 'true'
+        return response
     
     @action(detail=True, methods=['delete'])
     def delete_order(self, request, pk=None):
@@ -261,14 +550,17 @@ class OrderViewSet(viewsets.ModelViewSet):
         table_id = order.otableid
         
         try:
-            with connection.cursor() as cursor:
-                # Gọi stored procedure sp_DeleteOrder
-                cursor.execute("CALL sp_DeleteOrder(%s)", [order_id])
+            # sp_DeleteOrder
+            procedures.delete_order(order_id)
             
             # Cập nhật trạng thái bàn về Available
             if table_id:
                 table_id.status = 'Available'
                 table_id.save()
+                publish('table.status', tableid=table_id.tableid, status='Available')
+            bump('orders', 'tables', 'materials')
+            
+            publish('order.deleted', orderid=order_id, tableid=table_id.tableid if table_id else None)
             
             return Response({
                 'message': f'Đã xóa đơn hàng {order_id} và hóa đơn liên quan',
@@ -281,18 +573,166 @@ class OrderViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class DetailViewSet(viewsets.ModelViewSet):
+class DetailViewSet(VersionedResourceMixin, viewsets.ModelViewSet):
     """API ViewSet cho Detail (Chi tiết món trong đơn)"""
-    queryset = Detail.objects.all()
+    # ItemSerializer lồng trong DetailSerializer: JOIN Item thay vì 1 query cho mỗi dòng
+    queryset = Detail.objects.select_related('ditemid')
     serializer_class = DetailSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    ordering = ('-detailid',)
+    version_resources = ('orders', 'items')
+    write_resources = ('orders', 'materials')
+
+    def update(self, request, *args, **kwargs):
+        order_status = self.get_object().dorderid.status
+        if order_status != 'Serving':
+            return order_not_serving_response(order_status)
+        return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        order_status = self.get_object().dorderid.status
+        if order_status != 'Serving':
+            return order_not_serving_response(order_status)
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        publish_order_items(serializer.instance.dorderid_id)
+
+    def perform_update(self, serializer):
+        previous_order = serializer.instance.dorderid_id
+        super().perform_update(serializer)
+        # Detail chuyển sang order khác: cả 2 order đều đổi
+        for order_id in dict.fromkeys([previous_order, serializer.instance.dorderid_id]):
+            publish_order_items(order_id)
+
+    def perform_destroy(self, instance):
+        order_id = instance.dorderid_id
+        super().perform_destroy(instance)
+        publish_order_items(order_id)
 
 
 class CustomerViewSet(viewsets.ModelViewSet):
-    """API ViewSet cho Customer (Khách hàng)"""
+    """
+    API ViewSet cho Customer (Khách hàng)
+    Thống kê chi tiêu đọc từ bảng tổng hợp customer_stats / customer_stats_daily (xem rebuild_customer_stats):
+    - GET /api/customers/top/?since=2025-01-01&limit=10  → khách chi tiêu nhiều nhất (từ ngày `since`)
+    - GET /api/customers/{id}/stats/?since=2025-01-01    → tổng chi tiêu, số lượt, lần cuối, trung bình/lượt
+    """
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    ordering = ('customerid',)
+    MAX_TOP = 100
+    STATS_FIELDS = ['invoice_count', 'total_billed', 'last_invoice_date']
+
+    @property
+    def with_stats(self):
+        """
+        GET /api/customers/?with_stats=1&ordering=-total_billed&cursor=...
+        Mỗi khách kèm invoice_count, total_billed, last_invoice_date (1 query GROUP BY, có phân trang);
+        sắp xếp được theo các cột đó bằng ?ordering=
+        """
+        return self.action == 'list' and self.request.query_params.get('with_stats') in ('1', 'true')
+
+    @property
+    def ordering_fields(self):
+        return ['customerid', 'fullname', 'phone'] + (self.STATS_FIELDS if self.with_stats else [])
+
+    def get_queryset(self):
+        queryset = Customer.objects.all()
+        if self.with_stats:
+            queryset = queryset.annotate(**customer_invoice_aggregates())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.with_stats:
+            return CustomerInvoiceStatsSerializer
+        return CustomerSerializer
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        try:
+            since = self._parse_since(request)
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response(
+                {'error': 'Invalid parameter. Use since=YYYY-MM-DD and an integer limit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= limit <= self.MAX_TOP:
+            return Response(
+                {'error': f'limit must be between 1 and {self.MAX_TOP}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if since is None:
+            # Index TotalSpent: chỉ đọc `limit` dòng
+            rows = [
+                (stats.customerid_id, stats.totalspent, stats.visitcount)
+                for stats in CustomerStats.objects.filter(visitcount__gt=0).order_by('-totalspent', '-customerid')[:limit]
+            ]
+        else:
+            # Chỉ đọc các ngày từ `since`
+            rows = list(
+                CustomerStatsDaily.objects
+                .filter(businessday__gte=since)
+                .values('customerid')
+                .annotate(spent=Sum('totalspent'), visits=Sum('visitcount'))
+                .filter(visits__gt=0)
+                .order_by('-spent', '-customerid')
+                .values_list('customerid', 'spent', 'visits')[:limit]
+            )
+
+        ids = [customer_id for customer_id, _, _ in rows]
+        customers = Customer.objects.in_bulk(ids)
+        last_visits = dict(CustomerStats.objects.filter(customerid__in=ids).values_list('customerid', 'lastvisit'))
+        return Response([
+            self._stats_entry(customers.get(customer_id), customer_id, spent, visits, last_visits.get(customer_id))
+            for customer_id, spent, visits in rows
+        ])
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        customer = self.get_object()
+        try:
+            since = self._parse_since(request)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date. Use format YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        lifetime = CustomerStats.objects.filter(customerid=customer).first()
+        last_visit = lifetime.lastvisit if lifetime else None
+        if since is None:
+            spent, visits = (lifetime.totalspent, lifetime.visitcount) if lifetime else (0, 0)
+        else:
+            totals = CustomerStatsDaily.objects.filter(customerid=customer.customerid, businessday__gte=since).aggregate(
+                spent=Coalesce(Sum('totalspent'), models.Value(0, output_field=models.DecimalField())),
+                visits=Coalesce(Sum('visitcount'), 0),
+            )
+            spent, visits = totals['spent'], totals['visits']
+        return Response(self._stats_entry(customer, customer.customerid, spent, visits, last_visit))
+
+    @staticmethod
+    def _parse_since(request):
+        value = request.query_params.get('since')
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+    @staticmethod
+    def _stats_entry(customer, customer_id, spent, visits, last_visit):
+        return {
+            'customerid': customer_id,
+            'fullname': customer.fullname if customer else None,
+            'phone': customer.phone if customer else None,
+            'total_spent': spent,
+            'visit_count': visits,
+            'average_ticket': round(spent / visits, 2) if visits else 0,
+            'last_visit': last_visit,
+        }
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
@@ -300,6 +740,8 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    ordering = ('-datecreated', '-invoiceid')
     
     def get_queryset(self):
         """
@@ -315,116 +757,116 @@ class InvoiceViewSet(viewsets.ModelViewSet):
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
-    """API ViewSet cho Payment (Thanh toán)"""
+    """API ViewSet cho Payment (Thanh toán) - ghi qua API phát sự kiện payment.created / updated / deleted"""
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    ordering = ('-paydate', '-paymentid')
+
+    @staticmethod
+    def _event_data(payment):
+        return {
+            'paymentid': payment.paymentid, 'invoiceid': payment.pinvoiceid_id,
+            'amount': payment.amount, 'status': payment.status,
+        }
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        publish('payment.created', **self._event_data(serializer.instance))
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        publish('payment.updated', **self._event_data(serializer.instance))
+
+    def perform_destroy(self, instance):
+        # delete() xóa khóa chính của instance: lấy dữ liệu sự kiện trước
+        data = self._event_data(instance)
+        super().perform_destroy(instance)
+        publish('payment.deleted', **data)
 
 
-class PromotionViewSet(viewsets.ModelViewSet):
-    """API ViewSet cho Promotion (Khuyến mãi)"""
+class PromotionViewSet(VersionedResourceMixin, ReferenceCacheMixin, viewsets.ModelViewSet):
+    """API ViewSet cho Promotion (Khuyến mãi) - GET hỗ trợ ETag / If-None-Match"""
     queryset = Promotion.objects.all()
     serializer_class = PromotionSerializer
     permission_classes = [AllowAny]
+    version_resources = ('promotions',)
+    cache_group = 'promotions'
 
 
-class StaffViewSet(viewsets.ModelViewSet):
+class StaffCacheInvalidationMixin:
+    """Ghi Chef/Cashier/Waiter qua API làm thay đổi danh sách nhân viên và đầu bếp mặc định"""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        refcache.invalidate('staff', 'chefs')
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        refcache.invalidate('staff', 'chefs')
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        refcache.invalidate('staff', 'chefs')
+
+
+class StaffViewSet(VersionedResourceMixin, StaffCacheInvalidationMixin, viewsets.ModelViewSet):
     """
     API ViewSet cho Staff (Nhân viên)
-    Hỗ trợ lọc theo chức vụ bằng Raw SQL Query:
-    - GET /api/staff/?role=all (tất cả)
-    - GET /api/staff/?role=chef (đầu bếp)
-    - GET /api/staff/?role=cashier (thu ngân)
-    - GET /api/staff/?role=waiter (phục vụ)
+    Danh bạ nhân viên (staff_directory: 1 query, phân trang bằng LIMIT/OFFSET trong SQL):
+    - GET /api/staff/?role=all|chef|cashier|waiter   → lọc theo chức vụ (mặc định all)
+    - GET /api/staff/?status=Working                 → lọc theo trạng thái
+    - GET /api/staff/?search=Lan                     → tìm theo mã, họ tên, số điện thoại
+    - GET /api/staff/?ordering=fullname&page=2&page_size=20 → sắp xếp (staffid, fullname, status, role), phân trang
+    - GET /api/staff/role_counts/                    → số nhân viên theo chức vụ (1 query GROUP BY)
+    Mỗi trang được cache (nhóm 'staff'), bị invalidate khi add_staff / update_staff / xóa nhân viên.
+    GET hỗ trợ ETag / If-None-Match (304 khi danh sách nhân viên không đổi)
     """
     queryset = Staff.objects.all()
     serializer_class = StaffSerializer
     permission_classes = [AllowAny]
+    pagination_class = PageSizePagination
+    version_resources = ('staff',)
+    search_fields = ['staffid', 'fullname', 'phone']
+    ordering_fields = ['staffid', 'fullname', 'status', 'role']
+    ordering = ('staffid',)
     
+    @conditional_get
     def list(self, request, *args, **kwargs):
-        """
-        Override list method để sử dụng Raw SQL Query cho filtering theo role
-        Trả về thông tin staff kèm theo role và details
-        """
+        """Danh bạ nhân viên kèm chức vụ (role) và thông tin chi tiết (detail)"""
         role = request.query_params.get('role', 'all')
+        if role != 'all' and role not in STAFF_ROLES:
+            return Response({
+                'error': 'Invalid role. Use all, chef, cashier or waiter'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Build raw SQL query based on role with LEFT JOIN để lấy thông tin chi tiết
-        if role == 'chef':
-            sql = """
-                SELECT 
-                    s.StaffID, s.FullName, s.Phone, s.Status, s.SManagerID,
-                    'Đầu Bếp' as RoleName,
-                    CAST(IFNULL(c.Experience, 0) AS CHAR) as DetailInfo
-                FROM staff s
-                INNER JOIN chef c ON s.StaffID = c.StaffID
-            """
-        elif role == 'cashier':
-            sql = """
-                SELECT 
-                    s.StaffID, s.FullName, s.Phone, s.Status, s.SManagerID,
-                    'Thu Ngân' as RoleName,
-                    IFNULL(ca.Education, '') as DetailInfo
-                FROM staff s
-                INNER JOIN cashier ca ON s.StaffID = ca.StaffID
-            """
-        elif role == 'waiter':
-            sql = """
-                SELECT 
-                    s.StaffID, s.FullName, s.Phone, s.Status, s.SManagerID,
-                    'Phục Vụ' as RoleName,
-                    IFNULL(w.Fluency, '') as DetailInfo
-                FROM staff s
-                INNER JOIN waiter w ON s.StaffID = w.StaffID
-            """
-        else:  # all - LEFT JOIN để lấy tất cả staff với role của họ
-            sql = """
-                SELECT 
-                    s.StaffID, 
-                    s.FullName, 
-                    s.Phone, 
-                    s.Status, 
-                    s.SManagerID,
-                    CASE
-                        WHEN c.StaffID IS NOT NULL THEN 'Đầu Bếp'
-                        WHEN ca.StaffID IS NOT NULL THEN 'Thu Ngân'
-                        WHEN w.StaffID IS NOT NULL THEN 'Phục Vụ'
-                        ELSE 'Nhân Viên'
-                    END as RoleName,
-                    CASE
-                        WHEN c.StaffID IS NOT NULL THEN CAST(IFNULL(c.Experience, 0) AS CHAR)
-                        WHEN ca.StaffID IS NOT NULL THEN IFNULL(ca.Education, '')
-                        WHEN w.StaffID IS NOT NULL THEN IFNULL(w.Fluency, '')
-                        ELSE ''
-                    END as DetailInfo
-                FROM staff s
-                LEFT JOIN chef c ON s.StaffID = c.StaffID
-                LEFT JOIN cashier ca ON s.StaffID = ca.StaffID
-                LEFT JOIN waiter w ON s.StaffID = w.StaffID
-            """
-        
-        # Execute raw query
-        with connection.cursor() as cursor:
-            cursor.execute(sql)
-            columns = [col[0] for col in cursor.description]
-            results = [
-                dict(zip(columns, row))
-                for row in cursor.fetchall()
-            ]
+        def load():
+            queryset = self.filter_queryset(staff_directory(role))
+            staff_status = request.query_params.get('status')
+            if staff_status:
+                queryset = queryset.filter(status=staff_status)
+            page = self.paginate_queryset(queryset)
+            if page is None:
+                return list(queryset)
+            return self.get_paginated_response(page).data
         
-        # Convert to serializer format
-        staff_data = []
-        for row in results:
-            staff_data.append({
-                'staffid': row.get('StaffID'),
-                'fullname': row.get('FullName'),
-                'phone': row.get('Phone'),
-                'status': row.get('Status'),
-                'smanagerid': row.get('SManagerID'),
-                'role': row.get('RoleName'),
-                'detail': row.get('DetailInfo')
-            })
+        # Cache theo URL (role, status, search, ordering, page), bị invalidate khi thêm/sửa/xóa nhân viên qua API
+        return Response(refcache.get_or_load('staff', f'list:{request.get_full_path()}', load))
+    
+    @action(detail=False, methods=['get'])
+    def role_counts(self, request):
+        """
+        GET /api/staff/role_counts/
+        Số nhân viên theo chức vụ: {"all": 12, "chef": 5, "cashier": 3, "waiter": 4}
+        """
+        def load():
+            return Staff.objects.aggregate(
+                all=Count('staffid'),
+                **{role: Count(relation) for role, (relation, _, _) in STAFF_ROLES.items()},
+            )
         
-        return Response(staff_data)
+        return Response(refcache.get_or_load('staff', 'role_counts', load))
     
     @action(detail=False, methods=['post'])
     def add_staff(self, request):
@@ -443,29 +885,16 @@ class StaffViewSet(viewsets.ModelViewSet):
         data = request.data
         
         try:
-            with connection.cursor() as cursor:
-                # Gọi stored procedure sp_AddStaff
-                # INOUT parameter cho StaffID
-                cursor.execute("""
-                    SET @staff_id = NULL;
-                """)
-                
-                cursor.execute("""
-                    CALL sp_AddStaff(
-                        @staff_id,
-                        %s, %s, %s, %s, %s
-                    )
-                """, [
-                    data.get('name'),
-                    data.get('phone'),
-                    data.get('manager_id', 'MGR01'),  # Mặc định MGR01
-                    data.get('role'),
-                    data.get('role_detail', '')
-                ])
-                
-                # Lấy StaffID vừa tạo
-                cursor.execute("SELECT @staff_id")
-                staff_id = cursor.fetchone()[0]
+            # sp_AddStaff, trả về StaffID vừa tạo
+            staff_id = procedures.add_staff(
+                data.get('name'),
+                data.get('phone'),
+                data.get('manager_id', 'MGR01'),  # Mặc định MGR01
+                data.get('role'),
+                data.get('role_detail', '')
+            )
+            bump('staff')
+            refcache.invalidate('staff', 'chefs')
             
             return Response({
                 'message': 'Thêm nhân viên thành công!',
@@ -496,19 +925,16 @@ class StaffViewSet(viewsets.ModelViewSet):
         data = request.data
         
         try:
-            with connection.cursor() as cursor:
-                # Gọi stored procedure sp_UpdateStaff
-                cursor.execute("""
-                    CALL sp_UpdateStaff(
-                        %s, %s, %s, %s, %s
-                    )
-                """, [
-                    staff.staffid,
-                    data.get('name', staff.fullname),
-                    data.get('phone', staff.phone),
-                    data.get('status', staff.status),
-                    data.get('role_detail', '')
-                ])
+            # sp_UpdateStaff
+            procedures.update_staff(
+                staff.staffid,
+                data.get('name', staff.fullname),
+                data.get('phone', staff.phone),
+                data.get('status', staff.status),
+                data.get('role_detail', '')
+            )
+            bump('staff')
+            refcache.invalidate('staff', 'chefs')
             
             return Response({
                 'message': 'Cập nhật nhân viên thành công!',
@@ -574,6 +1000,8 @@ class StaffViewSet(viewsets.ModelViewSet):
             
             # Xóa từ Staff
             staff.delete()
+            bump('staff')
+            refcache.invalidate('staff', 'chefs')
             
             return Response({
                 'message': f'Đã xóa nhân viên {staff_id}'
@@ -589,42 +1017,50 @@ class StaffViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class ChefViewSet(viewsets.ModelViewSet):
+class ChefViewSet(VersionedResourceMixin, StaffCacheInvalidationMixin, viewsets.ModelViewSet):
     """API ViewSet cho Chef (Đầu bếp)"""
     queryset = Chef.objects.all()
     serializer_class = ChefSerializer
     permission_classes = [AllowAny]
+    version_resources = ('staff',)
 
 
-class CashierViewSet(viewsets.ModelViewSet):
+class CashierViewSet(VersionedResourceMixin, StaffCacheInvalidationMixin, viewsets.ModelViewSet):
     """API ViewSet cho Cashier (Thu ngân)"""
     queryset = Cashier.objects.all()
     serializer_class = CashierSerializer
     permission_classes = [AllowAny]
+    version_resources = ('staff',)
 
 
-class WaiterViewSet(viewsets.ModelViewSet):
+class WaiterViewSet(VersionedResourceMixin, StaffCacheInvalidationMixin, viewsets.ModelViewSet):
     """API ViewSet cho Waiter (Phục vụ)"""
     queryset = Waiter.objects.all()
     serializer_class = WaiterSerializer
     permission_classes = [AllowAny]
+    version_resources = ('staff',)
 
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(VersionedResourceMixin, viewsets.ModelViewSet):
     """
     API ViewSet cho Material (Nguyên liệu)
-    Hỗ trợ sắp xếp bằng Raw SQL Query:
-    - GET /api/materials/?sort_by=materialid&order=asc
+    - GET /api/materials/?sort_by=materialid&order=asc&page=2&page_size=100
     - GET /api/materials/?sort_by=quantity&order=desc
+      Sắp xếp + LIMIT/OFFSET trong SQL trên bảng material, sau đó 1 query lấy món dùng các nguyên liệu của trang
+    - GET /api/materials/low_stock/?threshold=10 → nguyên liệu có tồn kho <= threshold
+    quantity trả về là tồn kho hiện tại (số dư + sổ kho chưa gộp, xem stock.py);
+    PUT/PATCH gộp sổ kho của nguyên liệu trước, nên quantity gửi lên là tồn kho hiện tại mới
+    GET hỗ trợ ETag / If-None-Match (tồn kho đổi khi thêm/xóa món trong order)
     """
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
     permission_classes = [AllowAny] # Should be IsManager in prod
+    pagination_class = PageSizePagination
+    version_resources = ('materials', 'items')
+    write_resources = ('materials',)
     
+    @conditional_get
     def list(self, request, *args, **kwargs):
-        """
-        Override list method để sử dụng Raw SQL Query cho sorting
-        JOIN với QDMaterial và Item để hiển thị món ăn tương ứng
-        """
+        """Danh sách nguyên liệu kèm mã / tên các món dùng nguyên liệu đó (item_ids, item_names)"""
         sort_by = request.query_params.get('sort_by', None)
         order = request.query_params.get('order', 'asc')
         
@@ -643,54 +1079,97 @@ class MaterialViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Build raw SQL query with JOIN
-        # JOIN 3 bảng: Material, QDMaterial, Item
-        base_sql = """
-            SELECT 
-                m.MaterialID,
-                m.name AS material_name,
-                m.Quantity,
-                GROUP_CONCAT(DISTINCT i.ItemID ORDER BY i.ItemID SEPARATOR ', ') AS item_ids,
-                GROUP_CONCAT(DISTINCT i.Name ORDER BY i.ItemID SEPARATOR ', ') AS item_names
-            FROM material m
-            LEFT JOIN qdmaterial q ON m.MaterialID = q.QDMaterialID
-            LEFT JOIN item i ON q.QDItemID = i.ItemID
-            GROUP BY m.MaterialID, m.name, m.Quantity
-        """
-        
-        if sort_by:
-            # Thêm ORDER BY
-            order_field = 'm.MaterialID' if sort_by == 'materialid' else 'm.Quantity'
-            sql = base_sql + f" ORDER BY {order_field} {order.upper()}"
-        else:
-            sql = base_sql
-        
-        # Execute raw query
-        with connection.cursor() as cursor:
-            cursor.execute(sql)
-            columns = [col[0] for col in cursor.description]
-            results = [
-                dict(zip(columns, row))
-                for row in cursor.fetchall()
-            ]
+        # ORDER BY + LIMIT/OFFSET chạy trong SQL; MaterialID làm khóa phụ để thứ tự giữa các trang ổn định
+        prefix = '-' if order.lower() == 'desc' else ''
+        ordering = [f'{prefix}{"stock" if sort_by == "quantity" else "materialid"}']
+        if sort_by == 'quantity':
+            ordering.append(f'{prefix}materialid')
+        queryset = (
+            Material.objects
+            .annotate(stock=stock.stock_expression())
+            .order_by(*ordering)
+            .values('materialid', 'name', 'stock')
+        )
         
-        # Convert to serializer format
+        page = self.paginate_queryset(queryset)
+        materials = list(queryset) if page is None else page
+        materials_data = self._with_items(materials)
+        if page is not None:
+            return self.get_paginated_response(materials_data)
+        return Response(materials_data)
+    
+    @staticmethod
+    def _with_items(materials):
+        """Thêm item_ids / item_names (nối bằng ', ', theo ItemID) cho các nguyên liệu trong trang"""
+        items = {}
+        links = (
+            Qdmaterial.objects
+            .filter(qdmaterialid__in=[material['materialid'] for material in materials])
+            .order_by('qditemid')
+            .values_list('qdmaterialid', 'qditemid', 'qditemid__name')
+        )
+        for material_id, item_id, item_name in links:
+            items.setdefault(material_id, {})[item_id] = item_name
         materials_data = []
-        for row in results:
+        for material in materials:
+            linked = items.get(material['materialid'], {})
             materials_data.append({
-                'materialid': row.get('MaterialID'),
-                'name': row.get('material_name'),
-                'quantity': row.get('Quantity'),
-                'item_ids': row.get('item_ids') or '--',
-                'item_names': row.get('item_names') or '--'
+                'materialid': material['materialid'],
+                'name': material['name'],
+                'quantity': material['stock'],
+                'item_ids': ', '.join(linked) or '--',
+                'item_names': ', '.join(name or '' for name in linked.values()) or '--',
             })
+        return materials_data
+    
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        material = self.get_object()
+        material.quantity = stock.current_stock([material.pk]).get(material.pk)
+        return Response(self.get_serializer(material).data)
+    
+    def perform_update(self, serializer):
+        # Gộp sổ kho của nguyên liệu vào số dư trước khi ghi đè Quantity; instance được nạp trước khi gộp,
+        # đọc lại Quantity để PATCH không có quantity không ghi lại số dư cũ
+        stock.compact([serializer.instance.pk])
+        serializer.instance.refresh_from_db(fields=['quantity'])
+        super().perform_update(serializer)
+    
+    @action(detail=False, methods=['get'])
+    @conditional_get
+    def low_stock(self, request):
+        """
+        GET /api/materials/low_stock/?threshold=10
+        Nguyên liệu sắp hết (tồn kho hiện tại <= threshold, mặc định LOW_STOCK_THRESHOLD), ít nhất trước
+        2 query: lượng trừ kho chưa gộp lớn nhất, rồi lọc trước Quantity <= threshold + lượng đó trên index
+        idx_material_quantity và chỉ tính số dư + SUM(Delta) chưa gộp cho các dòng còn lại
+        - đủ rẻ để bếp poll (kèm If-None-Match -> 304)
+        """
+        try:
+            threshold = int(request.query_params.get('threshold', getattr(settings, 'LOW_STOCK_THRESHOLD', 10)))
+            if threshold < 0:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'Invalid threshold. Must be a non-negative integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Paginate if needed
-        page = self.paginate_queryset(materials_data)
-        if page is not None:
-            return self.get_paginated_response(page)
-        
-        return Response(materials_data)
+        materials = (
+            Material.objects
+            .filter(quantity__lte=threshold + stock.max_pending_debit())
+            .annotate(stock=stock.stock_expression())
+            .filter(stock__lte=threshold)
+            .order_by('stock', 'materialid')
+            .values_list('materialid', 'name', 'stock')
+        )
+        return Response({
+            'threshold': threshold,
+            'materials': [
+                {'materialid': material_id, 'name': name, 'quantity': quantity}
+                for material_id, name, quantity in materials
+            ],
+        })
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     """
@@ -700,47 +1179,167 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
 class RevenueStatsView(viewsets.ViewSet):
     """
-    API trả về doanh thu 7 ngày gần nhất
-    GET /api/revenue/
+    API thống kê doanh thu theo khoảng thời gian
+    GET /api/revenue/                                   → 7 ngày gần nhất, theo ngày
+    GET /api/revenue/?from=2025-01-01&to=2025-12-31&bucket=month
+    - from, to: YYYY-MM-DD (bao gồm cả ngày `to`)
+    - bucket: hour | day | week | month (mặc định: day)
+    Mỗi mốc trả về doanh thu, số order và số món; các mốc trống được điền 0
+    Ngày/tuần/tháng đọc từ bảng tổng hợp revenue_daily (xem rebuild_revenue_daily)
     """
     permission_classes = [AllowAny]
 
+    BUCKET_LABELS = {
+        'hour': '%d/%m %H:00',
+        'day': '%d/%m',
+        'week': '%d/%m',
+        'month': '%m/%Y',
+    }
+    MAX_BUCKETS = 1000
+
     def list(self, request):
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=6)
-        
-        # Initialize revenue map for the last 7 days
-        revenue_map = {}
-        current = start_date
-        while current <= end_date:
-            revenue_map[current] = 0
-            current += timedelta(days=1)
-
-        # Get all paid orders in range
-        # Note: Using Rorder instead of Payment because Payment records might not exist yet
-        orders = Rorder.objects.filter(
-            status='Paid',
-            createdat__date__range=[start_date, end_date]
-        )
-        
-        for order in orders:
-            order_date = order.createdat.date()
-            # Calculate total for this order from its details
-            details = Detail.objects.filter(dorderid=order)
-            order_total = 0
-            for detail in details:
-                if detail.ditemid and detail.ditemid.price:
-                    order_total += (detail.quantity or 0) * detail.ditemid.price
-            
-            if order_date in revenue_map:
-                revenue_map[order_date] += order_total
-        
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in self.BUCKET_LABELS:
+            return Response(
+                {'error': f'Invalid bucket. Must be one of: {list(self.BUCKET_LABELS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            end_date = self._parse_date(request.query_params.get('to')) or timezone.localdate()
+            start_date = self._parse_date(request.query_params.get('from')) or end_date - timedelta(days=6)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date. Use format YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start_date > end_date:
+            return Response(
+                {'error': '`from` must not be after `to`'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        range_start = timezone.make_aware(datetime.combine(start_date, time.min))
+        range_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+
+        # Khởi tạo toàn bộ các mốc trong khoảng (kể cả mốc không có doanh thu)
+        buckets = self._bucket_starts(range_start, range_end, bucket)
+        if len(buckets) > self.MAX_BUCKETS:
+            return Response(
+                {'error': f'Too many buckets ({len(buckets)}). Use a larger bucket or a shorter range'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        totals = {bucket_start: {'revenue': 0, 'orders': 0, 'items': 0} for bucket_start in buckets}
+
+        # Theo ngày/tuần/tháng: đọc bảng tổng hợp revenue_daily (chi phí chỉ phụ thuộc độ dài khoảng)
+        # Theo giờ: bảng tổng hợp không đủ chi tiết -> GROUP BY trực tiếp trên Detail JOIN Item
+        if bucket == 'hour':
+            rows = self._rows_from_details(range_start, range_end)
+        else:
+            rows = self._rows_from_rollup(start_date, end_date, bucket)
+
+        for row in rows:
+            bucket_start = row['bucket']
+            if not isinstance(bucket_start, datetime):
+                bucket_start = timezone.make_aware(datetime.combine(bucket_start, time.min))
+            bucket_start = timezone.localtime(bucket_start)
+            if bucket_start in totals:
+                totals[bucket_start]['revenue'] += row['revenue']
+                totals[bucket_start]['orders'] += row['orders']
+                totals[bucket_start]['items'] += row['items']
+
         # Format result
+        label = self.BUCKET_LABELS[bucket]
         result = []
-        for date_key in sorted(revenue_map.keys()):
+        for bucket_start in buckets:
             result.append({
-                'date': date_key.strftime('%d/%m'),
-                'revenue': revenue_map[date_key]
+                'date': bucket_start.strftime(label),
+                'start': bucket_start.isoformat(),
+                **totals[bucket_start]
             })
-            
-        return Response(result)
\ No newline at end of file
+
+        return Response(result)
+
+    @staticmethod
+    def _rows_from_rollup(start_date, end_date, bucket):
+        """1 query trên revenue_daily, gộp các ngày theo mốc"""
+        return (
+            RevenueDaily.objects
+            .filter(businessday__range=[start_date, end_date])
+            .annotate(bucket=Trunc('businessday', bucket, output_field=models.DateField()))
+            .values('bucket')
+            .annotate(revenue=Sum('revenue'), orders=Sum('ordercount'), items=Sum('itemcount'))
+            .order_by()
+        )
+
+    @staticmethod
+    def _rows_from_details(range_start, range_end):
+        """1 query: SUM(Quantity * Price) theo giờ của các order đã thanh toán"""
+        # Note: Dùng Rorder thay vì Payment vì Payment có thể chưa được tạo
+        return (
+            Detail.objects
+            .filter(
+                dorderid__status='Paid',
+                dorderid__createdat__gte=range_start,
+                dorderid__createdat__lt=range_end,
+            )
+            .annotate(bucket=Trunc('dorderid__createdat', 'hour', output_field=models.DateTimeField()))
+            .values('bucket')
+            .annotate(
+                revenue=order_total_expression(''),
+                orders=Count('dorderid', distinct=True),
+                items=Coalesce(Sum('quantity'), 0),
+            )
+            .order_by()
+        )
+
+    @staticmethod
+    def _parse_date(value):
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
+
+    @staticmethod
+    def _bucket_starts(range_start, range_end, bucket):
+        """Danh sách thời điểm bắt đầu của các mốc phủ [range_start, range_end)"""
+        current = range_start
+        if bucket == 'week':
+            current -= timedelta(days=current.weekday())
+        elif bucket == 'month':
+            current = current.replace(day=1)
+
+        starts = []
+        while current < range_end:
+            starts.append(current)
+            if bucket == 'hour':
+                current += timedelta(hours=1)
+            elif bucket == 'day':
+                current += timedelta(days=1)
+            elif bucket == 'week':
+                current += timedelta(weeks=1)
+            else:
+                year, month = divmod(current.month, 12)
+                current = current.replace(year=current.year + year, month=month + 1)
+        return starts
+
+
+class CacheStatsView(viewsets.ViewSet):
+    """
+    API trả về số lần hit/miss/invalidate của cache dữ liệu tham chiếu (theo process)
+    GET /api/cache-stats/
+    """
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        return Response(refcache.stats())
+
+
+class DatabasePoolStatsView(viewsets.ViewSet):
+    """
+    API trả về trạng thái connection pool MySQL của từng database (theo process)
+    GET /api/db-pool-stats/
+    """
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        return Response(dbpool.stats())
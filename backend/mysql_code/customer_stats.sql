@@ -0,0 +1,129 @@
+USE RestaurantDatabase;
+
+-- ============================================================
+-- Bảng tổng hợp chi tiêu của khách (thay cho fn_CustomerTotalSpent khi cần cho nhiều khách)
+-- Mỗi dòng YPromo (hóa đơn <-> order) là 1 lượt ghé, số tiền = fn_OrderSubtotal - giảm giá khuyến mãi,
+-- giống fn_CustomerTotalSpent; khuyến mãi được xét hạn theo ngày lập hóa đơn.
+-- Cộng dồn ngay khi YPromo được tạo (trg_order_create_invoice), trừ lại khi bị xóa (sp_DeleteOrder)
+-- Sau khi chạy script: python manage.py rebuild_customer_stats (nạp dữ liệu cũ)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS customer_stats (
+    CustomerID  VARCHAR(10) PRIMARY KEY,
+    TotalSpent  DECIMAL(14,2) NOT NULL DEFAULT 0,
+    VisitCount  INT NOT NULL DEFAULT 0,
+    LastVisit   DATETIME NULL,
+    KEY idx_customer_stats_spent (TotalSpent)
+);
+
+-- Theo ngày lập hóa đơn: bảng xếp hạng từ một ngày (?since=)
+CREATE TABLE IF NOT EXISTS customer_stats_daily (
+    CustomerID   VARCHAR(10) NOT NULL,
+    BusinessDay  DATE NOT NULL,
+    TotalSpent   DECIMAL(14,2) NOT NULL DEFAULT 0,
+    VisitCount   INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (CustomerID, BusinessDay),
+    KEY idx_customer_stats_daily_day (BusinessDay)
+);
+
+DELIMITER $$
+DROP FUNCTION IF EXISTS fn_VisitAmount$$
+
+-- Số tiền khách trả cho 1 dòng YPromo: tổng tiền order trừ giảm giá (nếu khuyến mãi còn hạn và đủ mức tối thiểu)
+CREATE FUNCTION fn_VisitAmount(
+    pOrderID  VARCHAR(10),
+    pPromoID  VARCHAR(10),
+    pDate     DATE
+)
+RETURNS DECIMAL(14,2)
+READS SQL DATA
+BEGIN
+    DECLARE v_subtotal DECIMAL(14,2);
+    DECLARE v_discount DECIMAL(14,2) DEFAULT 0.00;
+
+    SET v_subtotal = fn_OrderSubtotal(pOrderID);
+    SELECT IFNULL(SUM(
+        CASE
+            WHEN p.ExpireDate >= pDate AND v_subtotal >= p.MinValue
+            THEN ROUND(v_subtotal * p.DiscountPercent / 100, 2)
+            ELSE 0
+        END
+    ), 0.00)
+    INTO v_discount
+    FROM Promotion p
+    WHERE p.PromoID = pPromoID;
+
+    RETURN v_subtotal - v_discount;
+END$$
+
+DROP TRIGGER IF EXISTS trg_ypromo_customer_stats_ai$$
+
+CREATE TRIGGER trg_ypromo_customer_stats_ai
+AFTER INSERT ON YPromo
+FOR EACH ROW
+BEGIN
+    DECLARE v_customer VARCHAR(10);
+    DECLARE v_created DATETIME;
+    DECLARE v_amount DECIMAL(14,2);
+
+    SELECT CustomerID, DateCreated INTO v_customer, v_created
+    FROM Invoice
+    WHERE InvoiceID = NEW.YInvoiceID;
+
+    IF v_customer IS NOT NULL THEN
+        -- Chốt số tiền lúc lập hóa đơn: Detail của order đã có YPromo không đổi được nữa (trg_detail_b*_invoiced)
+        SET v_amount = fn_VisitAmount(NEW.YOrderID, NEW.YPromoID, DATE(v_created));
+
+        INSERT INTO customer_stats (CustomerID, TotalSpent, VisitCount, LastVisit)
+        VALUES (v_customer, v_amount, 1, v_created)
+        ON DUPLICATE KEY UPDATE
+            TotalSpent = TotalSpent + VALUES(TotalSpent),
+            VisitCount = VisitCount + 1,
+            LastVisit  = GREATEST(IFNULL(LastVisit, VALUES(LastVisit)), IFNULL(VALUES(LastVisit), LastVisit));
+
+        IF v_created IS NOT NULL THEN
+            INSERT INTO customer_stats_daily (CustomerID, BusinessDay, TotalSpent, VisitCount)
+            VALUES (v_customer, DATE(v_created), v_amount, 1)
+            ON DUPLICATE KEY UPDATE
+                TotalSpent = TotalSpent + VALUES(TotalSpent),
+                VisitCount = VisitCount + 1;
+        END IF;
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_ypromo_customer_stats_ad$$
+
+CREATE TRIGGER trg_ypromo_customer_stats_ad
+AFTER DELETE ON YPromo
+FOR EACH ROW
+BEGIN
+    DECLARE v_customer VARCHAR(10);
+    DECLARE v_created DATETIME;
+    DECLARE v_amount DECIMAL(14,2);
+
+    SELECT CustomerID, DateCreated INTO v_customer, v_created
+    FROM Invoice
+    WHERE InvoiceID = OLD.YInvoiceID;
+
+    IF v_customer IS NOT NULL THEN
+        -- sp_DeleteOrder xóa YPromo trước Detail nên tổng tiền order vẫn tính được
+        SET v_amount = fn_VisitAmount(OLD.YOrderID, OLD.YPromoID, DATE(v_created));
+
+        UPDATE customer_stats
+        SET TotalSpent = TotalSpent - v_amount,
+            VisitCount = VisitCount - 1,
+            LastVisit  = (
+                SELECT MAX(i.DateCreated)
+                FROM YPromo y
+                JOIN Invoice i ON i.InvoiceID = y.YInvoiceID
+                WHERE i.CustomerID = v_customer
+            )
+        WHERE CustomerID = v_customer;
+
+        UPDATE customer_stats_daily
+        SET TotalSpent = TotalSpent - v_amount,
+            VisitCount = VisitCount - 1
+        WHERE CustomerID = v_customer AND BusinessDay = DATE(v_created);
+    END IF;
+END$$
+
+DELIMITER ;
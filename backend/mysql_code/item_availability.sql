@@ -0,0 +1,83 @@
+USE RestaurantDatabase;
+
+-- ============================================================
+-- Số phần còn làm được của mỗi món theo tồn kho nguyên liệu (GET /api/items/available/)
+-- Mỗi phần dùng 1 đơn vị của mọi nguyên liệu trong QDMaterial (như trg_detail_bi_check_stock),
+-- nên Portions = MIN(Material.Quantity) trên các nguyên liệu của món (âm -> 0).
+-- Món không có nguyên liệu nào (hoặc mọi nguyên liệu có Quantity NULL) không bị giới hạn: không có dòng / Portions NULL.
+-- Cập nhật ngay khi Material.Quantity đổi (reconcile_stock gộp sổ kho stock_movement, sửa tồn kho) và khi QDMaterial đổi
+-- Phần sổ kho chưa gộp được cộng khi đọc (backend/core/stock.py: item_portions)
+-- Sau khi chạy script: python manage.py rebuild_item_availability (nạp dữ liệu cũ)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS item_availability (
+    ItemID    VARCHAR(10) PRIMARY KEY,
+    Portions  INT NULL
+);
+
+DELIMITER $$
+DROP PROCEDURE IF EXISTS sp_RefreshItemAvailability$$
+
+-- Tính lại 1 món
+CREATE PROCEDURE sp_RefreshItemAvailability(IN pItemID VARCHAR(10))
+BEGIN
+    DELETE FROM item_availability WHERE ItemID = pItemID;
+
+    INSERT INTO item_availability (ItemID, Portions)
+    SELECT q.QDItemID, GREATEST(MIN(m.Quantity), 0)
+    FROM QDMaterial q
+    JOIN Material m ON m.MaterialID = q.QDMaterialID
+    WHERE q.QDItemID = pItemID
+    GROUP BY q.QDItemID;
+END$$
+
+DROP TRIGGER IF EXISTS trg_material_item_availability_au$$
+
+CREATE TRIGGER trg_material_item_availability_au
+AFTER UPDATE ON Material
+FOR EACH ROW
+BEGIN
+    IF NOT (NEW.Quantity <=> OLD.Quantity) THEN
+        -- Chỉ các món dùng nguyên liệu này; 1 câu lệnh cho tất cả các món
+        UPDATE item_availability a
+        JOIN (
+            SELECT q.QDItemID, GREATEST(MIN(m.Quantity), 0) AS Portions
+            FROM QDMaterial q
+            JOIN Material m ON m.MaterialID = q.QDMaterialID
+            WHERE q.QDItemID IN (SELECT QDItemID FROM QDMaterial WHERE QDMaterialID = NEW.MaterialID)
+            GROUP BY q.QDItemID
+        ) t ON t.QDItemID = a.ItemID
+        SET a.Portions = t.Portions;
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_qdmaterial_item_availability_ai$$
+
+CREATE TRIGGER trg_qdmaterial_item_availability_ai
+AFTER INSERT ON QDMaterial
+FOR EACH ROW
+BEGIN
+    CALL sp_RefreshItemAvailability(NEW.QDItemID);
+END$$
+
+DROP TRIGGER IF EXISTS trg_qdmaterial_item_availability_au$$
+
+CREATE TRIGGER trg_qdmaterial_item_availability_au
+AFTER UPDATE ON QDMaterial
+FOR EACH ROW
+BEGIN
+    CALL sp_RefreshItemAvailability(OLD.QDItemID);
+    IF NEW.QDItemID <> OLD.QDItemID THEN
+        CALL sp_RefreshItemAvailability(NEW.QDItemID);
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_qdmaterial_item_availability_ad$$
+
+CREATE TRIGGER trg_qdmaterial_item_availability_ad
+AFTER DELETE ON QDMaterial
+FOR EACH ROW
+BEGIN
+    CALL sp_RefreshItemAvailability(OLD.QDItemID);
+END$$
+
+DELIMITER ;
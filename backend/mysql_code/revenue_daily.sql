@@ -0,0 +1,41 @@
+USE RestaurantDatabase;
+
+-- ============================================================
+-- Bảng tổng hợp doanh thu theo ngày (business day = DATE(ROrder.CreatedAt))
+-- Được cộng dồn ngay khi order chuyển sang 'Paid', dashboard chỉ đọc bảng này
+-- Sau khi chạy script: python manage.py rebuild_revenue_daily (nạp dữ liệu cũ)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS revenue_daily (
+    BusinessDay  DATE PRIMARY KEY,
+    Revenue      DECIMAL(14,2) NOT NULL DEFAULT 0,
+    OrderCount   INT NOT NULL DEFAULT 0,
+    ItemCount    INT NOT NULL DEFAULT 0
+);
+
+DELIMITER $$
+DROP TRIGGER IF EXISTS trg_order_paid_revenue_daily$$
+
+CREATE TRIGGER trg_order_paid_revenue_daily
+AFTER UPDATE ON ROrder
+FOR EACH ROW
+BEGIN
+    -- Order vừa được thanh toán: cộng vào ngày của order
+    IF OLD.Status <> 'Paid' AND NEW.Status = 'Paid' THEN
+        INSERT INTO revenue_daily (BusinessDay, Revenue, OrderCount, ItemCount)
+        VALUES (DATE(NEW.CreatedAt), fn_OrderSubtotal(NEW.OrderID), 1, IFNULL(NEW.Quantity, 0))
+        ON DUPLICATE KEY UPDATE
+            Revenue    = Revenue + VALUES(Revenue),
+            OrderCount = OrderCount + 1,
+            ItemCount  = ItemCount + VALUES(ItemCount);
+
+    -- Order bị chuyển khỏi trạng thái 'Paid' (vd: Cancelled): trừ lại
+    ELSEIF OLD.Status = 'Paid' AND NEW.Status <> 'Paid' THEN
+        UPDATE revenue_daily
+        SET Revenue    = Revenue - fn_OrderSubtotal(OLD.OrderID),
+            OrderCount = OrderCount - 1,
+            ItemCount  = ItemCount - IFNULL(OLD.Quantity, 0)
+        WHERE BusinessDay = DATE(OLD.CreatedAt);
+    END IF;
+END$$
+
+DELIMITER ;
@@ -0,0 +1,39 @@
+USE RestaurantDatabase;
+
+-- ============================================================
+-- Sổ nhập-xuất kho nguyên liệu (chỉ ghi thêm)
+-- Trigger trg_detail_ai/au/ad (trigger.sql) INSERT một dòng cho mỗi nguyên liệu của món
+-- thay vì UPDATE Material: các order cùng dùng gạo, dầu... không còn xếp hàng chờ khóa của một dòng Material.
+-- Tồn kho hiện tại = Material.Quantity (số dư đã gộp) + SUM(Delta) các dòng chưa gộp (fn_MaterialStock)
+-- Gộp định kỳ: python manage.py reconcile_stock (cộng Delta vào Material.Quantity rồi xóa các dòng đã gộp)
+-- Chạy script này trước trigger.sql (cài đặt cũ: chạy script rồi chạy lại trigger.sql)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS stock_movement (
+    MovementID  BIGINT AUTO_INCREMENT PRIMARY KEY,
+    MaterialID  VARCHAR(10) NOT NULL,
+    OrderID     VARCHAR(10) NULL,
+    DetailID    INT NULL,
+    Delta       INT NOT NULL,
+    CreatedAt   DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+    -- SUM(Delta) của 1 nguyên liệu đọc hết từ index, không đọc bảng
+    KEY idx_stock_movement_material (MaterialID, Delta)
+);
+
+DELIMITER $$
+DROP FUNCTION IF EXISTS fn_MaterialStock$$
+
+-- Tồn kho hiện tại của nguyên liệu (NULL nếu Quantity NULL)
+CREATE FUNCTION fn_MaterialStock(pMaterialID VARCHAR(10))
+RETURNS INT
+READS SQL DATA
+BEGIN
+    DECLARE v_quantity INT;
+    DECLARE v_pending INT;
+
+    SELECT Quantity INTO v_quantity FROM Material WHERE MaterialID = pMaterialID;
+    SELECT IFNULL(SUM(Delta), 0) INTO v_pending FROM stock_movement WHERE MaterialID = pMaterialID;
+
+    RETURN v_quantity + v_pending;
+END$$
+
+DELIMITER ;
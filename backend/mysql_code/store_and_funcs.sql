@@ -47,28 +47,52 @@ END$$
 
 DELIMITER ;
 
+-- Bộ đếm sinh mã: bảng id_sequence (Name, NextValue) do `python manage.py migrate` tạo
+-- và seed từ dữ liệu hiện có (migration 0006_seed_id_sequence: INV, ST; 0011_seed_customer_sequence: C).
+-- SELECT ... FOR UPDATE khóa dòng bộ đếm tới hết transaction nên 2 phiên không nhận cùng giá trị.
+DROP FUNCTION IF EXISTS fn_NextSequenceValue;
+DELIMITER $$
+
+CREATE FUNCTION fn_NextSequenceValue(pName VARCHAR(30))
+RETURNS BIGINT
+NOT DETERMINISTIC
+MODIFIES SQL DATA
+BEGIN
+    DECLARE v_next BIGINT DEFAULT NULL;
+
+    SELECT NextValue INTO v_next
+    FROM id_sequence
+    WHERE Name = pName
+    FOR UPDATE;
+
+    IF v_next IS NULL THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Chưa khởi tạo bộ đếm trong id_sequence (chạy python manage.py migrate)';
+    END IF;
+
+    UPDATE id_sequence
+    SET NextValue = v_next + 1
+    WHERE Name = pName;
+
+    RETURN v_next;
+END$$
+
+DELIMITER ;
+
 DROP FUNCTION IF EXISTS fn_GenerateInvoiceID;
 DELIMITER $$
 
 CREATE FUNCTION fn_GenerateInvoiceID()
 RETURNS VARCHAR(10)
-DETERMINISTIC
+NOT DETERMINISTIC
+MODIFIES SQL DATA
 BEGIN
-    DECLARE v_max_num INT DEFAULT 0;
-    DECLARE v_new_id VARCHAR(10);
-    
-    -- Lấy số lớn nhất từ InvoiceID có format INVxxx
-    SELECT IFNULL(MAX(CAST(SUBSTRING(InvoiceID, 4) AS UNSIGNED)), 0)
-    INTO v_max_num
-    FROM Invoice
-    WHERE InvoiceID LIKE 'INV%' 
-      AND LENGTH(InvoiceID) <= 10
-      AND SUBSTRING(InvoiceID, 4) REGEXP '^[0-9]+$';
-    
-    -- Tăng lên 1 và format INV + pad 0
-    SET v_new_id = CONCAT('INV', LPAD(v_max_num + 1, 4, '0'));
-    
-    RETURN v_new_id;
+    DECLARE v_next BIGINT;
+
+    -- Lấy số tiếp theo từ bộ đếm INV (O(1), không quét bảng Invoice)
+    -- Tăng lên 1 và format INV + pad 0 (từ 10000 giữ đủ chữ số: LPAD cắt bớt chuỗi dài hơn độ rộng)
+    SET v_next = fn_NextSequenceValue('INV');
+    RETURN CONCAT('INV', IF(v_next < 10000, LPAD(v_next, 4, '0'), v_next));
 END$$
 
 DELIMITER ;
@@ -279,6 +303,15 @@ BEGIN
 
     START TRANSACTION;
 
+    -- Tự sinh InvoiceID nếu không có; nếu truyền mã INVxxxx thì đẩy bộ đếm qua mã đó
+    IF pInvoiceID IS NULL OR pInvoiceID = '' THEN
+        SET pInvoiceID = fn_GenerateInvoiceID();
+    ELSEIF pInvoiceID REGEXP '^INV[0-9]+$' THEN
+        UPDATE id_sequence
+        SET NextValue = GREATEST(NextValue, CAST(SUBSTRING(pInvoiceID, 4) AS UNSIGNED) + 1)
+        WHERE Name = 'INV';
+    END IF;
+
     INSERT INTO Invoice (InvoiceID, DateCreated, Tax, IStaffID, CustomerID) 
     VALUES (pInvoiceID, NOW(), v_tax, pStaffID, pCustomerID);
 
@@ -313,6 +346,15 @@ BEGIN
 
     START TRANSACTION;
 
+    -- Trừ doanh thu đã cộng vào revenue_daily nếu đơn đã thanh toán (trước khi xóa Detail)
+    UPDATE revenue_daily r
+    JOIN ROrder o ON r.BusinessDay = DATE(o.CreatedAt)
+    SET r.Revenue    = r.Revenue - fn_OrderSubtotal(o.OrderID),
+        r.OrderCount = r.OrderCount - 1,
+        r.ItemCount  = r.ItemCount - IFNULL(o.Quantity, 0)
+    WHERE o.OrderID = pOrderID
+      AND o.Status = 'Paid';
+
     -- Xóa YPromo (liên kết Invoice-Order-Promo) nếu có
     DELETE FROM YPromo 
     WHERE YOrderID = pOrderID;
@@ -349,8 +391,8 @@ CREATE PROCEDURE sp_AddStaff(
     IN pRoleDetail VARCHAR(255)
 )
 BEGIN
-    DECLARE v_max_num INT DEFAULT 0;
     DECLARE v_experience INT DEFAULT 0;
+    DECLARE v_next BIGINT;
     
     DECLARE EXIT HANDLER FOR SQLEXCEPTION
     BEGIN
@@ -361,14 +403,15 @@ BEGIN
 
     START TRANSACTION;
 
-    -- Tự sinh StaffID nếu không có
+    -- Tự sinh StaffID nếu không có (bộ đếm ST trong id_sequence, không quét bảng Staff)
     IF pStaffID IS NULL OR pStaffID = '' THEN
-        SELECT IFNULL(MAX(CAST(SUBSTRING(StaffID, 3) AS UNSIGNED)), 0)
-        INTO v_max_num
-        FROM Staff
-        WHERE StaffID LIKE 'ST%';
-        
-        SET pStaffID = CONCAT('ST', LPAD(v_max_num + 1, 2, '0'));
+        -- Từ ST100 giữ đủ chữ số (LPAD cắt bớt chuỗi dài hơn độ rộng)
+        SET v_next = fn_NextSequenceValue('ST');
+        SET pStaffID = CONCAT('ST', IF(v_next < 100, LPAD(v_next, 2, '0'), v_next));
+    ELSEIF pStaffID REGEXP '^ST[0-9]+$' THEN
+        UPDATE id_sequence
+        SET NextValue = GREATEST(NextValue, CAST(SUBSTRING(pStaffID, 3) AS UNSIGNED) + 1)
+        WHERE Name = 'ST';
     END IF;
 
     -- Thêm vào bảng Staff (FullName, Phone, Status, SManagerID)
@@ -543,7 +586,7 @@ CREATE PROCEDURE sp_GetOrCreateCustomer(
 )
 BEGIN
     DECLARE v_existingID VARCHAR(10);
-    DECLARE v_maxNum INT DEFAULT 0;
+    DECLARE v_next BIGINT;
     
     -- Kiểm tra xem số điện thoại đã tồn tại chưa
     SELECT CustomerID INTO v_existingID
@@ -560,16 +603,10 @@ BEGIN
         -- Trả về CustomerID cũ
         SELECT v_existingID AS CustomerID;
     ELSE
-        -- Chưa tồn tại, tạo CustomerID mới
-        -- Lấy số lớn nhất từ CustomerID hiện có (C001 -> 1, C002 -> 2)
-        SELECT IFNULL(MAX(CAST(SUBSTRING(CustomerID, 2) AS UNSIGNED)), 0)
-        INTO v_maxNum
-        FROM Customer
-        WHERE CustomerID REGEXP '^C[0-9]+$';
-        
-        -- Tạo CustomerID mới: C001, C002, C003, ...
-        SET v_maxNum = v_maxNum + 1;
-        SET v_existingID = CONCAT('C', LPAD(v_maxNum, 3, '0'));
+        -- Chưa tồn tại, tạo CustomerID mới từ bộ đếm C (O(1), không quét bảng Customer)
+        -- C001, C002, ..., C999, C1000 (LPAD cắt bớt chuỗi dài hơn độ rộng nên chỉ pad dưới 1000)
+        SET v_next = fn_NextSequenceValue('C');
+        SET v_existingID = CONCAT('C', IF(v_next < 1000, LPAD(v_next, 3, '0'), v_next));
         
         -- Insert khách hàng mới
         INSERT INTO Customer (CustomerID, FullName, Phone)
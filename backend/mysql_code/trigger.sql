@@ -4,16 +4,16 @@ CREATE TRIGGER trg_detail_ai
 AFTER INSERT ON Detail
 FOR EACH ROW
 BEGIN
-    -- Cập nhật tổng số món 
+    -- Cập nhật tổng số món: cộng số lượng của dòng mới (không đếm lại toàn bộ Detail)
     UPDATE ROrder
-    SET Quantity = fn_GetOrderItemCount(NEW.DOrderID)
+    SET Quantity = IFNULL(Quantity, 0) + IFNULL(NEW.Quantity, 0)
     WHERE OrderID = NEW.DOrderID;
 
-    -- Trừ 1 
-    UPDATE Material m
-    JOIN QDMaterial q ON q.QDMaterialID = m.MaterialID
-    SET m.Quantity = m.Quantity - (NEW.Quantity * 1)
-    WHERE q.QDItemID = NEW.DItemID;
+    -- Trừ 1 đơn vị mỗi nguyên liệu mỗi phần: ghi vào sổ kho (stock_ledger.sql), không khóa dòng Material
+    INSERT INTO stock_movement (MaterialID, OrderID, DetailID, Delta)
+    SELECT q.QDMaterialID, NEW.DOrderID, NEW.DetailID, -NEW.Quantity
+    FROM QDMaterial q
+    WHERE q.QDItemID = NEW.DItemID AND IFNULL(NEW.Quantity, 0) <> 0;
 END$$
 DELIMITER ;
 
@@ -23,36 +23,38 @@ CREATE TRIGGER trg_detail_au
 AFTER UPDATE ON Detail
 FOR EACH ROW
 BEGIN
+    -- Cập nhật tổng số món theo chênh lệch của dòng
     IF OLD.DOrderID <> NEW.DOrderID THEN
         UPDATE ROrder
-        SET Quantity = fn_GetOrderItemCount(OLD.DOrderID)
+        SET Quantity = IFNULL(Quantity, 0) - IFNULL(OLD.Quantity, 0)
         WHERE OrderID = OLD.DOrderID;
 
         UPDATE ROrder
-        SET Quantity = fn_GetOrderItemCount(NEW.DOrderID)
+        SET Quantity = IFNULL(Quantity, 0) + IFNULL(NEW.Quantity, 0)
         WHERE OrderID = NEW.DOrderID;
-    ELSE
+    ELSEIF NOT (OLD.Quantity <=> NEW.Quantity) THEN
         UPDATE ROrder
-        SET Quantity = fn_GetOrderItemCount(NEW.DOrderID)
+        SET Quantity = IFNULL(Quantity, 0) + IFNULL(NEW.Quantity, 0) - IFNULL(OLD.Quantity, 0)
         WHERE OrderID = NEW.DOrderID;
     END IF;
 
     IF OLD.DItemID <> NEW.DItemID THEN
-        
-        UPDATE Material m
-        JOIN QDMaterial q ON q.QDMaterialID = m.MaterialID
-        SET m.Quantity = m.Quantity + (OLD.Quantity * 1)
-        WHERE q.QDItemID = OLD.DItemID;
-
-        UPDATE Material m
-        JOIN QDMaterial q ON q.QDMaterialID = m.MaterialID
-        SET m.Quantity = m.Quantity - (NEW.Quantity * 1)
-        WHERE q.QDItemID = NEW.DItemID;
+        -- Đổi món: trả nguyên liệu món cũ, trừ nguyên liệu món mới
+        INSERT INTO stock_movement (MaterialID, OrderID, DetailID, Delta)
+        SELECT q.QDMaterialID, OLD.DOrderID, OLD.DetailID, OLD.Quantity
+        FROM QDMaterial q
+        WHERE q.QDItemID = OLD.DItemID AND IFNULL(OLD.Quantity, 0) <> 0;
 
-    ELSE
-        UPDATE Material m
-        JOIN QDMaterial q ON q.QDMaterialID = m.MaterialID
-        SET m.Quantity = m.Quantity - ((NEW.Quantity - OLD.Quantity) * 1)
+        INSERT INTO stock_movement (MaterialID, OrderID, DetailID, Delta)
+        SELECT q.QDMaterialID, NEW.DOrderID, NEW.DetailID, -NEW.Quantity
+        FROM QDMaterial q
+        WHERE q.QDItemID = NEW.DItemID AND IFNULL(NEW.Quantity, 0) <> 0;
+
+    ELSEIF NOT (OLD.Quantity <=> NEW.Quantity) THEN
+        -- Cùng món: trừ theo chênh lệch
+        INSERT INTO stock_movement (MaterialID, OrderID, DetailID, Delta)
+        SELECT q.QDMaterialID, NEW.DOrderID, NEW.DetailID, IFNULL(OLD.Quantity, 0) - IFNULL(NEW.Quantity, 0)
+        FROM QDMaterial q
         WHERE q.QDItemID = NEW.DItemID;
     END IF;
 
@@ -65,16 +67,16 @@ CREATE TRIGGER trg_detail_ad
 AFTER DELETE ON Detail
 FOR EACH ROW
 BEGIN
-    -- Cập nhật quantity
+    -- Cập nhật quantity: trừ số lượng của dòng bị xóa
     UPDATE ROrder
-    SET Quantity = fn_GetOrderItemCount(OLD.DOrderID)
+    SET Quantity = IFNULL(Quantity, 0) - IFNULL(OLD.Quantity, 0)
     WHERE OrderID = OLD.DOrderID;
 
     -- Trả lại nguyên liệu
-    UPDATE Material m
-    JOIN QDMaterial q ON q.QDMaterialID = m.MaterialID
-    SET m.Quantity = m.Quantity + (OLD.Quantity * 1)
-    WHERE q.QDItemID = OLD.DItemID;
+    INSERT INTO stock_movement (MaterialID, OrderID, DetailID, Delta)
+    SELECT q.QDMaterialID, OLD.DOrderID, OLD.DetailID, OLD.Quantity
+    FROM QDMaterial q
+    WHERE q.QDItemID = OLD.DItemID AND IFNULL(OLD.Quantity, 0) <> 0;
 END$$
 DELIMITER ;
 
@@ -87,9 +89,8 @@ BEGIN
     IF EXISTS (
         SELECT 1
         FROM QDMaterial q
-        JOIN Material m ON m.MaterialID = q.QDMaterialID
         WHERE q.QDItemID = NEW.DItemID
-          AND m.Quantity < (NEW.Quantity * 1)
+          AND fn_MaterialStock(q.QDMaterialID) < (NEW.Quantity * 1)
     ) THEN
         SIGNAL SQLSTATE '45000'
             SET MESSAGE_TEXT = 'Insufficient material stock for this item';
@@ -108,9 +109,8 @@ BEGIN
         IF EXISTS (
             SELECT 1
             FROM QDMaterial q
-            JOIN Material m ON m.MaterialID = q.QDMaterialID
             WHERE q.QDItemID = NEW.DItemID
-              AND m.Quantity < (NEW.Quantity * 1)
+              AND fn_MaterialStock(q.QDMaterialID) < (NEW.Quantity * 1)
         ) THEN
             SIGNAL SQLSTATE '45000'
                 SET MESSAGE_TEXT = 'Insufficient stock for new item';
@@ -122,9 +122,8 @@ BEGIN
             IF EXISTS (
                 SELECT 1
                 FROM QDMaterial q
-                JOIN Material m ON m.MaterialID = q.QDMaterialID
                 WHERE q.QDItemID = NEW.DItemID
-                  AND m.Quantity < ((NEW.Quantity - OLD.Quantity) * 1)
+                  AND fn_MaterialStock(q.QDMaterialID) < ((NEW.Quantity - OLD.Quantity) * 1)
             ) THEN
                 SIGNAL SQLSTATE '45000'
                     SET MESSAGE_TEXT = 'Insufficient material for quantity increase';
@@ -135,6 +134,47 @@ BEGIN
 END$$
 DELIMITER ;
 
+-- ============================================================
+-- Order đã lập hóa đơn (có YPromo) không được thêm/sửa/xóa món:
+-- revenue_daily (trg_order_paid_revenue_daily) và customer_stats (trg_ypromo_customer_stats_ai)
+-- chốt tổng tiền lúc thanh toán, Detail đổi sau đó sẽ làm 2 bảng tổng hợp lệch với Detail.
+-- sp_DeleteOrder xóa YPromo trước Detail nên vẫn xóa được order đã thanh toán.
+-- ============================================================
+DELIMITER $$
+DROP TRIGGER IF EXISTS trg_detail_bi_invoiced$$
+CREATE TRIGGER trg_detail_bi_invoiced
+BEFORE INSERT ON Detail
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM YPromo WHERE YOrderID = NEW.DOrderID) THEN
+        SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Order already invoiced';
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_detail_bu_invoiced$$
+CREATE TRIGGER trg_detail_bu_invoiced
+BEFORE UPDATE ON Detail
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM YPromo WHERE YOrderID IN (OLD.DOrderID, NEW.DOrderID)) THEN
+        SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Order already invoiced';
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_detail_bd_invoiced$$
+CREATE TRIGGER trg_detail_bd_invoiced
+BEFORE DELETE ON Detail
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM YPromo WHERE YOrderID = OLD.DOrderID) THEN
+        SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Order already invoiced';
+    END IF;
+END$$
+DELIMITER ;
+
 DELIMITER $$
 DROP TRIGGER IF EXISTS trg_order_create_invoice$$
 
@@ -189,7 +229,7 @@ BEGIN
                 LIMIT 1;
             END IF;
             
-            -- Generate InvoiceID tự động
+            -- Generate InvoiceID tự động (bộ đếm INV trong id_sequence)
             SET v_invoice_id = fn_GenerateInvoiceID();
             
             -- Tạo Invoice mới với CustomerID từ PTOrder
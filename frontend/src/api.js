@@ -74,6 +74,23 @@ export const logout = () => {
   window.location.href = '/'; // Force reload to clear state
 };
 
+// ==================== CHANGE FEED ====================
+// Nhận thay đổi bàn/order qua Server-Sent Events thay vì polling.
+// onChange được gọi (kèm tên sự kiện) khi có thay đổi và mỗi lần kết nối (lại) để đồng bộ.
+export const CHANGE_EVENTS = [
+  'table.status', 'order.created', 'order.items', 'order.paid', 'order.deleted',
+  'payment.created', 'payment.updated', 'payment.deleted',
+];
+
+export const subscribeChanges = (onChange) => {
+  const source = new EventSource(`${API_BASE_URL}/events/`);
+  source.onopen = () => onChange('open');
+  CHANGE_EVENTS.forEach((eventType) => {
+    source.addEventListener(eventType, () => onChange(eventType));
+  });
+  return () => source.close();
+};
+
 // ==================== ITEMS ====================
 export const getItems = () => {
   return api.get('/items/');
@@ -120,8 +137,15 @@ export const addItemToOrder = (orderId, itemId, quantity) => {
   });
 };
 
-export const completeOrder = (orderId, customerData) => {
-  return api.post(`/orders/${orderId}/complete/`, customerData);
+// items: [{ ditemid: 'F001', quantity: 2 }, ...] - thêm cả lô món trong 1 request
+export const addItemsToOrder = (orderId, items) => {
+  return api.post(`/orders/${orderId}/add_items/`, { items });
+};
+
+// idempotencyKey: sinh 1 lần cho mỗi lần thanh toán, gửi lại đúng key khi retry -> server không thanh toán 2 lần
+export const completeOrder = (orderId, customerData, idempotencyKey) => {
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {};
+  return api.post(`/orders/${orderId}/complete/`, customerData, { headers });
 };
 
 export const deleteOrder = (orderId) => {
@@ -152,12 +176,13 @@ export const getPromotions = () => {
 };
 
 // ==================== STAFF ====================
-export const getStaff = (role) => {
-  let url = '/staff/';
-  if (role) {
-    url += `?role=${role}`;
-  }
-  return api.get(url);
+export const getStaff = (role, params = {}) => {
+  // params: page, page_size, status, search, ordering (lọc + phân trang ở backend)
+  return api.get('/staff/', { params: role ? { role, ...params } : params });
+};
+
+export const getStaffRoleCounts = () => {
+  return api.get('/staff/role_counts/');
 };
 
 export const addStaff = (data) => {
@@ -200,6 +225,7 @@ export const deleteMaterial = (id) => {
 };
 
 // ==================== REVENUE ====================
-export const getRevenueStats = () => {
-  return api.get('/revenue/');
+// params: { from: 'YYYY-MM-DD', to: 'YYYY-MM-DD', bucket: 'hour' | 'day' | 'week' | 'month' }
+export const getRevenueStats = (params) => {
+  return api.get('/revenue/', { params });
 };
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getTables, getOrders, getInvoices, getRevenueStats } from '../api';
+import { getTables, getOrders, getInvoices, getRevenueStats, subscribeChanges } from '../api';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import './AdminView.css';
 
@@ -17,8 +17,9 @@ function AdminView() {
 
   useEffect(() => {
     loadData();
-    const interval = setInterval(loadData, 10000);
-    return () => clearInterval(interval);
+    // Chỉ tải lại khi server báo có thay đổi (SSE), không polling
+    const unsubscribe = subscribeChanges(loadData);
+    return unsubscribe;
   }, []);
 
   const loadData = async () => {
@@ -15,7 +15,7 @@ function CustomerManagement() {
 
   const loadCustomers = async () => {
     try {
-      const response = await fetch('http://127.0.0.1:8000/api/customers/');
+      const response = await fetch('http://127.0.0.1:8000/api/customers/?with_stats=1&ordering=-total_billed');
       const data = await response.json();
       setCustomers(data.results || data);
       setError(null);
@@ -82,6 +82,8 @@ function CustomerManagement() {
                   <th>Mã KH</th>
                   <th>Họ Tên</th>
                   <th>Số Điện Thoại</th>
+                  <th>Số HĐ</th>
+                  <th>Tổng Tiền</th>
                   <th>Thao Tác</th>
                 </tr>
               </thead>
@@ -94,6 +96,8 @@ function CustomerManagement() {
                     <td>{customer.customerid}</td>
                     <td>{customer.fullname}</td>
                     <td>{customer.phone}</td>
+                    <td>{customer.invoice_count}</td>
+                    <td>₫{Math.round(customer.total_billed).toLocaleString('vi-VN')}</td>
                     <td>
                       <button 
                         className="btn-view"
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getTables, getAvailableItems, createOrder, addItemToOrder } from '../api';
+import { getTables, getAvailableItems, createOrder, addItemToOrder, subscribeChanges } from '../api';
 import './CustomerView.css';
 
 function CustomerView() {
@@ -14,8 +14,9 @@ function CustomerView() {
 
   useEffect(() => {
     loadData();
-    const interval = setInterval(loadData, 10000);
-    return () => clearInterval(interval);
+    // Chỉ tải lại khi server báo có thay đổi (SSE), không polling
+    const unsubscribe = subscribeChanges(loadData);
+    return unsubscribe;
   }, []);
 
   const loadData = async () => {
@@ -59,11 +60,21 @@ function CustomerView() {
     }
 
     const item = items.find(i => i.itemid === itemId);
+    // portions: số phần còn làm được theo tồn kho (null = không giới hạn)
+    if (item && item.portions === 0) {
+      setError(`Món ${item.name} đã hết nguyên liệu!`);
+      return;
+    }
     setConfirmModal({ show: true, item: item, quantity: 1 });
   };
 
   const confirmAddItem = async () => {
     if (!confirmModal.item) return;
+    const { portions } = confirmModal.item;
+    if (portions !== null && portions !== undefined && confirmModal.quantity > portions) {
+      setError(`Chỉ còn đủ nguyên liệu cho ${portions} phần ${confirmModal.item.name}!`);
+      return;
+    }
 
     try {
       let orderId;
@@ -352,7 +363,11 @@ function CustomerView() {
                     <div className="food-info">
                       <h3>{item.name}</h3>
                       <div className="food-price">₫ {Math.round(item.price).toLocaleString('vi-VN')}</div>
-                      <button className="btn-add">Gọi món</button>
+                      {item.portions === 0 ? (
+                        <button className="btn-add" disabled>Hết nguyên liệu</button>
+                      ) : (
+                        <button className="btn-add">Gọi món</button>
+                      )}
                     </div>
                   </div>
                 ))}
@@ -377,7 +392,11 @@ function CustomerView() {
                     <div className="food-info">
                       <h3>{item.name}</h3>
                       <div className="food-price">₫ {Math.round(item.price).toLocaleString('vi-VN')}</div>
-                      <button className="btn-add">Gọi món</button>
+                      {item.portions === 0 ? (
+                        <button className="btn-add" disabled>Hết nguyên liệu</button>
+                      ) : (
+                        <button className="btn-add">Gọi món</button>
+                      )}
                     </div>
                   </div>
                 ))}
@@ -402,7 +421,11 @@ function CustomerView() {
                     <div className="food-info">
                       <h3>{item.name}</h3>
                       <div className="food-price">₫ {Math.round(item.price).toLocaleString('vi-VN')}</div>
-                      <button className="btn-add">Gọi món</button>
+                      {item.portions === 0 ? (
+                        <button className="btn-add" disabled>Hết nguyên liệu</button>
+                      ) : (
+                        <button className="btn-add">Gọi món</button>
+                      )}
                     </div>
                   </div>
                 ))}
@@ -427,7 +450,11 @@ function CustomerView() {
                     <div className="food-info">
                       <h3>{item.name}</h3>
                       <div className="food-price">₫ {Math.round(item.price).toLocaleString('vi-VN')}</div>
-                      <button className="btn-add">Gọi món</button>
+                      {item.portions === 0 ? (
+                        <button className="btn-add" disabled>Hết nguyên liệu</button>
+                      ) : (
+                        <button className="btn-add">Gọi món</button>
+                      )}
                     </div>
                   </div>
                 ))}
@@ -1,12 +1,13 @@
-import React, { useState, useEffect } from 'react';
-import { getStaff, addStaff, updateStaff, deleteStaff } from '../api';
-import axios from 'axios';
+import React, { useState, useEffect, useRef } from 'react';
+import { getStaff, getStaffRoleCounts, addStaff, updateStaff, deleteStaff } from '../api';
+
+const PAGE_SIZE = 50;
 
 function StaffManagement() {
   const [staff, setStaff] = useState([]);
-  const [chefs, setChefs] = useState([]);
-  const [cashiers, setCashiers] = useState([]);
-  const [waiters, setWaiters] = useState([]);
+  const [roleCounts, setRoleCounts] = useState({ all: 0, chef: 0, cashier: 0, waiter: 0 });
+  const [page, setPage] = useState(1);
+  const [totalPages, setTotalPages] = useState(1);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
@@ -23,37 +24,38 @@ function StaffManagement() {
     role_detail: ''  // Experience/Education/Fluency
   });
 
-  useEffect(() => {
-    fetchStaffData(activeTab);
-  }, [activeTab]);
+  // Trang đã tải theo `${role}:${page}` và số lượng theo chức vụ: đổi tab / trang không gọi lại API,
+  // chỉ xóa sau khi thêm / sửa / xóa nhân viên
+  const pageCache = useRef(new Map());
+  const countsCache = useRef(null);
 
-  const fetchStaffData = async (role = 'all') => {
-    try {
-      setLoading(true);
-      const API_BASE = 'http://127.0.0.1:8000/api';
-      const token = localStorage.getItem('accessToken');
-      const config = {
-        headers: { Authorization: `Bearer ${token}` }
-      };
+  useEffect(() => {
+    fetchStaffData(activeTab, page);
+  }, [activeTab, page]);
 
-      // Gọi API staff với role filter (sử dụng Raw SQL Query ở backend)
-      const [staffRes, chefsRes, cashiersRes, waitersRes] = await Promise.all([
-        axios.get(`${API_BASE}/staff/?role=${role}`, config),
-        axios.get(`${API_BASE}/chefs/`, config),
-        axios.get(`${API_BASE}/cashiers/`, config),
-        axios.get(`${API_BASE}/waiters/`, config)
-      ]);
+  const invalidateStaffCache = () => {
+    pageCache.current.clear();
+    countsCache.current = null;
+  };
 
-      const staffData = staffRes.data.results || staffRes.data;
-      const chefsData = chefsRes.data.results || chefsRes.data;
-      const cashiersData = cashiersRes.data.results || cashiersRes.data;
-      const waitersData = waitersRes.data.results || waitersRes.data;
+  const fetchStaffData = async (role = 'all', pageNumber = 1) => {
+    const key = `${role}:${pageNumber}`;
+    try {
+      if (!pageCache.current.has(key)) {
+        setLoading(true);
+        // Lọc theo chức vụ và phân trang ở backend (1 query, có cache)
+        const [staffRes, countsRes] = await Promise.all([
+          getStaff(role, { page: pageNumber, page_size: PAGE_SIZE }),
+          countsCache.current ? Promise.resolve({ data: countsCache.current }) : getStaffRoleCounts()
+        ]);
+        pageCache.current.set(key, staffRes.data);
+        countsCache.current = countsRes.data;
+      }
 
-      setStaff(Array.isArray(staffData) ? staffData : []);
-      setChefs(Array.isArray(chefsData) ? chefsData : []);
-      setCashiers(Array.isArray(cashiersData) ? cashiersData : []);
-      setWaiters(Array.isArray(waitersData) ? waitersData : []);
-      
+      const data = pageCache.current.get(key);
+      setStaff(Array.isArray(data.results) ? data.results : []);
+      setTotalPages(Math.max(1, Math.ceil((data.count || 0) / PAGE_SIZE)));
+      setRoleCounts(countsCache.current);
       setError('');
     } catch (err) {
       console.error('Error fetching staff:', err);
@@ -63,6 +65,11 @@ function StaffManagement() {
     }
   };
 
+  const changeTab = (role) => {
+    setActiveTab(role);
+    setPage(1);
+  };
+
   const handleAddStaff = () => {
     setModalMode('add');
     setSelectedStaff(null);
@@ -102,7 +109,8 @@ function StaffManagement() {
       }
       
       setShowModal(false);
-      fetchStaffData(activeTab);
+      invalidateStaffCache();
+      fetchStaffData(activeTab, page);
       
       setTimeout(() => setSuccess(''), 3000);
     } catch (err) {
@@ -120,7 +128,13 @@ function StaffManagement() {
     try {
       await deleteStaff(staffId);
       setSuccess('Xóa nhân viên thành công!');
-      fetchStaffData(activeTab);
+      invalidateStaffCache();
+      // Xóa dòng cuối cùng của trang cuối: lùi về trang trước (useEffect sẽ tải lại)
+      if (staff.length === 1 && page > 1) {
+        setPage(page - 1);
+      } else {
+        fetchStaffData(activeTab, page);
+      }
       setTimeout(() => setSuccess(''), 3000);
     } catch (err) {
       console.error('Error deleting staff:', err);
@@ -138,7 +152,7 @@ function StaffManagement() {
     return '';
   };
 
-  // Backend đã xử lý filter bằng Raw SQL Query
+  // Backend đã xử lý filter và phân trang
 
   if (loading) return <div>Đang tải...</div>;
 
@@ -167,12 +181,12 @@ function StaffManagement() {
           id="role-filter"
           className="role-filter"
           value={activeTab}
-          onChange={(e) => setActiveTab(e.target.value)}
+          onChange={(e) => changeTab(e.target.value)}
         >
-          <option value="all">Tất Cả ({staff.length})</option>
-          <option value="chef">Đầu Bếp ({chefs.length})</option>
-          <option value="cashier">Thu Ngân ({cashiers.length})</option>
-          <option value="waiter">Phục Vụ ({waiters.length})</option>
+          <option value="all">Tất Cả ({roleCounts.all})</option>
+          <option value="chef">Đầu Bếp ({roleCounts.chef})</option>
+          <option value="cashier">Thu Ngân ({roleCounts.cashier})</option>
+          <option value="waiter">Phục Vụ ({roleCounts.waiter})</option>
         </select>
       </div>
 
@@ -240,6 +254,18 @@ function StaffManagement() {
         </table>
       </div>
 
+      {totalPages > 1 && (
+        <div className="staff-pagination">
+          <button className="page-btn" onClick={() => setPage(page - 1)} disabled={page === 1}>
+            ← Trước
+          </button>
+          <span>Trang {page} / {totalPages}</span>
+          <button className="page-btn" onClick={() => setPage(page + 1)} disabled={page === totalPages}>
+            Sau →
+          </button>
+        </div>
+      )}
+
       {/* Modal Form */}
       {showModal && (
         <div className="modal-overlay" onClick={() => setShowModal(false)}>
@@ -387,6 +413,14 @@ function StaffManagement() {
           gap: 8px;
         }
         
+        .staff-pagination {
+          display: flex;
+          justify-content: center;
+          align-items: center;
+          gap: 12px;
+          margin-top: 15px;
+        }
+        
         .btn-edit {
           background: #3498db;
           color: white;
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getTables, completeOrder, updateTable, deleteOrder } from '../api';
+import { getTables, completeOrder, updateTable, deleteOrder, subscribeChanges } from '../api';
 import './StaffView.css';
 
 function StaffView() {
@@ -10,11 +10,14 @@ function StaffView() {
   const [showPaymentModal, setShowPaymentModal] = useState(false);
   const [selectedOrderId, setSelectedOrderId] = useState(null);
   const [customerInfo, setCustomerInfo] = useState({ name: '', phone: '' });
+  // Idempotency-Key của lần thanh toán đang mở: bấm lại sau lỗi mạng dùng lại key này
+  const [checkoutKey, setCheckoutKey] = useState(null);
 
   useEffect(() => {
     loadTables();
-    const interval = setInterval(loadTables, 5000);
-    return () => clearInterval(interval);
+    // Chỉ tải lại khi server báo có thay đổi (SSE), không polling
+    const unsubscribe = subscribeChanges(loadTables);
+    return unsubscribe;
   }, []);
 
   const loadTables = async () => {
@@ -34,6 +37,7 @@ function StaffView() {
   const handleCompleteOrder = (orderId) => {
     setSelectedOrderId(orderId);
     setCustomerInfo({ name: '', phone: '' });
+    setCheckoutKey(`${orderId}-${Date.now()}-${Math.random().toString(36).slice(2, 10)}`);
     setShowPaymentModal(true);
   };
 
@@ -48,7 +52,7 @@ function StaffView() {
       await completeOrder(selectedOrderId, {
         customer_name: customerInfo.name.trim(),
         customer_phone: customerInfo.phone.trim()
-      });
+      }, checkoutKey);
       setSuccess('Đã hoàn thành đơn hàng và lưu thông tin khách hàng!');
       setShowPaymentModal(false);
       setCustomerInfo({ name: '', phone: '' });
@@ -47,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Đứng đầu để đo cả query của các middleware phía sau (session, auth)
+    'backend.core.middleware.QueryTimingMiddleware',
+    'backend.core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -94,6 +97,88 @@ DATABASES = {
     }
 }
 
+# Connection pool cho MySQL (backend/core/mysql_pool, DB_POOL=0 để tắt)
+# Cuối mỗi request connection được trả về pool (CONN_MAX_AGE = 0) thay vì ngắt kết nối
+if os.getenv('DB_POOL', '1') == '1':
+    DATABASES['default']['ENGINE'] = 'backend.core.mysql_pool'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+        # Giây: connection sống quá lâu / rảnh quá lâu bị đóng (nhỏ hơn wait_timeout của MySQL)
+        'max_lifetime': int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        'max_idle': int(os.getenv('DB_POOL_MAX_IDLE', 300)),
+        # Giây chờ khi pool đã đủ max_size
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+
+# EMBEDDED_DB=1: chạy trên SQLite, không cần MySQL (test, benchmark, dev nhanh)
+# - bảng nghiệp vụ + trigger được tạo khi `migrate` (backend/core/embedded.py)
+# - `python manage.py test` dùng file SQLite riêng (xóa sau khi chạy): SQLite in-memory dùng chung giữa các thread
+#   báo "database table is locked" ngay thay vì chờ timeout, nên không chạy được test ghi song song
+EMBEDDED_DB = os.getenv('EMBEDDED_DB', '0') == '1'
+if EMBEDDED_DB:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('EMBEDDED_DB_NAME', str(BASE_DIR / 'embedded.sqlite3')),
+            'OPTIONS': {
+                # benchmark nhiều thread: chờ lock thay vì lỗi "database is locked"
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+            },
+            'TEST': {'NAME': os.getenv('EMBEDDED_TEST_DB_NAME', str(BASE_DIR / 'test_embedded.sqlite3'))},
+        }
+    }
+
+# =====================================================
+# Read replica (tùy chọn) - backend/core/replica.py
+# =====================================================
+# MySQL: đặt DB_REPLICA_HOST và/hoặc DB_REPLICA_NAME (có thể là database thứ hai đứng thay replica)
+# EMBEDDED_DB: EMBEDDED_REPLICA_NAME là file SQLite đứng thay replica (vd. bản copy của embedded.sqlite3)
+# Trong test, replica là mirror của 'default'
+REPLICA_CONFIGURED = bool(
+    os.getenv('EMBEDDED_REPLICA_NAME') if EMBEDDED_DB else os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME')
+)
+if EMBEDDED_DB:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('EMBEDDED_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif REPLICA_CONFIGURED:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['backend.core.replica.ReplicaRouter']
+
+# Bật đọc từ replica (mặc định bật khi đã cấu hình replica)
+REPLICA_READS = os.getenv('REPLICA_READS', '1' if REPLICA_CONFIGURED else '0') == '1'
+# GET/HEAD có path bắt đầu bằng các tiền tố này được đọc từ replica
+REPLICA_READ_PATHS = [
+    '/api/revenue/',
+    '/api/customers/',
+    '/api/invoices/',
+    '/api/materials/',
+    '/api/staff/',
+]
+# Read-your-writes: client vừa ghi được đọc từ primary trong bao nhiêu giây
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+REPLICA_STICKY_CACHE = 'default'
+# Replica trễ quá ngưỡng (giây) thì đọc từ primary; độ trễ đo lại mỗi REPLICA_LAG_CHECK_INTERVAL giây
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+
+# Gọi stored procedure MySQL (sp_GetOrCreateCustomer, sp_DeleteOrder, ...) hay bản Python tương đương
+# trong backend/core/procedures.py (luôn dùng bản Python khi database không phải MySQL)
+USE_STORED_PROCEDURES = os.getenv('USE_STORED_PROCEDURES', '0' if EMBEDDED_DB else '1') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -154,6 +239,26 @@ REST_FRAMEWORK = {
     ],
 }
 
+# =====================================================
+# Cache Configuration
+# =====================================================
+# 'reference': cache dữ liệu tham chiếu (món, đầu bếp, bàn, khuyến mãi, nhân viên)
+# Mặc định LocMemCache (không cần service ngoài): TTL = TIMEOUT giây, LRU khi vượt MAX_ENTRIES
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reference': {
+        'BACKEND': os.getenv('REFERENCE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('REFERENCE_CACHE_LOCATION', 'reference-data'),
+        'TIMEOUT': int(os.getenv('REFERENCE_CACHE_TTL', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+REFERENCE_CACHE_ALIAS = 'reference'
+
 # =====================================================
 # CORS Configuration
 # =====================================================
@@ -166,3 +271,32 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+
+# =====================================================
+# Test Configuration
+# =====================================================
+# Tạo các bảng managed = False trong test database trước khi migrate
+TEST_RUNNER = 'backend.core.test_runner.UnmanagedTablesTestRunner'
+
+# Số mã (OrderID, ...) mỗi process thuê một lần từ bảng id_sequence
+ID_BLOCK_SIZE = int(os.getenv('ID_BLOCK_SIZE', 100))
+
+# Ngưỡng mặc định của GET /api/materials/low_stock/ (Quantity <= ngưỡng)
+LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', 10))
+
+# =====================================================
+# Request Timing
+# =====================================================
+# Request chậm hơn ngưỡng này (ms) được ghi vào logger backend.core.slow_requests
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'backend.core.slow_requests': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}